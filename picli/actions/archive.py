@@ -0,0 +1,578 @@
+import bz2
+import collections
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import lzma
+import os
+import struct
+import threading
+import uuid
+import zipfile
+import zlib
+
+from picli.actions import compression
+
+CHUNK_SIZE = 64 * 1024
+# Members get a fixed timestamp and permissions, so that the same files
+# always produce the same archive.
+DATE_TIME = (1980, 1, 1, 0, 0, 0)
+FILE_MODE = 0o100644
+EXECUTABLE_MODE = 0o100755
+DEFAULT_PAYLOAD_STORE_SIZE = 256 * 1024 * 1024
+
+# Record layouts of the zip file format, see section 4.3 of the APPNOTE
+# at https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT
+LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+DATA_DESCRIPTOR = struct.Struct('<4sLLL')
+DATA_DESCRIPTOR64 = struct.Struct('<4sLQQ')
+CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+END_RECORD = struct.Struct('<4s4H2LH')
+END_RECORD64 = struct.Struct('<4sQ2H2L4Q')
+END_LOCATOR64 = struct.Struct('<4sLQL')
+
+# Sizes and offsets past this need zip64 records, the same limit zipfile
+# uses.
+ZIP64_LIMIT = (1 << 31) - 1
+ZIP64_VERSION = 45
+VERSIONS = {
+    zipfile.ZIP_STORED: 20,
+    zipfile.ZIP_DEFLATED: 20,
+    zipfile.ZIP_BZIP2: 46,
+    zipfile.ZIP_LZMA: 63,
+}
+LZMA_EOS_FLAG = 0x02
+DATA_DESCRIPTOR_FLAG = 0x08
+UTF8_FLAG = 0x800
+
+
+class _Sink(object):
+    """Unseekable file object collecting what a ZipWriter writes until it
+    is drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(files, entries=None, policy=None, chunk_size=CHUNK_SIZE,
+               report=None, store=None):
+    """
+    Write a zip archive incrementally, yielding it in pieces as it is
+    written. Only about chunk_size bytes of input are held in memory at a
+    time, and nothing is written to disk.
+    :param files: Iterable of (path on disk, name in the archive) tuples
+    :param entries: dict of name in the archive to str or bytes contents,
+    written after the files
+    :param policy: CompressionPolicy choosing how members are compressed.
+    Defaults to deflating everything but already compressed files.
+    :param chunk_size: Number of bytes read from a file at a time
+    :param report: ArchiveReport to record the members in
+    :param store: PayloadStore to take compressed members from
+    :return: Iterator of bytes
+    """
+    if policy is None:
+        policy = compression.CompressionPolicy()
+    sink = _Sink()
+    with ZipWriter(sink) as zip_file:
+        for _ in write_files(zip_file, files, policy, chunk_size, store):
+            data = sink.drain()
+            if data:
+                yield data
+        for name, contents in sorted((entries or {}).items()):
+            write_entry(zip_file, policy, name, contents)
+            yield sink.drain()
+    if report is not None:
+        report.members = zip_file.members
+    yield sink.drain()
+
+
+class _LZMACompressor(object):
+    """Raw LZMA compressor writing the properties header zip archives
+    expect in front of the compressed data, with the properties zipfile
+    uses"""
+
+    FILTER = {'id': lzma.FILTER_LZMA1, 'dict_size': 1 << 23, 'lc': 3, 'lp': 0, 'pb': 2}
+
+    def __init__(self):
+        self._compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[self.FILTER])
+        properties = struct.pack(
+            '<BL', (self.FILTER['pb'] * 5 + self.FILTER['lp']) * 9 + self.FILTER['lc'],
+            self.FILTER['dict_size']
+        )
+        # Version of the LZMA SDK, then the size of the properties
+        self._header = struct.pack('<BBH', 9, 4, len(properties)) + properties
+
+    def compress(self, data):
+        header, self._header = self._header, b''
+        return header + self._compressor.compress(data)
+
+    def flush(self):
+        header, self._header = self._header, b''
+        return header + self._compressor.flush()
+
+
+def _compressor(compress_type, level):
+    """
+    :param compress_type: zipfile compression method
+    :param level: Compression level, or None for the default of the method
+    :return: Object with compress and flush methods, or None to store
+    """
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15
+        )
+    if compress_type == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(9 if level is None else level)
+    if compress_type == zipfile.ZIP_LZMA:
+        return _LZMACompressor()
+    return None
+
+
+def _read(path, chunk_size):
+    with open(path, 'rb') as source:
+        yield from iter(lambda: source.read(chunk_size), b'')
+
+
+class Compressed(object):
+    """Contents of a member, compressed while they are iterated
+
+    Iterating yields the compressed data. The CRC and size of the
+    contents are known once it finished.
+    """
+
+    def __init__(self, chunks, compress_type, level=None):
+        """
+        :param chunks: Iterable of bytes of the contents
+        :param compress_type: zipfile compression method
+        :param level: Compression level, or None for the default of the method
+        """
+        self.chunks = chunks
+        self.compress_type = compress_type
+        self.level = level
+        self.crc = 0
+        self.file_size = 0
+
+    def __iter__(self):
+        compressor = _compressor(self.compress_type, self.level)
+        for chunk in self.chunks:
+            self.crc = zlib.crc32(chunk, self.crc)
+            self.file_size += len(chunk)
+            data = compressor.compress(chunk) if compressor else chunk
+            if data:
+                yield data
+        tail = compressor.flush() if compressor else b''
+        if tail:
+            yield tail
+
+
+class Payload(object):
+    """Contents of a member compressed ahead of writing it, so that this
+    can be done on another thread. zlib, bz2 and lzma release the GIL
+    while compressing."""
+
+    __slots__ = ('compress_type', 'data', 'crc', 'file_size')
+
+    def __init__(self, compress_type, data, crc, file_size):
+        self.compress_type = compress_type
+        self.data = data
+        self.crc = crc
+        self.file_size = file_size
+
+    @classmethod
+    def read(cls, path, compress_type, level=None, chunk_size=CHUNK_SIZE):
+        """
+        Compress a file into memory, producing the same data as writing it
+        to an archive directly.
+        :param path: Path of the file
+        :param compress_type: zipfile compression method
+        :param level: Compression level, or None for the default of the method
+        :param chunk_size: Number of bytes read from the file at a time
+        :return: Payload
+        """
+        contents = Compressed(_read(path, chunk_size), compress_type, level)
+        data = b''.join(contents)
+        return cls(compress_type, data, contents.crc, contents.file_size)
+
+    def __iter__(self):
+        yield self.data
+
+
+def _dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+def _encode_name(name):
+    try:
+        return name.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return name.encode('utf-8'), UTF8_FLAG
+
+
+class ZipWriter(object):
+    """Zip archive written front to back into a file object
+
+    The file object doesn't have to be seekable. Every member is followed
+    by a data descriptor holding its CRC and sizes, so members can be
+    written while they are compressed, and an archive written to a file
+    is byte for byte the same as one streamed into a request. The members
+    written are listed as zipfile.ZipInfo objects in members.
+    """
+
+    def __init__(self, fileobj):
+        """
+        :param fileobj: File object open for writing in binary mode
+        """
+        self.fileobj = fileobj
+        self.offset = 0
+        self.members = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+
+    def _write(self, data):
+        self.fileobj.write(data)
+        self.offset += len(data)
+
+    def add(self, name, contents, mode=FILE_MODE, zip64=False):
+        """
+        Write a member.
+        :param name: Name in the archive
+        :param contents: Compressed or Payload of the member
+        :param mode: Permissions of the member
+        :param zip64: Whether the member may exceed ZIP64_LIMIT bytes
+        :return: Iterator yielding None whenever data was written, which
+        has to be exhausted to write the member
+        """
+        info = zipfile.ZipInfo(name, DATE_TIME)
+        info.create_system = 3
+        info.external_attr = mode << 16
+        info.compress_type = contents.compress_type
+        info.header_offset = self.offset
+        filename, info.flag_bits = _encode_name(info.filename)
+        info.flag_bits |= DATA_DESCRIPTOR_FLAG
+        if contents.compress_type == zipfile.ZIP_LZMA:
+            info.flag_bits |= LZMA_EOS_FLAG
+        info.extract_version = info.create_version = max(
+            VERSIONS[contents.compress_type], ZIP64_VERSION if zip64 else 0
+        )
+        dos_date, dos_time = _dos_date_time(info.date_time)
+        # With a data descriptor, the CRC and sizes of the local header
+        # are left empty.
+        extra = struct.pack('<2H2Q', 1, 16, 0, 0) if zip64 else b''
+        size = 0xFFFFFFFF if zip64 else 0
+        self._write(LOCAL_HEADER.pack(
+            b'PK\x03\x04', info.extract_version, 0, info.flag_bits,
+            info.compress_type, dos_time, dos_date, 0, size, size, len(filename),
+            len(extra)
+        ) + filename + extra)
+        compress_size = 0
+        for data in contents:
+            self._write(data)
+            compress_size += len(data)
+            yield
+        info.CRC = contents.crc
+        info.file_size = contents.file_size
+        info.compress_size = compress_size
+        if not zip64 and max(info.file_size, compress_size) > ZIP64_LIMIT:
+            raise zipfile.LargeZipFile(f'{name} grew past the zip64 limit')
+        descriptor = DATA_DESCRIPTOR64 if zip64 else DATA_DESCRIPTOR
+        self._write(descriptor.pack(
+            b'PK\x07\x08', info.CRC, info.compress_size, info.file_size
+        ))
+        self.members.append(info)
+        yield
+
+    def writestr(self, name, contents, compress_type, level=None, mode=FILE_MODE):
+        """
+        Write a member whose contents are in memory.
+        :param name: Name in the archive
+        :param contents: bytes
+        :param compress_type: zipfile compression method
+        :param level: Compression level, or None for the default of the method
+        :param mode: Permissions of the member
+        :return: None
+        """
+        for _ in self.add(name, Compressed([contents], compress_type, level), mode):
+            pass
+
+    def close(self):
+        """
+        Write the central directory.
+        :return: None
+        """
+        start = self.offset
+        for info in self.members:
+            filename, _ = _encode_name(info.filename)
+            extra = []
+            file_size, compress_size, offset = \
+                info.file_size, info.compress_size, info.header_offset
+            if file_size > ZIP64_LIMIT:
+                extra.append(file_size)
+                file_size = 0xFFFFFFFF
+            if compress_size > ZIP64_LIMIT:
+                extra.append(compress_size)
+                compress_size = 0xFFFFFFFF
+            if offset > ZIP64_LIMIT:
+                extra.append(offset)
+                offset = 0xFFFFFFFF
+            extra = struct.pack(f'<2H{len(extra)}Q', 1, 8 * len(extra), *extra) \
+                if extra else b''
+            version = max(info.extract_version, ZIP64_VERSION if extra else 0)
+            dos_date, dos_time = _dos_date_time(info.date_time)
+            self._write(CENTRAL_HEADER.pack(
+                b'PK\x01\x02', version, info.create_system, version, 0,
+                info.flag_bits, info.compress_type, dos_time, dos_date, info.CRC,
+                compress_size, file_size, len(filename), len(extra), 0, 0, 0,
+                info.external_attr, offset
+            ) + filename + extra)
+        size = self.offset - start
+        count = len(self.members)
+        if count > 0xFFFF or size > ZIP64_LIMIT or start > ZIP64_LIMIT:
+            end = self.offset
+            self._write(END_RECORD64.pack(
+                b'PK\x06\x06', END_RECORD64.size - 12, ZIP64_VERSION,
+                ZIP64_VERSION, 0, 0, count, count, size, start
+            ))
+            self._write(END_LOCATOR64.pack(b'PK\x06\x07', 0, end, 1))
+            count = min(count, 0xFFFF)
+            size = min(size, 0xFFFFFFFF)
+            start = min(start, 0xFFFFFFFF)
+        self._write(END_RECORD.pack(b'PK\x05\x06', 0, 0, count, count, size, start, 0))
+
+
+def _file_options(path, policy):
+    """
+    :return: tuple of the mode of the member of a file, whether it needs
+    zip64 records, and its compression method and level
+    """
+    stat = os.stat(path)
+    mode = EXECUTABLE_MODE if stat.st_mode & 0o100 else FILE_MODE
+    return (mode, stat.st_size > ZIP64_LIMIT) + policy.choose_file(path)
+
+
+class PayloadStore(object):
+    """Compressed members shared by every archive of an invocation
+
+    When several actions send the same file, it is read and compressed
+    once, and ZipWriter copies the same Payload into each archive, which
+    comes out byte for byte the same as without the store. Members are
+    kept until the store holds max_size bytes, after which further files
+    are compressed for each archive again.
+    """
+
+    def __init__(self, max_size=DEFAULT_PAYLOAD_STORE_SIZE):
+        """
+        :param max_size: Maximum size of the compressed data kept, in bytes
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.compressed = 0
+        self.reused = 0
+        self._members = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, compress_type, level=None, chunk_size=CHUNK_SIZE):
+        """
+        Compressed data of a file, compressed by this call unless another
+        archive compressed it the same way already. Archives being written
+        at the same time wait for each other instead of compressing the
+        same file twice.
+        :param path: Path of the file
+        :param compress_type: zipfile compression method
+        :param level: Compression level, or None for the default of the method
+        :param chunk_size: Number of bytes read from the file at a time
+        :return: Payload
+        """
+        key = (path, compress_type, level)
+        with self._lock:
+            future = self._members.get(key)
+            owner = future is None
+            if owner:
+                future = self._members[key] = Future()
+            else:
+                self.reused += 1
+        if not owner:
+            return future.result()
+        try:
+            payload = Payload.read(path, compress_type, level, chunk_size)
+        except BaseException as e:
+            with self._lock:
+                del self._members[key]
+            future.set_exception(e)
+            raise
+        future.set_result(payload)
+        with self._lock:
+            self.compressed += 1
+            if self.size + len(payload.data) > self.max_size:
+                del self._members[key]
+            else:
+                self.size += len(payload.data)
+        return payload
+
+    def __str__(self):
+        return f'Shared payloads: compressed {self.compressed} files, ' \
+               f'reused them {self.reused} times, holding {self.size} bytes'
+
+
+def _compressed_files(files, policy, chunk_size, store=None):
+    """
+    Compress files on policy.workers threads, keeping a few members per
+    worker in flight.
+    :return: Iterator of (name, mode, zip64, Payload), in the order of files
+    """
+    compress = Payload.read if store is None else store.get
+    with ThreadPoolExecutor(max_workers=policy.workers) as executor:
+        pending = collections.deque()
+        for path, name in files:
+            mode, zip64, compress_type, level = _file_options(path, policy)
+            future = executor.submit(compress, path, compress_type, level, chunk_size)
+            pending.append((name, mode, zip64, future))
+            if len(pending) >= 2 * policy.workers:
+                name, mode, zip64, future = pending.popleft()
+                yield name, mode, zip64, future.result()
+        while pending:
+            name, mode, zip64, future = pending.popleft()
+            yield name, mode, zip64, future.result()
+
+
+def write_files(zip_file, files, policy, chunk_size=CHUNK_SIZE, store=None):
+    """
+    Write files into a zip archive. With more than one worker in the
+    policy, members are compressed into memory on that many threads and
+    written in order, producing the same bytes as compressing them while
+    writing them one at a time. With a PayloadStore, members already
+    compressed for another archive are copied as they are.
+    :param zip_file: ZipWriter
+    :param files: Iterable of (path on disk, name in the archive) tuples
+    :param policy: CompressionPolicy
+    :param chunk_size: Number of bytes read from a file at a time
+    :param store: PayloadStore to take compressed members from
+    :return: Iterator yielding None whenever data was written, so that a
+    streamed archive can be drained
+    """
+    if policy.workers > 1 or store is not None:
+        for name, mode, zip64, payload in \
+                _compressed_files(files, policy, chunk_size, store):
+            yield from zip_file.add(name, payload, mode, zip64)
+        return
+    for path, name in files:
+        mode, zip64, compress_type, level = _file_options(path, policy)
+        contents = Compressed(_read(path, chunk_size), compress_type, level)
+        yield from zip_file.add(name, contents, mode, zip64)
+
+
+def write_entry(zip_file, policy, name, contents):
+    """
+    Write a member whose contents are in memory.
+    :param zip_file: ZipWriter
+    :param policy: CompressionPolicy
+    :param name: Name in the archive
+    :param contents: str or bytes
+    :return: None
+    """
+    if isinstance(contents, str):
+        contents = contents.encode()
+    compress_type, level = policy.choose(name, contents[:compression.SNIFF_SIZE])
+    zip_file.writestr(name, contents, compress_type, level)
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_digest(files, entries=None, base_dir=None, file_digest=None):
+    """
+    Digest identifying the contents of an archive: the names and contents
+    of its members, in order. It doesn't depend on how the members are
+    compressed, nor on where the project is checked out: paths below
+    base_dir in the entries, such as the files listed in run_vars.yml,
+    are digested relative to it.
+    :param files: Iterable of (path on disk, name in the archive) tuples
+    :param entries: dict of name in the archive to str or bytes contents
+    :param base_dir: Project base directory
+    :param file_digest: Function returning the hex SHA-256 digest of a file
+    by path, such as FileDigests.get, to reuse digests computed already
+    :return: Hex SHA-256 digest
+    """
+    file_digest = file_digest or _hash_file
+    digest = hashlib.sha256()
+    for path, name in files:
+        digest.update(f'{name}\0'.encode() + bytes.fromhex(file_digest(path)))
+    prefix = os.path.join(base_dir, '').encode() if base_dir else None
+    for name, contents in sorted((entries or {}).items()):
+        if isinstance(contents, str):
+            contents = contents.encode()
+        if prefix:
+            contents = contents.replace(prefix, b'')
+        digest.update(f'{name}\0'.encode() + hashlib.sha256(contents).digest())
+    return digest.hexdigest()
+
+
+class MultipartStream(object):
+    """multipart/form-data request body with a single file field whose
+    contents are produced by an iterator
+
+    Passed as the data of a request, the body is sent while it is being
+    produced, with chunked transfer encoding unless its size is known.
+    """
+
+    def __init__(self, field, filename, chunks, content_type='application/zip',
+                 boundary=None, size=None):
+        """
+        :param field: Name of the form field
+        :param filename: File name sent for the field
+        :param chunks: Iterator of bytes making up the file
+        :param content_type: Content type of the file
+        :param boundary: Multipart boundary, random by default
+        :param size: Size of the file if known in advance, in which case
+        the body is sent with a Content-Length instead of chunked
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.field = field
+        self.filename = os.path.basename(filename)
+        self.chunks = chunks
+        self.file_content_type = content_type
+        # requests reads the length of iterable bodies from len.
+        self.len = None
+        if size is not None:
+            self.len = len(self._head()) + size + len(self._tail())
+
+    def _head(self):
+        return (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{self.field}"; '
+            f'filename="{self.filename}"\r\n'
+            f'Content-Type: {self.file_content_type}\r\n\r\n'
+        ).encode()
+
+    def _tail(self):
+        return f'\r\n--{self.boundary}--\r\n'.encode()
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __iter__(self):
+        yield self._head()
+        for chunk in self.chunks:
+            if chunk:
+                yield chunk
+        yield self._tail()
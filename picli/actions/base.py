@@ -2,13 +2,35 @@ import abc
 import os
 import requests
 import tempfile
+import time
 import zipfile
 
+from picli.actions import archive
+from picli.actions import compression
+from picli.actions import executors
+from picli import cache
 from picli import logger
 from picli import util
 
 LOG = logger.get_logger(__name__)
 
+# Header carrying archive.content_digest of the zipfile, which proxies or
+# the gateway can use to answer repeated requests from a cache. Only sent
+# with digest_header enabled under transport.
+DIGEST_HEADER = 'X-PiCli-Archive-Digest'
+
+
+def function_url(endpoint, version, name):
+    """
+    :param endpoint: url from the pipe_vars of the pipe
+    :param version: version from the pipe_vars of the pipe
+    :param name: Name of the action
+    :return: str URL of the function of the action
+    """
+    if version == 'latest':
+        return f'{endpoint}/piedpiper-{name}-function'
+    return f'{endpoint}/piedpiper-{name}-function-{version.replace(".", "-")}'
+
 
 class Base(object):
     """Base Lint object
@@ -22,19 +44,50 @@ class Base(object):
     """
     __metaclass__ = abc.ABCMeta
 
+    # Whether the analyzer checks files together, such as cppcheck
+    # following includes, so that the output for a file depends on the
+    # other files sent along.
+    cross_file = False
+    # Exit codes with which the analyzer run locally finished its check,
+    # with or without findings, and the stream it writes its findings to.
+    local_exit_codes = (0,)
+    local_output = 'stdout'
+
     def __init__(self, pipe_config, run_config):
         self.pipe_config = pipe_config
         self.run_config = run_config
-        self.run_vars = self._build_run_vars()
+        self._run_vars = None
 
-    def _build_run_vars(self):
-        if self.options.get('options'):
-            run_vars = util.merge_dicts(
-                util.safe_load(self.pipe_config.dump_configs()),
-                self.options
-            )
-        else:
-            run_vars = util.safe_load(self.pipe_config.dump_configs())
+    @property
+    def session(self):
+        """
+        Session of the invocation the action runs in
+        :return: Session object
+        """
+        return self.pipe_config.context.session
+
+    @property
+    def run_vars(self):
+        """
+        run_vars of the action, built on first use
+        :return: dict
+        """
+        if self._run_vars is None:
+            self._run_vars = self._build_run_vars()
+        return self._run_vars
+
+    def _build_run_vars(self, files=None):
+        """
+        Build the run_vars for the action from the pipe configuration.
+        The dictionary is only serialized once, when it is written to the
+        zipfile.
+        :param files: Files to list instead of every file of the pipe
+        :return: dict
+        """
+        run_vars = self.pipe_config.build_run_vars(files)
+        options = self.options
+        if options.get('options'):
+            run_vars = util.merge_dicts(run_vars, options)
         return run_vars
 
     @property
@@ -72,24 +125,181 @@ class Base(object):
         :return:  None
         """
         LOG.info(f"Executing: {self.name}")
-        with tempfile.TemporaryDirectory() as temp_dir:
-            zip_file = self.zip_files(temp_dir)
-            with open(zip_file.filename, 'rb') as file:
-                files = [('files', file)]
-                try:
-                    if self.pipe_config.debug:
-                        LOG.info(f'Sending zipfile to {self.url}')
-                    r = requests.post(self.url, files=files)
-                except requests.exceptions.RequestException as e:
-                    message = f"Failed to execute {self.name}. \n\n{e}"
-                    util.sysexit_with_message(message)
-                try:
-                    r.raise_for_status()
-                except requests.exceptions.HTTPError as e:
-                    message = f'Failed to execute {self.name}. \n\n{e}'
-                    util.sysexit_with_message(message)
+        # Batches of a pipelined pipe only send their own files.
+        files = list(self.run_config.files) if self.run_config.batch else None
+        result_cache = self.pipe_config.context.result_cache
+        if result_cache is None:
+            LOG.warn(self.send(files))
+        else:
+            LOG.warn(self._execute_cached(result_cache, files))
+
+    def _execute_cached(self, result_cache, files=None):
+        """
+        Only send the files whose output isn't in the result cache, and
+        merge the stored output of the others back in, ordered by path
+        like the members of the zipfile the output of an uncached run
+        follows. The output of a cross_file analyzer is only reused for the
+        same files, all of them unchanged, and all of them are sent
+        otherwise.
+        :param result_cache: ResultCache object
+        :param files: Files to check instead of every file in run_config.files
+        :return: str output of the analyzer
+        """
+        files = list(self.run_config.files) if files is None else files
+        analyzer_key = result_cache.analyzer_key(
+            self.name, self.url, self.pipe_config.version,
+            [self.options, self.run_config.config]
+        )
+        keys = [
+            result_cache.file_key(
+                analyzer_key, file.path, file.overrides,
+                self.session.digests.get(file.abs_path)
+            )
+            for file in files
+        ]
+        if self.cross_file:
+            return self._execute_batch_cached(result_cache, files, keys)
+        results = result_cache.get(keys)
+        misses = [(file, key) for file, key in zip(files, keys) if key not in results]
+        batch_output = ''
+        if misses:
+            batch_key = result_cache.batch_key([key for _, key in misses])
+            batch_output = result_cache.get([batch_key]).get(batch_key)
+            if batch_output is None:
+                text = self.send([file for file, _ in misses])
+                output = cache.split_output(text, [file.path for file, _ in misses])
+                if output is None:
+                    # Output which can't be attributed to single files is
+                    # only reused for the same set of files.
+                    batch_output = text
+                    result_cache.put({batch_key: batch_output})
                 else:
-                    LOG.warn(r.text)
+                    batch_output = ''
+                    new_results = {key: output[file.path] for file, key in misses}
+                    results.update(new_results)
+                    result_cache.put(new_results)
+            else:
+                results.update((key, '') for _, key in misses)
+                misses = []
+        hits = len(files) - len(misses)
+        result_cache.count(hits, len(misses))
+        LOG.info(f'Result cache for {self.name}: {hits} hits, {len(misses)} misses')
+        output = [
+            results[key]
+            for _, key in sorted(zip(files, keys), key=lambda pair: pair[0].path)
+            if results.get(key)
+        ]
+        if batch_output:
+            output.append(batch_output)
+        return '\n'.join(output)
+
+    def _execute_batch_cached(self, result_cache, files, keys):
+        """
+        Reuse the output of the whole batch when none of its files changed,
+        or send every file of it.
+        :param result_cache: ResultCache object
+        :param files: Files of the batch
+        :param keys: Result cache keys of the files
+        :return: str output of the analyzer
+        """
+        batch_key = result_cache.batch_key(keys)
+        output = result_cache.get([batch_key]).get(batch_key)
+        hits = len(files) if output is not None else 0
+        if output is None:
+            output = self.send(files)
+            result_cache.put({batch_key: output})
+        result_cache.count(hits, len(files) - hits)
+        LOG.info(f'Result cache for {self.name}: {hits} hits, '
+                 f'{len(files) - hits} misses')
+        return output
+
+    def send(self, files=None):
+        """
+        Run the analyzer of the action on files with the executor of the
+        pipe, which sends them to the function by default.
+        :param files: Files to check instead of every file in run_config.files
+        :return: str output of the analyzer
+        """
+        return self.pipe_config.executor.send(self, files)
+
+    def local_command(self):
+        """
+        Command running the analyzer of the action on this machine, to
+        which the paths of the files are appended. The options of the
+        action are resolved the same way as for run_vars.yml.
+        :return: list of str
+        """
+        return [self.name] + executors.command_options(self.options.get('options'))
+
+    def upload(self, files=None):
+        """
+        Send the zipfile of the action to its function.
+        When the transport streams uploads, the zipfile is written into
+        the request body while it is being sent. Otherwise it is written
+        to a temporary directory first.
+        :param files: Files to send instead of every file in run_config.files.
+        The run_vars.yml sent along only lists these files.
+        :return: requests.Response
+        """
+        contents = self.archive_contents(files)
+        digest = None
+        headers = {}
+        if self.session.transport.digest_header:
+            digest = archive.content_digest(
+                *contents, base_dir=self.pipe_config.base_config.base_dir,
+                file_digest=self.session.digests.get
+            )
+            headers[DIGEST_HEADER] = digest
+        boundary = digest[:48] if digest else None
+        report = compression.ArchiveReport(self.archive_name)
+        if self.session.transport.stream_uploads:
+            body = archive.MultipartStream(
+                'files', self.archive_name,
+                report.timed(self.stream_files(files, report, contents)),
+                boundary=boundary
+            )
+            r = self._post(body, headers)
+        else:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                start = time.perf_counter()
+                zip_file = self.zip_files(temp_dir, files, contents)
+                report.elapsed = time.perf_counter() - start
+                report.members = zip_file.infolist()
+                with open(zip_file.filename, 'rb') as file:
+                    body = archive.MultipartStream(
+                        'files', self.archive_name,
+                        iter(lambda: file.read(archive.CHUNK_SIZE), b''),
+                        boundary=boundary,
+                        size=os.path.getsize(zip_file.filename)
+                    )
+                    r = self._post(body, headers)
+        if self.pipe_config.debug:
+            LOG.info(f'{report}, digest {digest}' if digest else str(report))
+        return r
+
+    def _post(self, body, headers):
+        """
+        POST to the function of the action.
+        :param body: MultipartStream holding the zipfile
+        :param headers: dict of further request headers
+        :return: requests.Response. Exit if the request failed.
+        """
+        headers = dict(headers, **{'Content-Type': body.content_type})
+        try:
+            if self.pipe_config.debug:
+                LOG.info(f'Sending zipfile to {self.url}')
+            r = self.session.transport.post(
+                self.url, data=body, headers=headers
+            )
+        except requests.exceptions.RequestException as e:
+            message = f"Failed to execute {self.name}. \n\n{e}"
+            util.sysexit_with_message(message)
+        try:
+            r.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            message = f'Failed to execute {self.name}. \n\n{e}'
+            util.sysexit_with_message(message)
+        return r
 
     @property
     @abc.abstractmethod
@@ -98,44 +308,99 @@ class Base(object):
         Defines the URL of the function which the execute method will hit
         :return: string
         """
-        url_version = self.pipe_config.version.replace('.', '-')
-        if self.pipe_config.version == 'latest':
-            return f'{self.pipe_config.endpoint}/' \
-                   f'piedpiper-{self.name}-function'
-        else:
-            return f'{self.pipe_config.endpoint}/' \
-                   f'piedpiper-{self.name}-function-{url_version}'
+        return function_url(
+            self.pipe_config.endpoint, self.pipe_config.version, self.name
+        )
+
+    @property
+    def archive_name(self):
+        """
+        File name of the zipfile sent to the function
+        :return: str
+        """
+        return f'{self.name}.zip'
+
+    def archive_contents(self, files=None):
+        """
+        Members of the zipfile of the action. Files are sorted by name so
+        that the same files always produce the same zipfile.
+        :param files: Files to zip instead of every file in run_config.files
+        :return: tuple of list of (path on disk, name in the zipfile) and
+        dict of name in the zipfile to contents of further entries
+        """
+        return (
+            sorted(self._archive_files(files), key=lambda member: member[1]),
+            self._archive_entries(files),
+        )
 
     @abc.abstractmethod
-    def zip_files(self, destination):
+    def zip_files(self, destination, files=None, contents=None):
         """
         Zips all files in the run_config.files list if they match
         the SAST analyzer.
         :param destination: Path to create the zipfile in
+        :param files: Files to zip instead of every file in run_config.files
+        :param contents: Result of archive_contents, if already built
         :return: ZipFile
         """
-        zip_file = zipfile.ZipFile(
-            f'{destination}/{self.name}.zip', 'w', zipfile.ZIP_DEFLATED
+        members, entries = contents or self.archive_contents(files)
+        policy = self.session.compression
+        path = f'{destination}/{self.archive_name}'
+        with open(path, 'wb') as file, archive.ZipWriter(file) as writer:
+            for _ in archive.write_files(
+                writer, members, policy, store=self.session.payloads
+            ):
+                pass
+            for name, data in sorted(entries.items()):
+                archive.write_entry(writer, policy, name, data)
+
+        zip_file = zipfile.ZipFile(path)
+        zip_file.close()
+
+        return zip_file
+
+    def stream_files(self, files=None, report=None, contents=None):
+        """
+        Write the zipfile of zip_files incrementally. Both are written by
+        archive.ZipWriter with data descriptors, so the bytes are the same.
+        :param files: Files to zip instead of every file in run_config.files
+        :param report: ArchiveReport to record the members in
+        :param contents: Result of archive_contents, if already built
+        :return: Iterator of bytes
+        """
+        members, entries = contents or self.archive_contents(files)
+        return archive.stream_zip(
+            members, entries,
+            policy=self.session.compression, report=report,
+            store=self.session.payloads
         )
-        for file in self.run_config.files:
+
+    def _archive_files(self, files=None):
+        """
+        :param files: Files to zip instead of every file in run_config.files
+        :return: Iterator of (path on disk, name in the zipfile) of the files
+        """
+        for file in self.run_config.files if files is None else files:
             if self.pipe_config.debug:
-                message = f'Writing {file["file"]} to zip'
+                message = f'Writing {file.abs_path} to zip'
                 LOG.info(message)
-            zip_file.write(
-                file['file'],
-                os.path.relpath(file['file'], self.pipe_config.base_config.base_dir)
-            )
+            yield file.abs_path, file.path
 
+    def _archive_entries(self, files=None):
+        """
+        :param files: Files the zipfile is limited to, which are the only
+        files listed in its run_vars.yml
+        :return: dict of name in the zipfile to contents which aren't
+        read from disk
+        """
+        run_vars = self.run_vars if files is None else self._build_run_vars(files)
+        run_vars = util.safe_dump(run_vars)
         if self.pipe_config.debug:
             message = f'Writing run_vars.yml to zip.\n' \
                       f'run_vars.yml\n' \
-                      f'{util.safe_dump(self.run_vars)}'
+                      f'{run_vars}'
             LOG.info(message)
-        zip_file.writestr("run_vars.yml", util.safe_dump(self.run_vars))
-
-        zip_file.close()
-
-        return zip_file
+        return {'run_vars.yml': run_vars}
 
     @property
     def enabled(self):
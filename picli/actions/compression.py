@@ -0,0 +1,147 @@
+import os
+import time
+import zipfile
+import zlib
+
+METHODS = {
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+# Formats which are compressed already. Deflating them again costs time
+# and rarely saves anything.
+STORED_EXTENSIONS = frozenset((
+    '.7z', '.bz2', '.docx', '.ear', '.gif', '.gz', '.ico', '.jar', '.jpeg',
+    '.jpg', '.lz', '.lzma', '.mov', '.mp3', '.mp4', '.ogg', '.pdf', '.png',
+    '.rar', '.tgz', '.war', '.webm', '.webp', '.whl', '.woff', '.woff2',
+    '.xlsx', '.xz', '.zip', '.zst',
+))
+
+# Source and text formats, which always compress well and aren't sniffed.
+TEXT_EXTENSIONS = frozenset((
+    '.c', '.cc', '.cfg', '.cpp', '.cs', '.css', '.cxx', '.go', '.h', '.hh',
+    '.hpp', '.html', '.ini', '.java', '.js', '.json', '.md', '.py', '.rb',
+    '.rs', '.rst', '.sh', '.sql', '.toml', '.ts', '.txt', '.xml', '.yaml',
+    '.yml',
+))
+
+SNIFF_SIZE = 16 * 1024
+# Samples which deflate to more than this fraction of their size are
+# considered incompressible.
+SNIFF_RATIO = 0.97
+
+
+class CompressionPolicy(object):
+    """Choose how each member of an analyzer archive is compressed
+
+    Files with the extension of a compressed format are stored as they
+    are, and source files are always compressed. Other files are sniffed
+    by compressing their first bytes with the fastest deflate level, and
+    stored when that saves next to nothing. Everything else is compressed
+    with the configured method and level.
+    """
+
+    def __init__(self, method='deflate', level=None, stored_extensions=(),
+                 sniff=True, workers=1):
+        """
+        :param method: deflate, or bzip2 or lzma when the functions can
+        read them
+        :param level: Compression level, or None for the default of the method
+        :param stored_extensions: Extensions of further files to store
+        uncompressed, in addition to STORED_EXTENSIONS
+        :param sniff: Store files whose contents turn out to be incompressible
+        :param workers: Number of threads compressing members of an archive
+        """
+        self.method = METHODS[method]
+        self.level = level
+        self.stored_extensions = STORED_EXTENSIONS | {
+            extension.lower() if extension.startswith('.') else f'.{extension.lower()}'
+            for extension in stored_extensions
+        }
+        self.sniff = sniff
+        self.workers = workers
+
+    def choose(self, name, sample=None):
+        """
+        :param name: Name of the member
+        :param sample: First bytes of the member, if it should be sniffed
+        :return: tuple of compression method and level of the member
+        """
+        extension = os.path.splitext(name)[1].lower()
+        if extension in self.stored_extensions:
+            return zipfile.ZIP_STORED, None
+        if self.sniff and sample and extension not in TEXT_EXTENSIONS and \
+                len(zlib.compress(sample, 1)) > len(sample) * SNIFF_RATIO:
+            return zipfile.ZIP_STORED, None
+        return self.method, self.level
+
+    def needs_sample(self, name):
+        """
+        :param name: Name of a member
+        :return: Whether choose decides by the contents of the member
+        """
+        extension = os.path.splitext(name)[1].lower()
+        return extension not in self.stored_extensions and \
+            extension not in TEXT_EXTENSIONS
+
+    def choose_file(self, path):
+        """
+        :param path: Path of a file on disk
+        :return: tuple of compression method and level of the file
+        """
+        sample = None
+        if self.sniff and self.needs_sample(path):
+            with open(path, 'rb') as f:
+                sample = f.read(SNIFF_SIZE)
+        return self.choose(path, sample)
+
+
+class ArchiveReport(object):
+    """Compression ratio and time of a single archive"""
+
+    def __init__(self, name):
+        """
+        :param name: Name of the archive
+        """
+        self.name = name
+        self.elapsed = 0
+        self.members = []
+
+    def timed(self, chunks):
+        """
+        Add the time spent producing each chunk of a streamed archive,
+        but not the time spent sending it.
+        :param chunks: Iterator of bytes
+        :return: Iterator of bytes
+        """
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                self.elapsed += time.perf_counter() - start
+            yield chunk
+
+    @property
+    def file_size(self):
+        return sum(member.file_size for member in self.members)
+
+    @property
+    def compress_size(self):
+        return sum(member.compress_size for member in self.members)
+
+    @property
+    def stored(self):
+        return sum(
+            1 for member in self.members if member.compress_type == zipfile.ZIP_STORED
+        )
+
+    def __str__(self):
+        ratio = self.file_size / self.compress_size if self.compress_size else 1
+        return f'{self.name}: {len(self.members)} members, ' \
+               f'{self.file_size} bytes compressed to {self.compress_size} ' \
+               f'({ratio:.2f}x, {self.stored} stored) in {self.elapsed:.3f}s'
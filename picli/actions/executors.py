@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import shlex
+import shutil
+import subprocess
+
+from picli import logger
+from picli import util
+
+LOG = logger.get_logger(__name__)
+
+DEFAULT_SHARD_CONCURRENCY = 4
+
+
+def shard_files(files, max_files=None, max_bytes=None):
+    """
+    Split files into consecutive shards of at most max_files files and
+    max_bytes bytes. A file larger than max_bytes gets a shard of its own.
+    Files are sharded in the order of their paths, the order of the
+    members of a zipfile, so the joined output of the shards is in the
+    same order as the output of a single request.
+    :param files: List of FileRecord objects
+    :param max_files: Maximum number of files of a shard, or None
+    :param max_bytes: Maximum total size of the files of a shard, or None
+    :return: List of lists of FileRecord objects, ordered by path
+    """
+    shards = []
+    shard = []
+    shard_size = 0
+    for file in sorted(files, key=lambda file: file.path):
+        size = os.path.getsize(file.abs_path) if max_bytes else 0
+        if shard and (
+            (max_files and len(shard) >= max_files) or
+            (max_bytes and shard_size + size > max_bytes)
+        ):
+            shards.append(shard)
+            shard = []
+            shard_size = 0
+        shard.append(file)
+        shard_size += size
+    if shard:
+        shards.append(shard)
+    return shards
+
+
+def run_shards(run, shards, concurrency):
+    """
+    Run a function on every shard, up to concurrency at the same time.
+    Records logged while running a shard are handed to the buffer of the
+    calling thread.
+    :param run: Function taking a shard and returning its output
+    :param shards: List of shards
+    :param concurrency: Maximum number of shards run at the same time
+    :return: str output of every shard, in the order of the shards
+    """
+    parent = logger.active_buffer()
+
+    def run_buffered(shard):
+        with logger.buffered(parent):
+            return run(shard)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outputs = list(executor.map(run_buffered, shards))
+    return '\n'.join(output.rstrip('\n') for output in outputs if output.strip())
+
+
+def command_options(options):
+    """
+    Turn the options of an action, as written to run_vars, into command
+    line arguments.
+    :param options: dict of long option name to value, where True adds
+    the option without a value and False or None leaves it out, list of
+    arguments, or str of arguments
+    :return: list of str
+    """
+    if not options:
+        return []
+    if isinstance(options, str):
+        return shlex.split(options)
+    if not isinstance(options, dict):
+        return [str(option) for option in options]
+    args = []
+    for name, value in options.items():
+        option = name if name.startswith('-') else f'--{name}'
+        values = value if isinstance(value, list) else [value]
+        for value in values:
+            if value is True:
+                args.append(option)
+            elif value is not None and value is not False:
+                args.append(f'{option}={value}')
+    return args
+
+
+class RemoteExecutor(object):
+    """Send the files of an action to its function
+
+    When sharding is configured in pi_global_vars.yml and the files exceed
+    its limits, they are split into shards which are posted at the same
+    time, each with a run_vars.yml listing only its own files. Analyzers
+    checking files together, such as cppcheck following includes, are
+    always sent every file in a single request.
+    """
+
+    def __init__(self, sharding):
+        """
+        :param sharding: sharding settings of pi_global_vars
+        """
+        self.sharding = sharding
+
+    def send(self, action, files=None):
+        """
+        :param action: Action to run
+        :param files: Files to send instead of every file in run_config.files
+        :return: str output of the function, of every shard in path order
+        """
+        max_files = self.sharding.get('max_files')
+        max_bytes = self.sharding.get('max_bytes')
+        if action.cross_file or (not max_files and not max_bytes):
+            return action.upload(files).text
+        shards = shard_files(
+            list(action.run_config.files) if files is None else files,
+            max_files, max_bytes
+        )
+        if len(shards) <= 1:
+            return action.upload(files).text
+        concurrency = min(
+            len(shards), self.sharding.get('concurrency', DEFAULT_SHARD_CONCURRENCY)
+        )
+        LOG.info(f'Sending {action.name} in {len(shards)} shards, '
+                 f'{concurrency} at a time')
+        return run_shards(
+            lambda shard: action.upload(shard).text, shards, concurrency
+        )
+
+
+class LocalExecutor(object):
+    """Run the analyzer of an action on this machine instead of sending
+    the files to its function
+
+    The files are split into one shard per process, and each shard is
+    checked by its own analyzer process running in the project base
+    directory on paths relative to it, the same paths the functions see
+    in the zipfile. The output of the processes is joined in path order
+    like the output of remote shards. An analyzer exiting with any code
+    but one of the local_exit_codes of its action fails the action like
+    a failed request would. Analyzers checking files together are run
+    in a single process on every file.
+    """
+
+    def __init__(self, processes=None):
+        """
+        :param processes: Number of analyzer processes run at the same
+        time. Defaults to the number of CPUs.
+        """
+        self.processes = processes or os.cpu_count() or 1
+
+    def send(self, action, files=None):
+        """
+        :param action: Action to run
+        :param files: Files to check instead of every file in run_config.files
+        :return: str output of the analyzer, of every shard in path order
+        """
+        command = action.local_command()
+        if command is None:
+            util.sysexit_with_message(f'{action.name} can only run remotely.')
+        if shutil.which(command[0]) is None:
+            message = f'Failed to run {action.name} locally. ' \
+                      f'{command[0]} was not found on the PATH.'
+            util.sysexit_with_message(message)
+        files = list(action.run_config.files) if files is None else files
+        if not files:
+            return ''
+        processes = 1 if action.cross_file else self.processes
+        shards = shard_files(files, math.ceil(len(files) / processes))
+        return run_shards(
+            lambda shard: self._run(action, command, shard), shards, len(shards)
+        )
+
+    @staticmethod
+    def _run(action, command, shard):
+        args = command + [file.path for file in shard]
+        if action.pipe_config.debug:
+            LOG.info(f'Running {" ".join(args)}')
+        try:
+            result = subprocess.run(
+                args,
+                cwd=action.run_config.file_table.base_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except OSError as e:
+            message = f'Failed to run {action.name} locally. \n\n{e}'
+            util.sysexit_with_message(message)
+        stdout = result.stdout.decode(errors='replace')
+        stderr = result.stderr.decode(errors='replace')
+        if result.returncode not in action.local_exit_codes:
+            output = '\n'.join(text.strip() for text in (stderr, stdout) if text.strip())
+            message = f'Failed to run {action.name} locally. ' \
+                      f'It exited with {result.returncode}. \n\n{output}'
+            util.sysexit_with_message(message)
+        return stderr if action.local_output == 'stderr' else stdout
+
+
+def get_executor(name, base_config, processes=None):
+    """
+    :param name: remote or local
+    :param base_config: BaseConfig object
+    :param processes: Number of local analyzer processes
+    :return: RemoteExecutor or LocalExecutor object
+    """
+    if name == 'local':
+        return LocalExecutor(processes)
+    return RemoteExecutor(base_config.sharding)
@@ -12,6 +12,11 @@ class Cppcheck(base.Base):
 
     """
 
+    # cppcheck follows includes between the files it is sent, and writes
+    # its findings to stderr.
+    cross_file = True
+    local_output = 'stderr'
+
     def __init__(self, base_config, config):
         super(Cppcheck, self).__init__(base_config, config)
 
@@ -23,8 +28,8 @@ class Cppcheck(base.Base):
     def url(self):
         return super().url
 
-    def zip_files(self, destination):
-        return super().zip_files(destination)
+    def zip_files(self, destination, files=None, contents=None):
+        return super().zip_files(destination, files, contents)
 
     def execute(self):
         super().execute()
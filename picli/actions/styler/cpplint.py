@@ -12,6 +12,10 @@ class Cpplint(base.Base):
 
     """
 
+    # Exits with 1 when it found problems, which it writes to stderr.
+    local_exit_codes = (0, 1)
+    local_output = 'stderr'
+
     def __init__(self, pipe_config, run_config):
         super(Cpplint, self).__init__(pipe_config, run_config)
 
@@ -23,8 +27,8 @@ class Cpplint(base.Base):
     def url(self):
         return super().url
 
-    def zip_files(self, destination):
-        return super().zip_files(destination)
+    def zip_files(self, destination, files=None, contents=None):
+        return super().zip_files(destination, files, contents)
 
     def execute(self):
         super().execute()
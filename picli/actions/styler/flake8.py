@@ -12,6 +12,9 @@ class Flake8(base.Base):
 
     """
 
+    # Exits with 1 when it found problems.
+    local_exit_codes = (0, 1)
+
     def __init__(self, pipe_config, run_config):
         super(Flake8, self).__init__(pipe_config, run_config)
 
@@ -23,8 +26,8 @@ class Flake8(base.Base):
     def url(self):
         return super().url
 
-    def zip_files(self, destination):
-        return super().zip_files(destination)
+    def zip_files(self, destination, files=None, contents=None):
+        return super().zip_files(destination, files, contents)
 
     def execute(self):
         super().execute()
@@ -27,5 +27,5 @@ class Noop(base.Base):
     def execute(self):
         LOG.info(f"Executing styler {self.name}")
         for file in self.run_config.files:
-            message = f'Executing {self.name} on {file["file"]}'
+            message = f'Executing {self.name} on {file.abs_path}'
             LOG.success(message)
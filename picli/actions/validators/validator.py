@@ -1,7 +1,4 @@
-import tempfile
-import requests
 import json
-import zipfile
 
 from picli.actions import base
 from picli import logger
@@ -37,45 +34,36 @@ class Validator(base.Base):
     def url(self):
         return super().url
 
-    def zip_files(self, destination):
+    @property
+    def archive_name(self):
+        return 'validation.zip'
+
+    def zip_files(self, destination, files=None, contents=None):
         """
         Create a zipfile containing run variables of PiCli.
         :param destination: Directory to write zipfile to
+        :param files: Unused, the validator sends no project files
+        :param contents: Result of archive_contents, if already built
         :return: ZipFile
         """
         try:
-            zip_file = zipfile.ZipFile(
-                f'{destination}/validation.zip', 'w', zipfile.ZIP_DEFLATED
-            )
-            if self.pipe_config.debug:
-                message = f'Writing run_vars.yml to zip'
-                LOG.info(message)
-            zip_file.writestr("run_vars.yml", self.pipe_config.dump_configs())
-            zip_file.close()
-            return zip_file
+            return super().zip_files(destination, contents=contents)
         except Exception as e:
             message = f"Zipping failed in validator. \n\n{e}"
             util.sysexit_with_message(message)
 
+    def _archive_files(self, files=None):
+        return iter(())
+
+    def _archive_entries(self, files=None):
+        if self.pipe_config.debug:
+            message = f'Writing run_vars.yml to zip'
+            LOG.info(message)
+        return {'run_vars.yml': self.pipe_config.dump_configs()}
+
     def execute(self):
-        with tempfile.TemporaryDirectory() as temp_dir:
-            zip_file = self.zip_files(temp_dir)
-            files = [('files', open(zip_file.filename, 'rb'))]
-            try:
-                if self.pipe_config.debug:
-                    LOG.info(f'Sending zipfile to {self.url}')
-                r = requests.post(self.url, files=files)
-            except requests.exceptions.RequestException as e:
-                message = f'Failed to execute validator. \n\n{e}'
-                util.sysexit_with_message(message)
-            try:
-                r.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                message = f'Failed to execute validator. \n\n{e}'
-                util.sysexit_with_message(message)
-            else:
-                results = r.json()
-                self._parse_results(results)
+        r = self.upload()
+        self._parse_results(r.json())
 
     def _parse_results(self, results):
         """
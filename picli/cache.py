@@ -0,0 +1,450 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+import picli
+from picli import logger
+from picli import util
+
+LOG = logger.get_logger(__name__)
+
+CACHE_DIR = '.picli_cache'
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+class DiskCache(object):
+    """A size-bounded key/value store in a directory
+
+    Each entry is a single file named after its key. Reading an entry
+    refreshes its modification time, and once the directory grows past
+    max_size the least recently used entries are removed. Hit and miss
+    counters are kept in stats.json next to the entries.
+    """
+
+    STATS_FILE = 'stats.json'
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param directory: Directory holding the cache entries
+        :param max_size: Maximum size of all entries in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name != self.STATS_FILE:
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def _read_stats(self):
+        try:
+            with open(self._path(self.STATS_FILE)) as f:
+                return json.load(f)
+        except (EnvironmentError, ValueError):
+            return {'hits': 0, 'misses': 0}
+
+    def count(self, counter, amount=1):
+        """
+        Increment a persistent counter such as hits or misses.
+        :param counter: Name of the counter
+        :param amount: Number to add to the counter
+        :return: None
+        """
+        if not amount:
+            return
+        with self._lock:
+            stats = self._read_stats()
+            stats[counter] = stats.get(counter, 0) + amount
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._path(self.STATS_FILE), 'w') as f:
+                    json.dump(stats, f)
+            except EnvironmentError as e:
+                LOG.warn(f'Unable to update cache statistics in {self.directory}. {e}')
+
+    def get(self, key, count=True):
+        """
+        Read an entry.
+        :param key: Entry key
+        :param count: Count the lookup as a hit or miss. Callers which
+        validate entries further count the outcome themselves.
+        :return: bytes or None if the entry doesn't exist
+        """
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            os.utime(self._path(key))
+        except EnvironmentError:
+            data = None
+        if count:
+            self.count('misses' if data is None else 'hits')
+        return data
+
+    def put(self, key, data):
+        """
+        Write an entry and evict old entries if the cache is over its size.
+        :param key: Entry key
+        :param data: bytes
+        :return: None
+        """
+        self.put_many({key: data})
+
+    def put_many(self, entries):
+        """
+        Write several entries, then evict old entries once if the cache
+        is over its size.
+        :param entries: dict of entry key to bytes
+        :return: None
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for key, data in entries.items():
+                if len(data) > self.max_size:
+                    continue
+                temp_file = \
+                    f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(temp_file, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_file, self._path(key))
+        except EnvironmentError as e:
+            LOG.warn(f'Unable to write cache entry to {self.directory}. {e}')
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_size.
+        :return: None
+        """
+        with self._lock:
+            entries = sorted(self._entries())
+            size = sum(entry_size for _, entry_size, _ in entries)
+            for _, entry_size, path in entries:
+                if size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except EnvironmentError:
+                    continue
+                size -= entry_size
+
+    def stats(self):
+        """
+        :return: dict of entry count, size, max_size, hits and misses
+        """
+        entries = self._entries()
+        stats = self._read_stats()
+        return {
+            'entries': len(entries),
+            'size': sum(entry_size for _, entry_size, _ in entries),
+            'max_size': self.max_size,
+            'hits': stats.get('hits', 0),
+            'misses': stats.get('misses', 0),
+        }
+
+    def clear(self):
+        """
+        Remove every entry and the statistics.
+        :return: None
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ConfigCache(object):
+    """Cache of the resolved configuration of a project
+
+    Entries are keyed by a digest of every file under piedpiper.d/, the
+    project base directory and the PiCli version. Each entry records the
+    modification times of the directories walked while scanning for files
+    and of the ignore files read, and is only used while none of them
+    changed, so adding, removing or renaming a file or editing an ignore
+    file invalidates it.
+    """
+
+    def __init__(self, base_dir, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param base_dir: Project base directory
+        :param max_size: Maximum size of the cache in bytes
+        """
+        self.base_dir = base_dir
+        self.cache = DiskCache(
+            os.path.join(base_dir, CACHE_DIR, 'configs'), max_size
+        )
+        self.key = self._build_key()
+
+    def _build_key(self):
+        digest = hashlib.sha256()
+        digest.update(f'{picli.__version__}\0{self.base_dir}\0'.encode())
+        piedpiper_dir = os.path.join(self.base_dir, 'piedpiper.d')
+        for root, dirs, files in os.walk(piedpiper_dir):
+            dirs.sort()
+            for file in sorted(files):
+                path = os.path.join(root, file)
+                digest.update(f'{os.path.relpath(path, piedpiper_dir)}\0'.encode())
+                try:
+                    with open(path, 'rb') as f:
+                        digest.update(hashlib.sha256(f.read()).digest())
+                except EnvironmentError:
+                    continue
+        return digest.hexdigest()
+
+    def _directory_mtimes(self, directories):
+        mtimes = {}
+        for directory in directories:
+            try:
+                mtimes[directory] = os.stat(
+                    os.path.join(self.base_dir, directory)
+                ).st_mtime_ns
+            except EnvironmentError:
+                mtimes[directory] = None
+        return mtimes
+
+    def load(self):
+        """
+        Load the resolved configuration if the scanned tree didn't change.
+        :return: dict or None
+        """
+        data = self.cache.get(self.key, count=False)
+        entry = None
+        if data is not None:
+            try:
+                entry = json.loads(data.decode())
+            except ValueError:
+                pass
+        if isinstance(entry, dict):
+            directories = entry.get('directories', {})
+            if self._directory_mtimes(directories) != directories:
+                entry = None
+        else:
+            entry = None
+        self.cache.count('misses' if entry is None else 'hits')
+        return entry
+
+    def save(self, entry, directories):
+        """
+        Store the resolved configuration.
+        :param entry: JSON-serializable dict of resolved configuration
+        :param directories: Directories walked by the file scan and the
+        ignore files it read, relative to the base directory
+        :return: None
+        """
+        try:
+            # Create the cache directory first so that doing so doesn't
+            # change the modification time of the base directory we record.
+            os.makedirs(self.cache.directory, exist_ok=True)
+        except EnvironmentError as e:
+            LOG.warn(f'Unable to create cache directory {self.cache.directory}. {e}')
+            return
+        entry = dict(entry, directories=self._directory_mtimes(directories))
+        try:
+            data = json.dumps(entry).encode()
+        except (TypeError, ValueError) as e:
+            LOG.warn(f'Unable to cache resolved configuration. {e}')
+            return
+        self.cache.put(self.key, data)
+
+
+def hash_file(path):
+    """
+    :param path: Path of a file
+    :return: Hex SHA-256 digest of the contents of the file
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileDigests(object):
+    """hash_file results of a single invocation
+
+    Each file is read for its digest at most once, however many actions
+    send it and whether the digest is needed by the result cache or for
+    the digest header of an upload.
+    """
+
+    def __init__(self):
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """
+        :param path: Path of a file
+        :return: Hex SHA-256 digest of the contents of the file
+        """
+        with self._lock:
+            digest = self._digests.get(path)
+        if digest is None:
+            digest = hash_file(path)
+            with self._lock:
+                self._digests[path] = digest
+        return digest
+
+
+def split_output(output, paths):
+    """
+    Attribute the lines of an analyzer's output to the files they are
+    about. A line belongs to a file when it starts with the path of the
+    file, optionally below some directory, followed by a ':' or '('.
+    :param output: Text returned by the analyzer
+    :param paths: Paths of the files sent to the analyzer, relative to
+    the project base directory
+    :return: dict of path to its lines of output, with an entry for every
+    path, or None when a line can't be attributed to any file
+    """
+    results = {path: [] for path in paths}
+    if not paths:
+        return results if not output.strip() else None
+    pattern = re.compile(
+        r'(?:\S*?/)??(' +
+        '|'.join(re.escape(path) for path in sorted(paths, key=len, reverse=True)) +
+        r')[:(]'
+    )
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        match = pattern.match(line)
+        if match is None:
+            return None
+        results[match.group(1)].append(line)
+    return {path: '\n'.join(lines) for path, lines in results.items()}
+
+
+class ResultCache(object):
+    """Cache of analyzer output for unchanged files
+
+    Output is stored per file when every line of it can be attributed to
+    a file, keyed by the analyzer, its function URL and version, its
+    options and the path, file_vars overrides and content hash of the
+    file. Output which can't be split up, or of an analyzer checking
+    files together, is stored for the whole batch of files it was
+    produced for instead.
+    """
+
+    def __init__(self, base_dir, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param base_dir: Project base directory
+        :param max_size: Maximum size of the cache in bytes
+        """
+        self.cache = DiskCache(
+            os.path.join(base_dir, CACHE_DIR, 'results'), max_size
+        )
+
+    @staticmethod
+    def analyzer_key(name, url, version, options):
+        """
+        :param name: Name of the analyzer
+        :param url: URL of its function
+        :param version: Version of the pipe
+        :param options: Anything else the output depends on, such as the
+        options of the action and its group_vars entries
+        :return: str identifying an analyzer and its configuration
+        """
+        return json.dumps(
+            [picli.__version__, name, url, version, options],
+            sort_keys=True, default=str
+        )
+
+    @staticmethod
+    def file_key(analyzer_key, path, overrides, digest):
+        """
+        :param analyzer_key: Result of analyzer_key
+        :param path: Path of the file relative to the base directory
+        :param overrides: file_vars overrides of the file
+        :param digest: Result of hash_file for the file
+        :return: str
+        """
+        data = json.dumps(
+            [analyzer_key, path, overrides, digest], sort_keys=True, default=str
+        )
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    @staticmethod
+    def batch_key(file_keys):
+        """
+        :param file_keys: Keys of every file of a batch
+        :return: str
+        """
+        data = '\0'.join(['batch'] + sorted(file_keys))
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, keys):
+        """
+        :param keys: Iterable of keys
+        :return: dict of key to the output stored for it, for keys found
+        """
+        results = {}
+        for key in keys:
+            data = self.cache.get(key, count=False)
+            if data is not None:
+                results[key] = data.decode()
+        return results
+
+    def put(self, results):
+        """
+        :param results: dict of key to output
+        :return: None
+        """
+        self.cache.put_many(
+            {key: output.encode() for key, output in results.items()}
+        )
+
+    def count(self, hits, misses):
+        """
+        Count files whose output was found in the cache, and files sent.
+        """
+        self.cache.count('hits', hits)
+        self.cache.count('misses', misses)
+
+
+def cache_dirs(base_dir, max_size=DEFAULT_MAX_SIZE):
+    """
+    List the caches kept for a project.
+    :param base_dir: Project base directory
+    :param max_size: Maximum size of each cache in bytes
+    :return: dict of cache name to DiskCache
+    """
+    root = os.path.join(base_dir, CACHE_DIR)
+    if not os.path.isdir(root):
+        return {}
+    return {
+        entry.name: DiskCache(entry.path, max_size)
+        for entry in sorted(os.scandir(root), key=lambda e: e.name)
+        if entry.is_dir()
+    }
+
+
+def format_size(size):
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GiB'
+
+
+def clear(base_dir):
+    """
+    Remove every cache kept for a project.
+    :param base_dir: Project base directory
+    :return: None
+    """
+    root = os.path.join(base_dir, CACHE_DIR)
+    try:
+        shutil.rmtree(root)
+    except FileNotFoundError:
+        pass
+    except EnvironmentError as e:
+        util.sysexit_with_message(f'Unable to clear cache in {root}. {e}')
@@ -1,4 +1,5 @@
 from picli.command import base  # NOQA
+from picli.command import cache  # noqa
 from picli.command import lint  # noqa
 from picli.command import style  # noqa
 from picli.command import sast  # noqa
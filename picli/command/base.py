@@ -1,5 +1,13 @@
 import abc
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import functools
+import time
+
 import picli
+from picli.actions import executors
+from picli.context import ProjectContext
 from picli import logger
 from picli import util
 
@@ -9,9 +17,9 @@ LOG = logger.get_logger(__name__)
 class Base(object):
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, base_config, debug):
-        self._base_config = base_config
-        self.debug = debug
+    def __init__(self, project_context):
+        self._project_context = project_context
+        self.debug = project_context.debug
 
     @abc.abstractmethod
     def execute(self):
@@ -22,21 +30,165 @@ class Base(object):
         LOG.info(message)
 
 
-def execute_subcommand(config, subcommand, debug):
+def get_project_context(context):
+    """
+    Build the ProjectContext shared by every subcommand of an invocation
+    from the arguments given to the picli command group.
+    :param context: click context
+    :return: ProjectContext object
+    """
+    args = context.obj.get('args')
+    return ProjectContext(
+        args['config'],
+        args['debug'],
+        cache=args['cache'],
+        result_cache=args['result_cache'],
+        cache_max_size=args['cache_max_size'],
+        changed_since=args['changed_since'],
+        jobs=args['jobs']
+    )
+
+
+def execute_subcommand(project_context, subcommand):
     """
     Dynamically discover a subcommand module and class based on
     the subcommand we are executing.
     After discovery, initialize and run the execute method
     on the discovered command object.
-    :param config: Configuration file
+    :param project_context: ProjectContext shared by the whole invocation
     :param subcommand: The subcommand we are executing
-    :param debug: boolean
     :return:
     """
     command_module = getattr(picli.command, subcommand)
     command = getattr(command_module, util.camelize(subcommand))
 
-    return command(config, debug).execute()
+    return command(project_context).execute()
+
+
+def _execute_action(action, parent=None):
+    """
+    Run a single action with its log output held back until it finished.
+    :param action: tuple of (label, callable running the action)
+    :param parent: Log buffer of the caller, see logger.buffered
+    :return: tuple of (label, seconds, SystemExit or None)
+    """
+    label, execute = action
+    start = time.perf_counter()
+    failure = None
+    with logger.buffered(parent):
+        try:
+            execute()
+        except SystemExit as e:
+            failure = e
+    return label, time.perf_counter() - start, failure
+
+
+def execute_actions(step, actions, jobs=1):
+    """
+    Run the actions of a step, such as the stylers of the style step, on
+    up to jobs worker threads.
+    The output of each action is printed in one piece once it finished.
+    A failing action doesn't stop the others. Failures are collected and
+    reported together with the results of every action at the end.
+    :param step: Name of the step the actions belong to
+    :param actions: List of (label, callable) tuples
+    :param jobs: Maximum number of actions running at the same time
+    :return: None. Exit if any action failed.
+    """
+    if jobs > 1 and len(actions) > 1:
+        execute = functools.partial(_execute_action, parent=logger.active_buffer())
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(execute, actions))
+    else:
+        results = [_execute_action(action) for action in actions]
+
+    failures = [label for label, _, failure in results if failure is not None]
+    if len(results) > 1 or failures:
+        LOG.info(f'Results of {step}')
+        for label, seconds, failure in results:
+            status = 'failed' if failure is not None else 'succeeded'
+            LOG.out(f'{label}: {status} in {seconds:.2f}s')
+    if failures:
+        message = f'{len(failures)} of {len(results)} {step} actions failed: ' \
+                  f'{", ".join(failures)}'
+        util.sysexit_with_message(message)
+
+
+def execute_batches(step, pipe_config, run):
+    """
+    Run the batches of a pipelined step, such as the style step, as soon
+    as the scan of the project produces them, on up to the concurrency
+    set by pipeline in pi_global_vars.yml. At most twice as many batches
+    are queued, so the scan waits for running batches instead of getting
+    ahead of them. The output of each batch is printed in one piece once
+    it finished. A failing batch doesn't stop the others. The results are
+    reported per analyzer at the end, along with the time it took for
+    the first batch to finish. When the step was started early by
+    execute_stages and is cancelled, no further batches are started.
+    :param step: Name of the step the batches belong to
+    :param pipe_config: Pipelined BasePipeConfig subclass object
+    :param run: Callable running the action of a batch RunConfig
+    :return: None. Exit if any batch failed.
+    """
+    concurrency = pipe_config.base_config.pipeline.get(
+        'concurrency', executors.DEFAULT_SHARD_CONCURRENCY
+    )
+    start = time.perf_counter()
+    first = None
+    results = {}
+    running = set()
+
+    def record(done):
+        nonlocal first
+        for future in done:
+            key, seconds, failure = future.result()
+            first = first or time.perf_counter() - start
+            results[key]['batches'] += 1
+            results[key]['seconds'] += seconds
+            results[key]['failures'] += failure is not None
+
+    session = pipe_config.context.session
+    execute = functools.partial(_execute_action, parent=logger.active_buffer())
+    batches = pipe_config.iter_batches()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for key, run_config in batches:
+                if session.cancelled(step):
+                    break
+                result = results.setdefault(
+                    key, {'batches': 0, 'seconds': 0, 'failures': 0}
+                )
+                result['label'] = f'{run_config.analyzer} ({run_config.name})'
+                if len(running) >= 2 * concurrency:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    record(done)
+                running.add(executor.submit(
+                    execute, (key, functools.partial(run, run_config))
+                ))
+        finally:
+            # Stop consuming the scan, which may be waiting for this step.
+            batches.close()
+        record(wait(running)[0])
+    if session.cancelled(step):
+        return
+
+    failures = [
+        result['label'] for result in results.values() if result['failures']
+    ]
+    if len(results) > 1 or failures:
+        LOG.info(f'Results of {step}')
+        for result in results.values():
+            batches = f'{result["batches"]} batch' + \
+                ('es' if result['batches'] != 1 else '')
+            status = f'{result["failures"]} of {batches} failed' \
+                if result['failures'] else f'{batches} succeeded'
+            LOG.out(f'{result["label"]}: {status} in {result["seconds"]:.2f}s')
+        if first is not None:
+            LOG.out(f'First batch finished after {first:.2f}s')
+    if failures:
+        message = f'{len(failures)} of {len(results)} {step} analyzers failed: ' \
+                  f'{", ".join(failures)}'
+        util.sysexit_with_message(message)
 
 
 def get_sequence(step):
@@ -49,15 +201,200 @@ def get_sequence(step):
         return [
             'style'
         ]
-    elif step == 'lint':
-        return [
-            'validate',
-            'style',
-            'sast'
-        ]
     elif step == 'sast':
         return [
             'sast'
         ]
     else:
         util.sysexit_with_message(f"picli sequence not found for {step}")
+
+
+LINT_STAGES = {
+    'validate': [],
+    'style': ['validate'],
+    'sast': ['validate'],
+}
+
+
+def get_stages(overrides=None):
+    """
+    Build the dependency graph of the lint stages.
+    :param overrides: dict of stage to the list of stages it depends on,
+    from lint_stages in pi_global_vars.yml, replacing the defaults of
+    those stages
+    :return: dict of stage to list of stages it depends on
+    """
+    stages = {stage: list(dependencies) for stage, dependencies in LINT_STAGES.items()}
+    errors = []
+    for stage, dependencies in (overrides or {}).items():
+        if stage not in LINT_STAGES:
+            errors.append(f'Unknown lint stage {stage}.')
+            continue
+        for dependency in dependencies:
+            if dependency not in LINT_STAGES:
+                errors.append(f'Unknown lint stage {dependency} in {stage}.')
+        stages[stage] = list(dependencies)
+
+    visiting, visited = set(), set()
+
+    def visit(stage, path):
+        if stage in visited:
+            return
+        if stage in visiting:
+            errors.append(f'Lint stages depend on each other: {" -> ".join(path)}.')
+            return
+        visiting.add(stage)
+        for dependency in stages.get(stage, []):
+            visit(dependency, path + [dependency])
+        visiting.discard(stage)
+        visited.add(stage)
+
+    if not errors:
+        for stage in stages:
+            visit(stage, [stage])
+    if errors:
+        message = 'Invalid lint_stages configuration. \n\n' + '\n'.join(errors)
+        util.sysexit_with_message(message)
+    return stages
+
+
+def _execute_stage(project_context, stage, records=None):
+    """
+    Run a stage with its log output held back until it finished.
+    :param records: List to hand the log records of the stage to instead
+    of emitting them
+    :return: tuple of (start, end, SystemExit or None)
+    """
+    start = time.perf_counter()
+    failure = None
+    with logger.buffered(records):
+        try:
+            execute_subcommand(project_context, stage)
+        except SystemExit as e:
+            failure = e
+    return start, time.perf_counter(), failure
+
+
+def _critical_path(stages, timings):
+    """
+    Follow the dependencies which finished last back from the stage which
+    finished last.
+    :return: list of stages
+    """
+    stage = max(timings, key=lambda name: timings[name][1])
+    path = [stage]
+    while True:
+        dependencies = [
+            dependency for dependency in stages[stage] if dependency in timings
+        ]
+        if not dependencies:
+            return list(reversed(path))
+        stage = max(dependencies, key=lambda name: timings[name][1])
+        path.append(stage)
+
+
+def _report_timings(stages, timings, failed, skipped):
+    LOG.info('Stage timings')
+    for stage in sorted(timings, key=lambda name: timings[name]):
+        start, end = timings[stage]
+        status = ', failed' if stage in failed else ''
+        LOG.out(f'{stage}: {start:.2f}s - {end:.2f}s ({end - start:.2f}s{status})')
+    for stage in skipped:
+        LOG.out(f'{stage}: cancelled')
+    if timings:
+        path = _critical_path(stages, timings)
+        steps = ' -> '.join(
+            f'{stage} ({timings[stage][1] - timings[stage][0]:.2f}s)' for stage in path
+        )
+        LOG.out(f'Critical path: {steps} = {timings[path[-1]][1]:.2f}s')
+
+
+def execute_stages(project_context, stages, early=()):
+    """
+    Run a dependency graph of subcommands. Each stage starts as soon as
+    every stage it depends on succeeded, so independent stages run at
+    the same time. When a stage fails, the stages depending on it are
+    cancelled while the others carry on. The output of each stage is
+    printed in one piece once it finished, followed by a timing summary
+    with the critical path through the graph.
+
+    Early stages, such as pipelined style and sast steps, start as soon as
+    the stages they depend on started, so they can send batches while the
+    scan those stages wait for is still running. Their output is held
+    back until those stages succeeded. When one of them fails, an early
+    stage is asked to stop through the Session, its output is dropped
+    and it is reported as cancelled.
+    :param project_context: ProjectContext shared by the whole invocation
+    :param stages: dict of stage to list of stages it depends on
+    :param early: Stages to start early
+    :return: None. Exit if any stage failed or was cancelled.
+    """
+    begin = time.perf_counter()
+    pending = dict(stages)
+    running = {}
+    # Log records of early stages, and results of those which finished
+    # before the stages they depend on.
+    held = {}
+    finished = {}
+    timings = {}
+    failed = []
+    skipped = []
+
+    def started(stage):
+        return stage in timings or stage in finished or stage in running.values()
+
+    def settle(stage, start, end, failure):
+        timings[stage] = (start - begin, end - begin)
+        if failure is not None:
+            failed.append(stage)
+
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        while pending or running or finished:
+            progress = False
+            for stage, dependencies in list(pending.items()):
+                if any(d in failed or d in skipped for d in dependencies):
+                    skipped.append(stage)
+                elif all(d in timings for d in dependencies):
+                    future = executor.submit(_execute_stage, project_context, stage)
+                    running[future] = stage
+                elif stage in early and all(started(d) for d in dependencies):
+                    held[stage] = []
+                    future = executor.submit(
+                        _execute_stage, project_context, stage, held[stage]
+                    )
+                    running[future] = stage
+                else:
+                    continue
+                del pending[stage]
+                progress = True
+            for stage in list(held):
+                dependencies = stages[stage]
+                if any(d in failed or d in skipped for d in dependencies):
+                    project_context.session.cancel(stage)
+                    if stage in finished:
+                        del finished[stage], held[stage]
+                        skipped.append(stage)
+                        progress = True
+                elif stage in finished and all(d in timings for d in dependencies):
+                    logger.emit(held.pop(stage))
+                    settle(stage, *finished.pop(stage))
+                    progress = True
+            if not running:
+                if not progress:
+                    break
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                if stage in held:
+                    finished[stage] = future.result()
+                else:
+                    settle(stage, *future.result())
+
+    _report_timings(stages, timings, failed, skipped)
+    project_context.session.report_warm_up()
+    if failed or skipped:
+        message = f'Failed stages: {", ".join(failed)}.'
+        if skipped:
+            message += f' Cancelled stages: {", ".join(skipped)}.'
+        util.sysexit_with_message(message)
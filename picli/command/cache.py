@@ -0,0 +1,53 @@
+import click
+from picli.cache import cache_dirs
+from picli.cache import clear as clear_cache
+from picli.cache import format_size
+from picli.config import BaseConfig
+from picli import logger
+
+LOG = logger.get_logger(__name__)
+
+
+@click.group()
+def cache():
+    """
+    Inspect or clear the caches PiCli keeps in .picli_cache
+    :return: None
+    """
+
+
+@cache.command()
+@click.pass_context
+def stats(context):
+    """
+    Print entry count, size and hit/miss counters of each cache.
+    :param context:
+    :return: None
+    """
+    args = context.obj.get('args')
+    base_dir = BaseConfig._find_base_dir(args['config'])
+    caches = cache_dirs(base_dir, args['cache_max_size'])
+    if not caches:
+        LOG.warn(f'No cache found in {base_dir}')
+        return
+    for name, disk_cache in caches.items():
+        cache_stats = disk_cache.stats()
+        LOG.info(f'Cache: {name}')
+        LOG.out(f'entries: {cache_stats["entries"]}')
+        LOG.out(f'size: {format_size(cache_stats["size"])} '
+                f'of {format_size(cache_stats["max_size"])}')
+        LOG.out(f'hits: {cache_stats["hits"]}')
+        LOG.out(f'misses: {cache_stats["misses"]}')
+
+
+@cache.command()
+@click.pass_context
+def clear(context):
+    """
+    Remove every cache PiCli keeps for the project.
+    :param context:
+    :return: None
+    """
+    base_dir = BaseConfig._find_base_dir(context.obj.get('args')['config'])
+    clear_cache(base_dir)
+    LOG.success(f'Cleared cache in {base_dir}')
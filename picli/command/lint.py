@@ -9,13 +9,21 @@ LOG = logger.get_logger(__name__)
 @click.pass_context
 def lint(context):
     """
-    Command used to execute the "lint" container found in
-    command.base
+    Command used to execute the "lint" stages found in
+    command.base. Stages run as soon as the stages they depend on
+    succeeded. Pipelined stages start along with the stages they depend
+    on, so their batches are sent while the project is being scanned.
     :param context:
     :return: None
     """
-    config_file = context.obj.get('args')['config']
-    debug = context.obj.get('args')['debug']
-    sequence = base.get_sequence('lint')
-    for action in sequence:
-        base.execute_subcommand(config_file, action, debug)
+    project_context = base.get_project_context(context)
+    project_context.session.share_payloads()
+    stages = base.get_stages(project_context.base_config.lint_stages)
+    project_context.session.warm_up(stages)
+    early = [stage for stage in stages if project_context.pipelined(stage)]
+    try:
+        base.execute_stages(project_context, stages, early)
+    finally:
+        if project_context.debug:
+            LOG.info(str(project_context.session.payloads))
+        project_context.save_cache()
@@ -1,39 +1,53 @@
 import click
+import functools
 from picli.command import base
-from picli.configs.sast_pipe import SastPipeConfig
 from picli import logger
-from picli import util
-import importlib
 
 LOG = logger.get_logger(__name__)
 
 
 class Sast(base.Base):
-    def __init__(self, base_config, debug):
-        super(Sast, self).__init__(base_config, debug)
+    def __init__(self, project_context):
+        super(Sast, self).__init__(project_context)
 
     def execute(self):
         self.print_info()
-        sast_pipe_config = SastPipeConfig(self._base_config, self.debug)
-        if sast_pipe_config.run_pipe:
-            for run_config in sast_pipe_config.run_config:
-                sast_module = getattr(
-                    importlib.import_module(
-                        f'picli.actions.sast.{run_config.config[0]["sast"]}'
-                    ),
-                    f'{util.camelize(run_config.config[0]["sast"])}'
+        sast_pipe_config = self._project_context.pipe_config('sast')
+        if sast_pipe_config.run_pipe and sast_pipe_config.pipelined:
+            base.execute_batches(
+                'sast', sast_pipe_config,
+                functools.partial(self._execute_action, sast_pipe_config)
+            )
+        elif sast_pipe_config.run_pipe:
+            actions = [
+                (
+                    f'{run_config.analyzer} ({run_config.name})',
+                    functools.partial(
+                        self._execute_action, sast_pipe_config, run_config
+                    )
                 )
-                sast_analyzer = sast_module(sast_pipe_config, run_config)
-                sast_analyzer.execute()
+                for run_config in sast_pipe_config.analyzer_run_config
+            ]
+            base.execute_actions('sast', actions, self._project_context.jobs)
         else:
             LOG.warn("SAST step not enabled.\n\nSkipping...")
 
+    @staticmethod
+    def _execute_action(sast_pipe_config, run_config):
+        sast_module = sast_pipe_config.action_class(run_config.analyzer)
+        sast_analyzer = sast_module(sast_pipe_config, run_config)
+        sast_analyzer.execute()
+
 
 @click.command()
 @click.pass_context
 def sast(context):
-    config_file = context.obj.get('args')['config']
-    debug = context.obj.get('args')['debug']
+    project_context = base.get_project_context(context)
     sequence = base.get_sequence('sast')
-    for action in sequence:
-        base.execute_subcommand(config_file, action, debug)
+    project_context.session.warm_up(sequence)
+    try:
+        for action in sequence:
+            base.execute_subcommand(project_context, action)
+    finally:
+        project_context.session.report_warm_up()
+        project_context.save_cache()
@@ -1,49 +1,64 @@
 import click
+import functools
 from picli.command import base
-from picli.configs.style_pipe import StylePipeConfig
 from picli import logger
-from picli import util
-import importlib
 
 LOG = logger.get_logger(__name__)
 
 
 class Style(base.Base):
-    def __init__(self, base_config, debug):
-        super(Style, self).__init__(base_config, debug)
+    def __init__(self, project_context):
+        super(Style, self).__init__(project_context)
 
     def execute(self):
         """
         Executes the style step.
 
-        We will first initialize a StylePipeConfig object, passing in
-        the 'pi_global_vars.yml' configuration file and a debug flag.
-        We will then dynamically discover which styler we need to run
-        based on the run_config of the StylePipeConfig object and then
-        execute that styler.
+        We will first get the StylePipeConfig object from the
+        project context shared by every step of this invocation.
+        We will then run each styler once, on every file that resolved
+        to it in the analyzer_run_config of the StylePipeConfig object.
+        A pipelined pipe runs the stylers on batches of files instead, as
+        soon as the scan of the project finds them.
         :return:
         """
         self.print_info()
-        style_pipe_config = StylePipeConfig(self._base_config, self.debug)
-        if style_pipe_config.run_pipe:
-            for run_config in style_pipe_config.run_config:
-                style_module = getattr(
-                    importlib.import_module(
-                        f'picli.actions.styler.{run_config.config[0]["styler"]}'
-                    ),
-                    f'{util.camelize(run_config.config[0]["styler"])}'
+        style_pipe_config = self._project_context.pipe_config('style')
+        if style_pipe_config.run_pipe and style_pipe_config.pipelined:
+            base.execute_batches(
+                'style', style_pipe_config,
+                functools.partial(self._execute_action, style_pipe_config)
+            )
+        elif style_pipe_config.run_pipe:
+            actions = [
+                (
+                    f'{run_config.analyzer} ({run_config.name})',
+                    functools.partial(
+                        self._execute_action, style_pipe_config, run_config
+                    )
                 )
-                styler = style_module(style_pipe_config, run_config)
-                styler.execute()
+                for run_config in style_pipe_config.analyzer_run_config
+            ]
+            base.execute_actions('style', actions, self._project_context.jobs)
         else:
             LOG.warn("Style step not enabled.\n\nSkipping...")
 
+    @staticmethod
+    def _execute_action(style_pipe_config, run_config):
+        styler_module = style_pipe_config.action_class(run_config.analyzer)
+        styler = styler_module(style_pipe_config, run_config)
+        styler.execute()
+
 
 @click.command()
 @click.pass_context
 def style(context):
-    config_file = context.obj.get('args')['config']
-    debug = context.obj.get('args')['debug']
+    project_context = base.get_project_context(context)
     sequence = base.get_sequence('style')
-    for action in sequence:
-        base.execute_subcommand(config_file, action, debug)
+    project_context.session.warm_up(sequence)
+    try:
+        for action in sequence:
+            base.execute_subcommand(project_context, action)
+    finally:
+        project_context.session.report_warm_up()
+        project_context.save_cache()
@@ -1,6 +1,5 @@
 import click
 from picli.command import base
-from picli.configs.validate_pipe import ValidatePipeConfig
 from picli import logger
 from picli.actions.validators.validator import Validator
 
@@ -11,7 +10,7 @@ class Validate(base.Base):
 
     def execute(self):
         self.print_info()
-        validator_config = ValidatePipeConfig(self._base_config, self.debug)
+        validator_config = self._project_context.pipe_config('validate')
         if self.debug:
             message = f'Debugging run_vars\n\n{validator_config.dump_configs()}'
             LOG.info(message)
@@ -25,8 +24,12 @@ class Validate(base.Base):
 @click.command()
 @click.pass_context
 def validate(context):
-    config_file = context.obj.get('args')['config']
-    debug = context.obj.get('args')['debug']
+    project_context = base.get_project_context(context)
     sequence = base.get_sequence('validate')
-    for action in sequence:
-        base.execute_subcommand(config_file, action, debug)
+    project_context.session.warm_up(sequence)
+    try:
+        for action in sequence:
+            base.execute_subcommand(project_context, action)
+    finally:
+        project_context.session.report_warm_up()
+        project_context.save_cache()
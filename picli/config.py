@@ -9,13 +9,22 @@ LOG = logger.get_logger(__name__)
 
 class BaseConfig(object):
 
-    def __init__(self, config, debug):
+    def __init__(self, config, debug, config_data=None):
+        """
+        :param config: pi_global_vars configuration file
+        :param debug: boolean
+        :param config_data: Already parsed contents of the configuration
+        file, such as from the configuration cache
+        """
         self.base_dir = self._find_base_dir(config)
-        self.config = self._read_config(config)
+        if config_data is None:
+            config_data = self._read_config(config)
+        self.config = config_data
         self.debug = debug
         self._validate()
 
-    def _find_base_dir(self, config):
+    @staticmethod
+    def _find_base_dir(config):
         """
 
         :param config: pi_global_vars configuration file
@@ -115,3 +124,67 @@ class BaseConfig(object):
     @property
     def version(self):
         return self.global_vars['version']
+
+    @property
+    def exclude(self):
+        """
+        Property defining the paths, in .gitignore syntax, which are never
+        scanned for files.
+        :return: list
+        """
+        return self.global_vars.get('exclude', [])
+
+    @property
+    def lint_stages(self):
+        """
+        Property defining overrides of the stages each lint stage
+        depends on.
+        :return: dict
+        """
+        return self.global_vars.get('lint_stages', {})
+
+    @property
+    def transport(self):
+        """
+        Property defining the HTTP transport settings, such as pool sizes
+        and timeouts.
+        :return: dict
+        """
+        return self.global_vars.get('transport', {})
+
+    @property
+    def sharding(self):
+        """
+        Property defining the limits on the number of files and bytes
+        sent to a function in a single request.
+        :return: dict
+        """
+        return self.global_vars.get('sharding', {})
+
+    @property
+    def compression(self):
+        """
+        Property defining how the members of the zipfiles sent to the
+        functions are compressed.
+        :return: dict
+        """
+        return self.global_vars.get('compression', {})
+
+    @property
+    def pipeline(self):
+        """
+        Property defining whether style and sast send their files in
+        batches while the project is still being scanned, and the size
+        of the batches.
+        :return: dict
+        """
+        return self.global_vars.get('pipeline', {})
+
+    @property
+    def gitignore(self):
+        """
+        Property defining whether .gitignore files are honoured when
+        scanning for files. Defaults to True.
+        :return: bool
+        """
+        return self.global_vars.get('gitignore', True)
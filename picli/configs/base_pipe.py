@@ -1,14 +1,19 @@
 import abc
-from itertools import filterfalse
+from array import array
+import importlib
+import json
 import os
+import threading
 
-from picli.config import BaseConfig
+from picli.actions import executors
 from picli.configs.run_config import RunConfig
 from picli import logger
 from picli import util
 
 LOG = logger.get_logger(__name__)
 
+DEFAULT_BATCH_FILES = 100
+
 
 class BasePipeConfig(object):
     """Abstract Base class for all pipes
@@ -20,87 +25,72 @@ class BasePipeConfig(object):
 
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, base_config, debug):
+    # Option of group entries and file_vars naming the analyzer of a file,
+    # such as styler, or None for pipes without analyzers.
+    analyzer_option = None
+    # Package below picli.actions of the actions running the analyzers.
+    action_package = None
+
+    def __init__(self, context):
         """
-        Builds a BaseConfig object, run configurations,
-        and a pipe_config based on the subclasses' name attr.
-        :param base_config:
+        Builds a pipe_config based on the subclasses' name attr from the
+        shared project context. Run configurations are built on first use,
+        so a pipelined pipe can start on its files before the scan of the
+        project finished.
+        :param context: ProjectContext object
         """
-        self.base_config = BaseConfig(base_config, debug)
-        self.run_config = self._build_run_config()
+        self.context = context
+        self.base_config = context.base_config
+        self._lock = threading.RLock()
+        self._resolved_run_config = None
+        self._run_config = None
+        self._analyzer_run_config = None
         self.pipe_config = self._build_pipe_config()
 
-    def _build_pipe_config(self):
+    @property
+    def resolved_run_config(self):
         """
-        Read pipe_vars.d for configuration file for the pipe.
-        Each child class will have its own pi_{self.name}.yml file located in
-        {vars_dir}/pipe_vars.d/ which will be read during
-        creation of the child class object.
-
-        :return: Configuration dictionary for the pipe
+        RunConfig objects of every group_vars file of the pipe
+        :return: list
         """
-        try:
-            with open(
-                f'{self.base_config.vars_dir}/pipe_vars.d/pi_{self.name}.yml'
-            ) as config:
-                return util.safe_load(config)
-        except IOError as e:
-            message = f"Failed to parse pi_{self.name}.yml. \n\n{e}"
-            util.sysexit_with_message(message)
+        with self._lock:
+            if self._resolved_run_config is None:
+                self._resolved_run_config = self._build_run_config()
+        return self._resolved_run_config
 
-    def _read_group_vars(self):
+    @property
+    def run_config(self):
         """
-        Read all files in {base_dir}/piedpiper.d/{vars_dir}/group_vars.d/
-        and returns a list of variable configurations. We first parse all.yml
-        if it exists so that it is the first item in the list. This allows for
-        the other group_vars files to override the values in all.yml
+        RunConfig objects narrowed down to the files changed since
+        --changed-since
         :return: list
         """
-        group_vars_dir = f'{self.base_config.vars_dir}/group_vars.d'
+        with self._lock:
+            if self._run_config is None:
+                self._run_config = self._select_changed(self.resolved_run_config)
+        return self._run_config
 
-        group_configs = []
-        if os.path.isdir(group_vars_dir):
-            for root, dirs, files in os.walk(
-                    f'{self.base_config.vars_dir}/group_vars.d/'
-            ):
-                if not len(files):
-                    message = f'No group_vars found in {self.base_config.vars_dir}'
-                    util.sysexit_with_message(message)
-                for file in files:
-                    with open(os.path.join(root, file)) as f:
-                        group_config = f.read()
-                        group_configs.append(
-                            {'file': file, 'config': util.safe_load(group_config)}
-                        )
-            return group_configs
-        else:
-            message = f'Failed to read group_vars in {self.base_config.vars_dir}.'
-            util.sysexit_with_message(message)
+    @property
+    def analyzer_run_config(self):
+        """
+        RunConfig objects grouped by analyzer, see _group_by_analyzer
+        :return: list, or None for pipes without analyzers
+        """
+        with self._lock:
+            if self._analyzer_run_config is None:
+                self._analyzer_run_config = self._group_by_analyzer(self.run_config)
+        return self._analyzer_run_config
 
-    def _read_file_vars(self):
-        """
-        Read all files in {base_dir}/piedpiper.d/{vars_dir}/files_vars.d/
-        :return: iterator
-        """
-        if os.path.isdir(f'{self.base_config.vars_dir}/file_vars.d/'):
-            for root, dirs, files in os.walk(
-                    f'{self.base_config.vars_dir}/file_vars.d/'
-            ):
-                for file in files:
-                    if file.endswith(".yml") or file.endswith(".yaml"):
-                        file_name = os.path.join(root, file)
-                        with open(file_name) as f:
-                            file_config = f.read()
-                            yield (file_config, file_name)
-                    else:
-                        message = f"Skipping invalid file_vars.d file " \
-                                  f"{os.path.join(root,file)}"
-                        LOG.debug(message)
+    def _build_pipe_config(self):
+        """
+        Read pipe_vars.d for configuration file for the pipe.
+        Each child class will have its own pi_{self.name}.yml file located in
+        {vars_dir}/pipe_vars.d/ which will be read during
+        creation of the child class object.
 
-        else:
-            message = f"Failed to read file_vars.d in" \
-                      f"{self.base_config.vars_dir}/file_vars.d/."
-            util.sysexit_with_message(message)
+        :return: Configuration dictionary for the pipe
+        """
+        return self.context.pipe_vars(self.name)
 
     def _build_group_configs(self):
         """
@@ -113,33 +103,14 @@ class BasePipeConfig(object):
         :return: list
         """
         group_configs = []
-        for group in self._read_group_vars():
+        file_matches = self.context.file_matches
+        for group in self.context.group_vars:
             for step, config in group['config'].items():
-                if step == f'pi_{self.name}':
-                    run_config = RunConfig(group['file'], config, self.base_config)
-                    for file_definition in run_config.files:
-                        for file, file_name in self._read_file_vars():
-                            file_config = util.safe_load(file)
-                            try:
-                                if file_definition['file'] == file_config['file']:
-                                    file_definition.update(file_config)
-                            except KeyError as e:
-                                message = f'Invalid file_vars config in {file_name}. ' \
-                                          f'\n\nInvalid Key: {e}'
-                                util.sysexit_with_message(message)
-                    group_configs.append(run_config)
-                elif self.name == 'validate':
-                    run_config = RunConfig(group['file'], config, self.base_config)
-                    for file_definition in run_config.files:
-                        for file, file_name in self._read_file_vars():
-                            file_config = util.safe_load(file)
-                            try:
-                                if file_definition['file'] == file_config['file']:
-                                    file_definition.update(file_config)
-                            except KeyError as e:
-                                message = f'Invalid file_vars config in {file_name}.' \
-                                          f'\n\nInvalid Key: {e}'
-                                util.sysexit_with_message(message)
+                if step == f'pi_{self.name}' or self.name == 'validate':
+                    run_config = RunConfig(
+                        group['file'], step, config,
+                        self.context.file_table, file_matches
+                    )
                     group_configs.append(run_config)
         if not len(group_configs):
             message = f'No group configs found for pi_{self.name} in' \
@@ -154,33 +125,238 @@ class BasePipeConfig(object):
         steps to use.
         :return: RunConfig object
         """
+        cached_run_configs = self.context.cached_run_configs(self.name)
+        if cached_run_configs is not None:
+            return [
+                RunConfig(
+                    run_config['name'], run_config['step'], run_config['config'],
+                    self.context.file_table,
+                    {
+                        (run_config['step'], run_config['name'], index): array('I', ids)
+                        for index, ids in enumerate(run_config.get('entries', ()))
+                    },
+                    files=run_config['files']
+                )
+                for run_config in cached_run_configs
+            ]
         run_configs = self._build_group_configs()
         run_config = self._merge_run_configs(run_configs)
         return run_config
 
-    def _merge_run_configs(self, run_configs):
+    @staticmethod
+    def _merge_run_configs(run_configs):
         """
         Merge run configurations into a single RunConfig object which will be used
         by a subcommand's execute function.
 
-        Merge all run_config.files into the first run_config.files object.
+        Files matched by any group other than all.yml are owned by that group and
+        removed from all.yml, which keeps only the files nobody else claimed.
+        Ownership is resolved with a single pass over every run_config's files
+        into a set keyed by file ID, so the cost is linear in the number of
+        file definitions.
         :param run_configs: List of RunConfig objects build from reading group_vars.d
         :return: RunConfig object
         """
-        default_run_configs = [
-            rc_default for rc_default in run_configs
-            if rc_default.name == 'all.yml']
-        other_run_configs = [
-            rc_other for rc_other in run_configs
-            if rc_other.name != 'all.yml']
-        for run_config in default_run_configs:
-            run_config.files[:] = filterfalse(
-                lambda x: x in [
-                    file for rc in other_run_configs
-                    for file in rc.files
-                ], run_config.files)
+        claimed = set()
+        for run_config in run_configs:
+            if run_config.name != 'all.yml':
+                claimed.update(run_config.files.ids)
+        for run_config in run_configs:
+            if run_config.name == 'all.yml':
+                run_config.files = run_config.files.exclude(claimed)
         return run_configs
 
+    def _select_changed(self, run_configs):
+        """
+        Narrow the run configurations down to the files changed since
+        --changed-since. Files are selected after the run configurations
+        were merged, so every file stays with the group that owns it.
+        Run configurations without any changed file are left out.
+        :param run_configs: List of RunConfig objects
+        :return: List of RunConfig objects
+        """
+        changed_ids = self.context.changed_ids
+        if changed_ids is None:
+            return run_configs
+        selected = []
+        for run_config in run_configs:
+            files = run_config.files.select(changed_ids)
+            if files:
+                selected.append(run_config.with_files(files))
+            elif self.debug:
+                LOG.info(f'No changed files in {run_config.name} for pi_{self.name}')
+        return selected
+
+    def _group_by_analyzer(self, run_configs):
+        """
+        Regroup the files of the run configurations by the analyzer they
+        resolve to, so that each analyzer runs once on all of its files no
+        matter how many group_vars files select it. The analyzer of a file
+        is the one set for it in file_vars.d/, or else the one of the group
+        entry that matched it. Entries of the same analyzer with different
+        options can't share a request, so files are grouped by analyzer
+        and options. Each RunConfig keeps the group entries it was built
+        from, in group order, and lists a file only once.
+        :param run_configs: List of RunConfig objects
+        :return: List of RunConfig objects with their analyzer set, in the
+        order the analyzers first appear in, or None for pipes without
+        analyzers
+        """
+        if self.analyzer_option is None:
+            return None
+        groups = {}
+        for run_config in run_configs:
+            for file, entry in run_config.file_entries():
+                key, own_entry = self._resolve_analyzer(file, entry, run_config.name)
+                group = groups.setdefault(
+                    key, {'names': [], 'config': {}, 'ids': array('I'), 'seen': set()}
+                )
+                if run_config.name not in group['names']:
+                    group['names'].append(run_config.name)
+                if own_entry:
+                    group['config'].setdefault(id(entry), entry)
+                if file.id not in group['seen']:
+                    group['seen'].add(file.id)
+                    group['ids'].append(file.id)
+        return [
+            RunConfig(
+                ', '.join(group['names']), f'pi_{self.name}',
+                list(group['config'].values()), self.context.file_table, {},
+                files=group['ids'], analyzer=analyzer
+            )
+            for (analyzer, _), group in groups.items()
+        ]
+
+    def _resolve_analyzer(self, file, entry, group_name):
+        """
+        :param file: FileRecord object
+        :param entry: Group entry which matched the file
+        :param group_name: Name of the group_vars file of the entry
+        :return: tuple of the (analyzer, options) key the file is grouped
+        by and whether the entry names that analyzer
+        """
+        option = self.analyzer_option
+        analyzer = file.get(option) or entry.get(option)
+        if not analyzer:
+            message = f'No {option} set for {file.path} in ' \
+                      f'{self.base_config.vars_dir}/group_vars.d/{group_name}'
+            util.sysexit_with_message(message)
+        own_entry = entry.get(option) == analyzer
+        options = entry.get('options') if own_entry else None
+        return (analyzer, json.dumps(options, sort_keys=True, default=str)), own_entry
+
+    @property
+    def pipelined(self):
+        """
+        Whether the files of the pipe are sent in batches while the project
+        is still being scanned, see ProjectContext.pipelined
+        :return: bool
+        """
+        return self.context.pipelined(self.name)
+
+    def iter_batches(self):
+        """
+        Resolve each file of the pipe to its analyzer as soon as the scan
+        of the project finds it, and group the files of each analyzer and
+        options into batches of at most max_files files and max_bytes
+        bytes, as set by pipeline in pi_global_vars.yml. A batch is yielded
+        as soon as it is full, and the rest once the scan finished, so only
+        the batches being filled are held at any time. Analyzers checking
+        files together, such as cppcheck, get every file in a single batch
+        once the scan finished. Files are resolved the same way as for
+        analyzer_run_config, but kept in the order the scan found them.
+        :return: Iterator of ((analyzer, options) key, RunConfig of the batch)
+        """
+        settings = self.base_config.pipeline
+        max_files = settings.get('max_files')
+        max_bytes = settings.get('max_bytes')
+        if not max_files and not max_bytes:
+            max_files = DEFAULT_BATCH_FILES
+        groups = {}
+        for file, entries in self._iter_file_entries():
+            keys = set()
+            for group_name, entry in entries:
+                key, own_entry = self._resolve_analyzer(file, entry, group_name)
+                if key not in groups:
+                    groups[key] = {
+                        'names': [], 'config': {}, 'ids': array('I'), 'size': 0,
+                        'table': file.table,
+                        'cross_file': self.action_class(key[0]).cross_file,
+                    }
+                group = groups[key]
+                if group_name not in group['names']:
+                    group['names'].append(group_name)
+                if own_entry:
+                    group['config'].setdefault(id(entry), entry)
+                if key in keys:
+                    continue
+                keys.add(key)
+                size = os.path.getsize(file.abs_path) if max_bytes else 0
+                if group['ids'] and not group['cross_file'] and (
+                    (max_files and len(group['ids']) >= max_files) or
+                    (max_bytes and group['size'] + size > max_bytes)
+                ):
+                    yield key, self._batch(key, group)
+                    group['ids'] = array('I')
+                    group['size'] = 0
+                group['ids'].append(file.id)
+                group['size'] += size
+        for key, group in groups.items():
+            if group['ids']:
+                yield key, self._batch(key, group)
+
+    def _batch(self, key, group):
+        return RunConfig(
+            ', '.join(group['names']), f'pi_{self.name}',
+            list(group['config'].values()), group['table'], {},
+            files=group['ids'], analyzer=key[0], batch=True
+        )
+
+    def _iter_file_entries(self):
+        """
+        Pair each file of the pipe with the entry of every group_vars file
+        which matched it, as soon as the scan finds it. The rules of the
+        run configurations apply: files matched by another group are left
+        out of all.yml, the first matching entry of a group is used and
+        with --changed-since only changed files are kept.
+        :return: Iterator of (FileRecord, list of (group file, entry))
+        """
+        step = f'pi_{self.name}'
+        groups = {
+            group['file']: (order, group['config'][step])
+            for order, group in enumerate(self.context.group_vars)
+            if step in group['config']
+        }
+        if not groups:
+            message = f'No group configs found for pi_{self.name} in' \
+                      f'{self.base_config.vars_dir}/group_vars.d/'
+            util.sysexit_with_message(message)
+        changed_files = self.context.changed_files
+        for file, tags in self.context.iter_files():
+            indexes = {}
+            for tag_step, group_name, index in tags:
+                if tag_step == step and index < indexes.get(group_name, index + 1):
+                    indexes[group_name] = index
+            if any(group_name != 'all.yml' for group_name in indexes):
+                indexes.pop('all.yml', None)
+            if not indexes or \
+                    (changed_files is not None and file.path not in changed_files):
+                continue
+            yield file, [
+                (group_name, groups[group_name][1][indexes[group_name]])
+                for group_name in sorted(indexes, key=lambda name: groups[name][0])
+            ]
+
+    def action_class(self, analyzer):
+        """
+        :param analyzer: Name of an analyzer of the pipe, such as flake8
+        :return: Action class running the analyzer
+        """
+        return getattr(
+            importlib.import_module(f'picli.actions.{self.action_package}.{analyzer}'),
+            util.camelize(analyzer)
+        )
+
     @property
     def debug(self):
         return self.base_config.debug
@@ -202,20 +378,55 @@ class BasePipeConfig(object):
     def version(self):
         return self.pipe_config[f'pi_{self.name}_pipe_vars']['version']
 
-    def dump_configs(self):
+    @property
+    def executor(self):
+        """
+        Backend running the analyzers of the pipe, set by executor in
+        pipe_vars: the remote functions by default, or local processes.
+        :return: RemoteExecutor or LocalExecutor object
+        """
+        pipe_vars = self.pipe_config[f'pi_{self.name}_pipe_vars']
+        return executors.get_executor(
+            pipe_vars.get('executor', 'remote'), self.base_config,
+            pipe_vars.get('processes')
+        )
+
+    def build_run_vars(self, files=None):
+        """
+        Build the run_vars of the pipe as a dictionary. The dictionary
+        shares file definitions and configuration with this object, so
+        callers must not modify nested values in place.
+        :param files: Files to list instead of every file of the pipe. The
+        group configs are then read from group_vars, so the files of the
+        pipe don't have to be resolved.
+        :return: dict
+        """
         merged_run_configs = {}
-        file_configs = [
-            file
-            for run_config in self.run_config
-            for file in run_config.files
-        ]
-        group_configs = [
-            group_config
-            for run_config in self.run_config
-            for group_config in run_config.config
-        ]
+        if files is None:
+            file_configs = [
+                file
+                for run_config in self.run_config
+                for file in run_config.files.definitions()
+            ]
+            group_configs = [
+                group_config
+                for run_config in self.run_config
+                for group_config in run_config.config
+            ]
+        else:
+            file_configs = [file.as_dict() for file in files]
+            group_configs = [
+                group_config
+                for group in self.context.group_vars
+                for step, config in group['config'].items()
+                if step == f'pi_{self.name}' or self.name == 'validate'
+                for group_config in config
+            ]
         util.merge_dicts(merged_run_configs, {'file_config': file_configs})
         util.merge_dicts(merged_run_configs, {'group_configs': group_configs})
         util.merge_dicts(merged_run_configs, self.base_config.config)
         util.merge_dicts(merged_run_configs, self.pipe_config)
-        return util.safe_dump(merged_run_configs)
+        return merged_run_configs
+
+    def dump_configs(self):
+        return util.safe_dump(self.build_run_vars())
@@ -0,0 +1,511 @@
+from array import array
+import glob
+import os
+import re
+import time
+
+from picli import logger
+
+LOG = logger.get_logger(__name__)
+
+# Ignored in addition to the configured exclude patterns. They can be
+# re-included with a negated pattern such as "!node_modules/".
+DEFAULT_EXCLUDE = ('node_modules/',)
+
+
+def _has_magic(component):
+    return re.search(r'[*?[]', component) is not None
+
+
+def _identity(directory):
+    """
+    :return: tuple of (device, inode) identifying a directory
+    """
+    stat = os.stat(directory)
+    return stat.st_dev, stat.st_ino
+
+
+def _translate_component(component, gitignore=False):
+    """
+    Translate a single path component of a glob pattern into a regular
+    expression which matches exactly one path component.
+    Follows glob.glob semantics: wildcards never match a leading '.'
+    unless the pattern itself starts with one.
+    :param component: A glob pattern component without separators
+    :param gitignore: Follow .gitignore semantics instead, where wildcards
+    match a leading '.' and a backslash escapes the next character
+    :return: str
+    """
+    if not _has_magic(component):
+        if gitignore:
+            component = re.sub(r'\\(.)', r'\1', component)
+        return re.escape(component)
+
+    regex = '' if component.startswith('.') or gitignore else r'(?!\.)'
+    index, length = 0, len(component)
+    while index < length:
+        char = component[index]
+        index += 1
+        if char == '\\' and gitignore and index < length:
+            regex += re.escape(component[index])
+            index += 1
+        elif char == '*':
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '[':
+            end = index
+            if end < length and component[end] == '!':
+                end += 1
+            if end < length and component[end] == ']':
+                end += 1
+            while end < length and component[end] != ']':
+                end += 1
+            if end >= length:
+                regex += r'\['
+            else:
+                chars = component[index:end].replace('\\', r'\\')
+                index = end + 1
+                # Escape what re would read as a nested set or a set
+                # operation, as fnmatch.translate does.
+                chars = re.sub(r'([\[&~|])', r'\\\1', chars)
+                if chars.startswith('!'):
+                    chars = '^' + chars[1:]
+                elif chars.startswith('^'):
+                    chars = '\\' + chars
+                regex += f'[{chars}]'
+        else:
+            regex += re.escape(char)
+    return regex
+
+
+def translate(pattern):
+    """
+    Translate a recursive glob pattern, relative to the project base
+    directory, into a regular expression matching relative file paths.
+    :param pattern: Glob pattern such as "**/*.py"
+    :return: str
+    """
+    if pattern.endswith('/'):
+        # Only directories can match, never files.
+        return '(?!)'
+    components = [
+        component for component in pattern.split('/')
+        if component not in ('', '.')
+    ]
+    regex = ''
+    for index, component in enumerate(components):
+        last = index == len(components) - 1
+        if component == '**':
+            if last:
+                regex += r'[^/.][^/]*(?:/[^/.][^/]*)*'
+            else:
+                regex += r'(?:[^/.][^/]*/)*'
+        else:
+            regex += _translate_component(component)
+            if not last:
+                regex += '/'
+    return regex
+
+
+def _translate_ignore(pattern):
+    """
+    Translate a .gitignore pattern, with the leading '!' and trailing '/'
+    already removed, into a regular expression matching paths relative
+    to the directory of the .gitignore file.
+    :param pattern: .gitignore pattern such as "build" or "docs/**/*.html"
+    :return: str
+    """
+    # A slash anywhere but at the end anchors the pattern to the directory
+    # of the .gitignore file. Otherwise it matches a name at any depth.
+    anchored = '/' in pattern
+    components = pattern.lstrip('/').split('/')
+    regex = '' if anchored else '(?:.*/)?'
+    for index, component in enumerate(components):
+        last = index == len(components) - 1
+        if component == '**':
+            regex += '.*' if last else '(?:.*/)?'
+        else:
+            regex += _translate_component(component, gitignore=True)
+            if not last:
+                regex += '/'
+    return regex
+
+
+class IgnoreRules(object):
+    """Rules of a single .gitignore style source
+
+    Rules apply to paths below the directory of their source. As in git,
+    the last rule matching a path decides whether it is ignored, rules
+    starting with '!' re-include paths and rules ending with '/' only
+    match directories. The rules are compiled into a single alternation,
+    last rule first, so one match call finds the deciding rule.
+    """
+
+    def __init__(self, lines, directory=''):
+        """
+        :param lines: Lines in .gitignore syntax
+        :param directory: Directory the rules are relative to, relative
+        to the project base directory
+        """
+        self.directory = directory
+        self.prefix = f'{directory}/' if directory else ''
+        self.negated = {}
+        rules = []
+        for line in lines:
+            rule = self._parse(line)
+            if rule is not None:
+                rules.append(rule)
+                self.negated[f'r{len(rules) - 1}'] = rule[1]
+        self._file_regex = self._compile(
+            [index for index, rule in enumerate(rules) if not rule[2]], rules
+        )
+        self._dir_regex = self._compile(range(len(rules)), rules)
+
+    def __bool__(self):
+        return self._dir_regex is not None
+
+    @staticmethod
+    def _parse(line):
+        """
+        :return: tuple of (regex, negated, directories only) or None for
+        blank lines and comments
+        """
+        line = line.rstrip('\n')
+        if not line.endswith('\\ '):
+            line = line.rstrip(' ')
+        if not line or line.startswith('#'):
+            return None
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        directories_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+        return _translate_ignore(line), negated, directories_only
+
+    @staticmethod
+    def _compile(indexes, rules):
+        alternatives = [
+            f'(?P<r{index}>{rules[index][0]})\\Z' for index in reversed(indexes)
+        ]
+        if not alternatives:
+            return None
+        return re.compile('|'.join(alternatives), re.DOTALL)
+
+    def match(self, path, is_dir=False):
+        """
+        :param path: Path relative to the project base directory, below
+        the directory of these rules
+        :param is_dir: Whether the path is a directory
+        :return: True if ignored, False if re-included by a negated rule
+        and None if no rule matches
+        """
+        regex = self._dir_regex if is_dir else self._file_regex
+        if regex is None:
+            return None
+        match = regex.match(path, len(self.prefix))
+        if match is None:
+            return None
+        return not self.negated[match.lastgroup]
+
+
+class FileMatcher(object):
+    """Match every group_vars file glob against the project in a single scan
+
+    Patterns are registered with a tag identifying where they came from,
+    typically the pipe, group_vars file and entry index. All patterns are
+    compiled into one regular expression made of optional zero-width
+    lookaheads, one per distinct pattern, so a single match call on a path
+    reports every pattern that path satisfies. The project tree is walked
+    once and each file is tested once.
+
+    Directories ignored by .gitignore files, by the exclude patterns and
+    .git directories and virtualenvs are pruned without descending into
+    them, and ignored files are never matched.
+    """
+
+    def __init__(self, base_dir, exclude_dirs=(), exclude=(), gitignore=True):
+        """
+        :param base_dir: Project base directory patterns are relative to
+        :param exclude_dirs: Directories, relative to the base directory,
+        which are never scanned
+        :param exclude: Patterns in .gitignore syntax, relative to the base
+        directory, of paths to ignore. They take precedence over
+        .gitignore files.
+        :param gitignore: Honour .gitignore files and .git/info/exclude
+        """
+        self.base_dir = base_dir
+        self.exclude_dirs = set(exclude_dirs)
+        self.exclude = IgnoreRules(DEFAULT_EXCLUDE + tuple(exclude))
+        self.gitignore = gitignore
+        self.patterns = {}
+        self.directories = []
+        self.ignore_files = []
+        self.pruned = []
+        self.ignored = 0
+        self.complete = True
+        self._ignore_rules = {}
+
+    def add(self, pattern, tag):
+        """
+        Register a glob pattern.
+        :param pattern: Glob pattern relative to the base directory
+        :param tag: Hashable tag the matched files will be reported under
+        :return: None
+        """
+        self.patterns.setdefault(pattern, []).append(tag)
+
+    @staticmethod
+    def _is_scannable(pattern):
+        """
+        Patterns escaping the base directory can't be answered by
+        walking it and are handed to glob instead.
+        """
+        return not os.path.isabs(pattern) and \
+            '..' not in pattern.split('/')
+
+    def _compile(self, patterns):
+        groups = ''.join(
+            f'(?:(?={translate(pattern)}\\Z)(?P<p{index}>))?'
+            for index, pattern in enumerate(patterns)
+        )
+        return re.compile(groups)
+
+    def _scan_roots(self, patterns):
+        """
+        Find the directories which need walking. Patterns starting with
+        literal components only need the directory those components name.
+        :return: list of directories relative to the base directory
+        """
+        roots = set()
+        for pattern in patterns:
+            components = [
+                component for component in pattern.split('/')[:-1]
+                if component not in ('', '.')
+            ]
+            prefix = []
+            for component in components:
+                if _has_magic(component):
+                    break
+                prefix.append(component)
+            roots.add('/'.join(prefix))
+        roots = sorted(roots)
+        return [
+            root for root in roots
+            if not any(
+                other != root and (other == '' or root.startswith(other + '/'))
+                for other in roots
+            )
+        ]
+
+    def _walk_hidden(self, patterns):
+        """
+        Wildcards never descend into hidden directories, so they are only
+        walked when a pattern names one explicitly.
+        """
+        return any(
+            component.startswith('.') and component not in ('.', '..')
+            for pattern in patterns
+            for component in pattern.split('/')[:-1]
+        )
+
+    def _read_ignore_file(self, path, directory):
+        """
+        Read a .gitignore style file once.
+        :param path: Path of the file relative to the base directory
+        :param directory: Directory its rules are relative to
+        :return: IgnoreRules object or None
+        """
+        if path not in self._ignore_rules:
+            rules = None
+            self.ignore_files.append(path)
+            try:
+                with open(os.path.join(self.base_dir, path)) as f:
+                    rules = IgnoreRules(f.read().splitlines(), directory)
+            except (EnvironmentError, UnicodeDecodeError):
+                pass
+            self._ignore_rules[path] = rules if rules else None
+        return self._ignore_rules[path]
+
+    def _directory_rules(self, rules, directory, files=None):
+        """
+        Add the rules of the .gitignore file of a directory.
+        :param rules: List of IgnoreRules of the parent directory
+        :param directory: Directory relative to the base directory
+        :param files: Files in the directory, if already listed
+        :return: list of IgnoreRules
+        """
+        if not self.gitignore or (files is not None and '.gitignore' not in files):
+            return rules
+        prefix = f'{directory}/' if directory else ''
+        ignore = self._read_ignore_file(f'{prefix}.gitignore', directory)
+        return rules + [ignore] if ignore else rules
+
+    def _is_ignored(self, rules, path, is_dir=False):
+        ignored = self.exclude.match(path, is_dir)
+        if ignored is not None:
+            return ignored
+        for ignore in reversed(rules):
+            ignored = ignore.match(path, is_dir)
+            if ignored is not None:
+                return ignored
+        return False
+
+    def _root_rules(self, root):
+        """
+        Collect the ignore rules of the directories above a scan root.
+        :param root: Directory relative to the base directory
+        :return: list of IgnoreRules, or None if the root is ignored
+        """
+        rules = []
+        if self.gitignore:
+            info_exclude = self._read_ignore_file(
+                os.path.join('.git', 'info', 'exclude'), ''
+            )
+            if info_exclude:
+                rules.append(info_exclude)
+        components = root.split('/') if root else []
+        for index, component in enumerate(components):
+            rules = self._directory_rules(rules, '/'.join(components[:index]))
+            path = '/'.join(components[:index + 1])
+            if component == '.git' or self._is_ignored(rules, path, True):
+                self.pruned.append(path)
+                return None
+        return rules
+
+    def _is_loop(self, path):
+        """
+        Symlinked directories are followed like glob does, unless they
+        lead back to a directory above them.
+        :param path: Path of a symlinked directory relative to the base
+        directory
+        :return: bool
+        """
+        components = path.split('/')
+        target = _identity(os.path.join(self.base_dir, path))
+        return any(
+            _identity(os.path.join(self.base_dir, *components[:index])) == target
+            for index in range(len(components))
+        )
+
+    def _walk(self, patterns):
+        walk_hidden = self._walk_hidden(patterns)
+        for root in self._scan_roots(patterns):
+            rules = self._root_rules(root)
+            if rules is None:
+                continue
+            inherited = {root or '.': rules}
+            top = os.path.join(self.base_dir, root) if root else self.base_dir
+            for directory, dirs, files in os.walk(top, followlinks=True):
+                relative = os.path.relpath(directory, self.base_dir)
+                if os.sep != '/':
+                    relative = relative.replace(os.sep, '/')
+                prefix = '' if relative == '.' else relative + '/'
+                self.directories.append(relative)
+                if prefix and 'pyvenv.cfg' in files:
+                    # A virtualenv, which is never part of the project.
+                    self.pruned.append(relative)
+                    dirs[:] = []
+                    continue
+                rules = self._directory_rules(
+                    inherited.pop(relative), prefix[:-1], files
+                )
+                kept = []
+                for d in sorted(dirs):
+                    path = prefix + d
+                    if (not walk_hidden and d.startswith('.')) or \
+                            path in self.exclude_dirs:
+                        continue
+                    if d == '.git' or self._is_ignored(rules, path, True):
+                        self.pruned.append(path)
+                        continue
+                    if os.path.islink(os.path.join(directory, d)) and \
+                            self._is_loop(path):
+                        continue
+                    kept.append(d)
+                    inherited[path] = rules
+                dirs[:] = kept
+                for file in sorted(files):
+                    path = prefix + file
+                    if self._is_ignored(rules, path):
+                        self.ignored += 1
+                        continue
+                    yield path
+
+    def pruned_size(self):
+        """
+        Walk the pruned directories to find out how much work pruning
+        saved. This is only meant for reporting, as it undoes the savings.
+        :return: tuple of (number of files, seconds spent walking them)
+        """
+        start = time.perf_counter()
+        files = 0
+        for path in self.pruned:
+            for _, _, names in os.walk(os.path.join(self.base_dir, path)):
+                files += len(names)
+        return files, time.perf_counter() - start
+
+    def iter_scan(self, table):
+        """
+        Walk the project once and yield each matched file as soon as it
+        is found. Every matched file is added to the FileTable once. Every
+        directory walked is recorded in self.directories. Patterns which
+        have to be answered by glob instead are only answered once the
+        walk finished, and set self.complete to False since those
+        directories aren't recorded. Their files may be yielded again
+        with further tags.
+        :param table: FileTable to add matched files to
+        :return: Iterator of (file ID, list of tags)
+        """
+        scannable = [
+            pattern for pattern in self.patterns if self._is_scannable(pattern)
+        ]
+
+        if scannable:
+            matcher = self._compile(scannable)
+            tags = [self.patterns[pattern] for pattern in scannable]
+            for relative in self._walk(scannable):
+                match = matcher.match(relative)
+                file_tags = [
+                    tag
+                    for group, value in enumerate(match.groups()) if value is not None
+                    for tag in tags[group]
+                ]
+                if file_tags:
+                    yield table.add(relative), file_tags
+
+        for pattern in self.patterns:
+            if pattern not in scannable:
+                self.complete = False
+                file_list = glob.glob(f'{self.base_dir}/{pattern}', recursive=True)
+                for file in file_list:
+                    if os.path.isdir(file):
+                        continue
+                    relative = table.relative_path(file)
+                    id = table.lookup(relative)
+                    yield table.add(relative) if id is None else id, \
+                        self.patterns[pattern]
+
+    @property
+    def streamable(self):
+        """
+        Whether iter_scan yields every file only once, with all of its tags
+        """
+        return all(self._is_scannable(pattern) for pattern in self.patterns)
+
+    def scan(self, table):
+        """
+        Walk the project once and return the files matched by each tag,
+        see iter_scan.
+        :param table: FileTable to add matched files to
+        :return: dict of tag to array of file IDs
+        """
+        matches = {
+            tag: array('I') for tags in self.patterns.values() for tag in tags
+        }
+        for id, tags in self.iter_scan(table):
+            for tag in tags:
+                matches[tag].append(id)
+        return matches
@@ -0,0 +1,176 @@
+from array import array
+import os
+import sys
+
+
+class FileTable(object):
+    """Compact table of every project file PiCli works with
+
+    Each file is stored once per invocation as an interned path relative
+    to the project base directory, identified by its position in the
+    table. Per-file overrides from file_vars.d/ are kept in a sparse
+    dictionary keyed by that ID. Run configurations reference files by ID
+    through FileSet objects, and dictionary views of the files are only
+    produced when they are serialized.
+    """
+
+    def __init__(self, base_dir):
+        """
+        :param base_dir: Project base directory paths are relative to
+        """
+        self.base_dir = base_dir
+        self.paths = []
+        self.overrides = {}
+        self._index = None
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add(self, path):
+        """
+        Add a file to the table without checking whether it is already
+        there. Use lookup first when the path may have been added before.
+        :param path: Path relative to the base directory
+        :return: int ID of the file
+        """
+        self.paths.append(sys.intern(path))
+        if self._index is not None:
+            self._index[self.paths[-1]] = len(self.paths) - 1
+        return len(self.paths) - 1
+
+    def lookup(self, path):
+        """
+        Find the ID of a file. Builds a path index on first use.
+        :param path: Path relative to the base directory
+        :return: int ID or None
+        """
+        if self._index is None:
+            self._index = {path: id for id, path in enumerate(self.paths)}
+        return self._index.get(path)
+
+    def relative_path(self, path):
+        """
+        Normalize a path to the form used as key in the table.
+        :param path: Absolute path or path relative to the base directory
+        :return: str
+        """
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.base_dir)
+        path = os.path.normpath(path)
+        if os.sep != '/':
+            path = path.replace(os.sep, '/')
+        return path
+
+    def abs_path(self, id):
+        return os.path.normpath(os.path.join(self.base_dir, self.paths[id]))
+
+    def definition(self, id):
+        """
+        Dictionary view of a file, as written to run_vars.
+        :param id: ID of the file
+        :return: dict
+        """
+        definition = {'file': self.abs_path(id)}
+        definition.update(self.overrides.get(id, {}))
+        return definition
+
+    def to_dict(self):
+        """
+        Serializable form of the table, used by the configuration cache.
+        :return: dict
+        """
+        return {
+            'base_dir': self.base_dir,
+            'paths': self.paths,
+            'overrides': {str(id): value for id, value in self.overrides.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        table = cls(data['base_dir'])
+        table.paths = [sys.intern(path) for path in data['paths']]
+        table.overrides = {
+            int(id): value for id, value in data['overrides'].items()
+        }
+        return table
+
+
+class FileRecord(object):
+    """A file of a FileSet, viewed through its FileTable"""
+
+    __slots__ = ('table', 'id')
+
+    def __init__(self, table, id):
+        self.table = table
+        self.id = id
+
+    @property
+    def path(self):
+        """
+        Path relative to the project base directory
+        """
+        return self.table.paths[self.id]
+
+    @property
+    def abs_path(self):
+        return self.table.abs_path(self.id)
+
+    @property
+    def overrides(self):
+        """
+        Overrides from file_vars.d/ for this file
+        """
+        return self.table.overrides.get(self.id, {})
+
+    def get(self, key, default=None):
+        return self.overrides.get(key, default)
+
+    def as_dict(self):
+        return self.table.definition(self.id)
+
+
+class FileSet(object):
+    """An ordered list of files of a FileTable, stored as an array of IDs"""
+
+    __slots__ = ('table', 'ids')
+
+    def __init__(self, table, ids=()):
+        """
+        :param table: FileTable the IDs refer to
+        :param ids: Iterable of file IDs
+        """
+        self.table = table
+        self.ids = ids if isinstance(ids, array) else array('I', ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        table = self.table
+        for id in self.ids:
+            yield FileRecord(table, id)
+
+    def __bool__(self):
+        return bool(self.ids)
+
+    def exclude(self, ids):
+        """
+        :param ids: Container of IDs to leave out
+        :return: FileSet without the given IDs
+        """
+        return FileSet(self.table, array('I', (id for id in self.ids if id not in ids)))
+
+    def select(self, ids):
+        """
+        :param ids: Container of IDs to keep
+        :return: FileSet of only the given IDs
+        """
+        return FileSet(self.table, array('I', (id for id in self.ids if id in ids)))
+
+    def definitions(self):
+        """
+        Dictionary views of the files, as written to run_vars.
+        :return: list of dicts
+        """
+        definition = self.table.definition
+        return [definition(id) for id in self.ids]
@@ -0,0 +1,124 @@
+import os
+
+from picli import logger
+from picli import util
+
+LOG = logger.get_logger(__name__)
+
+
+class FileVars(object):
+    """Index of the file definitions found in file_vars.d/
+
+    Every file in {vars_dir}/file_vars.d/ is parsed exactly once and keyed by
+    the path of the file it overrides, normalized relative to the project
+    base directory. Applying the overrides to a file definition is then a
+    single dictionary lookup instead of a walk over file_vars.d/.
+
+    All invalid definitions and duplicate keys are collected while the index
+    is built and reported together.
+    """
+
+    def __init__(self, vars_dir, base_dir):
+        """
+        Build the index for a vars directory.
+        :param vars_dir: The vars directory containing file_vars.d/
+        :param base_dir: Project base directory the file keys are relative to
+        """
+        self.file_vars_dir = os.path.join(vars_dir, 'file_vars.d')
+        self.base_dir = base_dir
+        self.index = self._build_index()
+
+    def normalize(self, path):
+        """
+        Normalize a file path to the key used by the index.
+        Absolute paths are made relative to the base directory.
+        :param path: Relative or absolute path of a project file
+        :return: str
+        """
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.base_dir)
+        return os.path.normpath(path)
+
+    def _read_file_vars(self):
+        """
+        Read all files in {base_dir}/piedpiper.d/{vars_dir}/files_vars.d/
+        :return: iterator
+        """
+        if os.path.isdir(self.file_vars_dir):
+            for root, dirs, files in os.walk(self.file_vars_dir):
+                for file in sorted(files):
+                    file_name = os.path.join(root, file)
+                    if file.endswith(".yml") or file.endswith(".yaml"):
+                        with open(file_name) as f:
+                            yield (util.safe_load(f), file_name)
+                    else:
+                        message = f"Skipping invalid file_vars.d file {file_name}"
+                        LOG.debug(message)
+        else:
+            message = f"Failed to read file_vars.d in {self.file_vars_dir}."
+            util.sysexit_with_message(message)
+
+    def _build_index(self):
+        """
+        Parse every file_vars file once and key its overrides by the
+        normalized path of the file it defines.
+        :return: dict
+        """
+        index = {}
+        sources = {}
+        errors = []
+        for file_config, file_name in self._read_file_vars():
+            if not isinstance(file_config, dict):
+                errors.append(f'Invalid file_vars config in {file_name}.')
+                continue
+            try:
+                key = self.normalize(file_config['file'])
+            except KeyError as e:
+                errors.append(
+                    f'Invalid file_vars config in {file_name}. Invalid Key: {e}'
+                )
+                continue
+            except (TypeError, ValueError) as e:
+                errors.append(f'Invalid file_vars config in {file_name}. {e}')
+                continue
+            if key in index:
+                errors.append(
+                    f'Duplicate file_vars definition for {key} in {file_name}. '
+                    f'Already defined in {sources[key]}.'
+                )
+                continue
+            index[key] = {
+                option: value
+                for option, value in file_config.items()
+                if option != 'file'
+            }
+            sources[key] = file_name
+
+        if errors:
+            message = 'Invalid file_vars.d configuration. \n\n' + '\n'.join(errors)
+            util.sysexit_with_message(message)
+
+        return index
+
+    def get(self, path):
+        """
+        Return the overrides defined for a file.
+        :param path: Relative or absolute path of a project file
+        :return: dict or None
+        """
+        return self.index.get(self.normalize(path))
+
+    def apply(self, table, ids=None):
+        """
+        Record the file_vars overrides of the files in a FileTable.
+        :param table: FileTable object
+        :param ids: IDs of the files to apply overrides to, every file by
+        default
+        :return: None
+        """
+        if not self.index:
+            return
+        for id in range(len(table.paths)) if ids is None else ids:
+            overrides = self.index.get(table.paths[id])
+            if overrides:
+                table.overrides[id] = overrides
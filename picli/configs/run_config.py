@@ -1,60 +1,113 @@
-from picli import logger
-from picli import util
+from array import array
 
-import glob
-import os
+from picli.configs.file_table import FileSet
+from picli import logger
 
 LOG = logger.get_logger(__name__)
 
 
 class RunConfig(object):
 
-    def __init__(self, name, config, base_config):
+    def __init__(self, name, step, config, file_table, file_matches, files=None,
+                 analyzer=None, batch=False):
+        """
+        :param name: Name of the group_vars file
+        :param step: Pipe key in the group_vars file, such as pi_style
+        :param config: List of group entries for the pipe
+        :param file_table: FileTable holding every matched file
+        :param file_matches: Result of FileMatcher.scan, keyed by
+        (step, name, entry index)
+        :param files: IDs of already resolved files, such as ones
+        restored from the configuration cache
+        :param analyzer: Analyzer every file of the RunConfig resolved to,
+        for RunConfigs grouped by analyzer
+        :param batch: Whether the RunConfig is a batch of a pipelined pipe,
+        whose run_vars.yml only lists its own files
+        """
         self.config = config
         self.name = name
-        self.base_config = base_config
-        self.files = self._build_file_definitions()
+        self.step = step
+        self.file_table = file_table
+        self.file_matches = file_matches
+        self.analyzer = analyzer
+        self.batch = batch
+        if files is None:
+            self.files = self._build_file_definitions()
+        else:
+            self.files = FileSet(file_table, files)
 
-    def _build_file_list(self, group):
+    def _build_file_list(self, index, group):
         """
         Build a list of files based on the glob pattern given in
         group_vars.d/{pipe}.
-        The glob will be applied to a path relative to the specified
-        vars directory.
-        :return:
-        """
-        try:
-            file_glob = group['name']
-        except KeyError as e:
-            message = f'Invalid group_vars file found. \n{e}'
-            util.sysexit_with_message(message)
-        file_list = \
-            glob.glob(f'{self.base_config.base_dir}/{file_glob}', recursive=True)
+        The glob is applied to a path relative to the project base directory.
+        Matching was already done for every group entry in a single scan,
+        so this just looks up the files tagged with this entry.
+        :return: array of file IDs
+        """
+        file_list = self.file_matches.get((self.step, self.name, index), array('I'))
         if not file_list:
             message = \
-                f'File Glob {file_glob} returned nothing ' \
-                f'in {self.base_config.base_dir}'
+                f'File Glob {group["name"]} returned nothing ' \
+                f'in {self.file_table.base_dir}'
             LOG.warn(message)
 
         return file_list
 
     def _build_file_definitions(self):
-        file_definitions = []
-        for config in self.config:
-            file_list = self._build_file_list(config)
-            file_definition_list = []
-            for file in file_list:
-                if os.path.isdir(file):
-                    continue
-                file_definition = {
-                    'file': file,
-                }
-                file_definition_list.append(file_definition)
-
-            file_definitions.append(file_definition_list)
-
-        return [
-            definition
-            for element in file_definitions
-            for definition in element
-        ]
+        ids = array('I')
+        for index, config in enumerate(self.config):
+            ids.extend(self._build_file_list(index, config))
+        return FileSet(self.file_table, ids)
+
+    def with_files(self, files):
+        """
+        :param files: FileSet of the file table of this RunConfig
+        :return: RunConfig object with the same configuration and the given files
+        """
+        return RunConfig(
+            self.name, self.step, self.config, self.file_table,
+            self.file_matches, files=files.ids, analyzer=self.analyzer,
+            batch=self.batch
+        )
+
+    def file_entries(self):
+        """
+        Pair every file with the group entry that matched it. A file
+        matched by several entries is paired with the first of them, and
+        files whose entry is unknown, such as ones restored from a cache
+        entry without entry matches, with the first entry of the group.
+        :return: Iterator of (FileRecord, dict)
+        """
+        entries = [
+            frozenset(self.file_matches.get((self.step, self.name, index), ()))
+            for index in range(len(self.config))
+        ] if len(self.config) > 1 else []
+        seen = set()
+        for file in self.files:
+            if file.id in seen:
+                continue
+            seen.add(file.id)
+            index = next(
+                (index for index, ids in enumerate(entries) if file.id in ids), 0
+            )
+            yield file, self.config[index]
+
+    def to_dict(self):
+        """
+        Serializable form of the resolved RunConfig, used by the
+        configuration cache.
+        :return: dict
+        """
+        data = {
+            'name': self.name,
+            'step': self.step,
+            'config': self.config,
+            'files': self.files.ids.tolist(),
+        }
+        if len(self.config) > 1:
+            data['entries'] = [
+                self.file_matches.get((self.step, self.name, index), array('I')).tolist()
+                for index in range(len(self.config))
+            ]
+        return data
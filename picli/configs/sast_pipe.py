@@ -16,21 +16,23 @@ class SastPipeConfig(BasePipeConfig):
     all required properties and files needed by a SAST analyzer
     to execute a SAST step. The Sast PipeConfig object will
     do the followinng:
-    Build a BaseConfig object using the file specified
-    during initialization.
+    Use the BaseConfig object of the shared ProjectContext.
     Build a run configuration which contains a list of
     files definitions.
     Read the SAST analyzer configuration file located in
     {base_dir}/piedpiper.d/{vars_dir}/pipe_vars.d/pi_sast.yml
     """
 
-    def __init__(self, base_config, debug):
+    analyzer_option = 'sast'
+    action_package = 'sast'
+
+    def __init__(self, context):
         """
-        Call the superclass init to build BaseConfig object,
-        pipe_configs, and run_configs, then validate.
-        :param base_config:
+        Call the superclass init to build pipe_configs and
+        run_configs from the project context, then validate.
+        :param context: ProjectContext object
         """
-        super(SastPipeConfig, self).__init__(base_config, debug)
+        super(SastPipeConfig, self).__init__(context)
         self._validate()
 
     @property
@@ -4,9 +4,9 @@ from picli.model import validate_pipeconfig_schema
 from picli import logger
 from picli import util
 
-import importlib
 from functools import reduce
 import operator
+import pkgutil
 
 LOG = logger.get_logger(__name__)
 
@@ -20,13 +20,13 @@ class ValidatePipeConfig(BasePipeConfig):
     Subclasses BasePipeConfig.
     """
 
-    def __init__(self, base_config, debug):
+    def __init__(self, context):
         """
         Initialize a ValidatePipeConfig object and returns None.
-        :param base_config:
+        :param context: ProjectContext object
         """
-        super(ValidatePipeConfig, self).__init__(base_config, debug)
-        self.pipe_configs = self._build_pipe_configs(base_config, debug)
+        super(ValidatePipeConfig, self).__init__(context)
+        self.pipe_configs = self._build_pipe_configs()
         self._validate()
 
     @property
@@ -68,7 +68,7 @@ class ValidatePipeConfig(BasePipeConfig):
                 util.safe_load_file(self.base_config.ci_provider_file)
         }
 
-    def _build_pipe_configs(self, base_config, debug):
+    def _build_pipe_configs(self):
         """
         Builds a list of PipeConfig objects based on
         the contents of the picli.configs package directory so
@@ -76,23 +76,20 @@ class ValidatePipeConfig(BasePipeConfig):
         function to use.
         We ignore the validate and base PipeConfig classes
         because we already have those instantiated.
-        :param base_config:
-        :return: iterator
+        The PipeConfig objects come from the project context, so the
+        style and sast steps of the same run reuse them.
+        :return: list
         """
-        pipe_configs = []
-        pipes = [pipe for pipe in dir(configs)
+        pipes = [pipe for _, pipe, _ in pkgutil.iter_modules(configs.__path__)
                  if "_pipe" in pipe and
                  "validate" not in pipe and
                  "base" not in pipe]
-        for pipe in pipes:
-            pipe_config_module = getattr(importlib.import_module(f'picli.configs.{pipe}'),
-                                         f'{util.camelize(pipe)}Config')
-            pipe_config = pipe_config_module(base_config, debug)
-            pipe_configs.append(pipe_config)
+        return [
+            self.context.pipe_config(pipe[:-len('_pipe')])
+            for pipe in pipes
+        ]
 
-        return pipe_configs
-
-    def dump_configs(self):
+    def build_run_vars(self):
         """
         Create a single dictionary of variables which
         display how PiCli was configured at the time of the run.
@@ -114,7 +111,7 @@ class ValidatePipeConfig(BasePipeConfig):
             group_configs.append(group_config)
             file_config = [file
                            for run_config in pipe_config.run_config
-                           for file in run_config.files]
+                           for file in run_config.files.definitions()]
             file_configs.append(file_config)
             util.merge_dicts(merged_run_configs, pipe_config.pipe_config)
 
@@ -127,4 +124,4 @@ class ValidatePipeConfig(BasePipeConfig):
             {'file_configs': reduce(operator.concat, file_configs)}
         )
 
-        return util.safe_dump(merged_run_configs)
+        return merged_run_configs
@@ -0,0 +1,540 @@
+from array import array
+import collections
+import importlib
+import itertools
+import os
+import threading
+import time
+
+from picli.cache import CACHE_DIR
+from picli.cache import ConfigCache
+from picli.cache import DEFAULT_MAX_SIZE
+from picli.cache import ResultCache
+from picli.config import BaseConfig
+from picli.configs.file_matcher import FileMatcher
+from picli.configs.file_table import FileRecord
+from picli.configs.file_table import FileTable
+from picli.configs.file_vars import FileVars
+from picli.session import Session
+from picli import git
+from picli import logger
+from picli import util
+
+LOG = logger.get_logger(__name__)
+
+MAX_BUFFERED_FILES = 1024
+
+
+class _Cursor(object):
+    """Position of a consumer of a ScanStream"""
+
+    __slots__ = ('position',)
+
+    def __init__(self):
+        self.position = 0
+
+
+class ScanStream(object):
+    """Files of a project scan running on a background thread
+
+    Files are only kept until every consumer iterating the scan passed
+    them, and the scan waits while max_buffered files are waiting for the
+    slowest consumer, so the memory held doesn't grow with the size of
+    the project. While a caller of wait needs the whole scan, the scan
+    doesn't wait for consumers, so they can't hold it up. Consumers have
+    to start from the first file, before any were dropped. Until the
+    first consumer starts, up to max_buffered files are kept for it. A
+    failure of the scan is raised in every consumer and in wait.
+    """
+
+    def __init__(self, scan, max_buffered=MAX_BUFFERED_FILES):
+        """
+        :param scan: Iterator of the files of the scan
+        :param max_buffered: Number of files held for consumers before the
+        scan waits for them
+        """
+        self.max_buffered = max_buffered
+        self._items = collections.deque()
+        # Position in the scan of the first item held
+        self._start = 0
+        self._cursors = []
+        self._waiting = 0
+        self._done = False
+        self._failure = None
+        self._condition = threading.Condition()
+        threading.Thread(target=self._run, args=(scan,), daemon=True).start()
+
+    def _run(self, scan):
+        try:
+            for item in scan:
+                with self._condition:
+                    while self._cursors and not self._waiting and \
+                            len(self._items) >= self.max_buffered:
+                        self._condition.wait()
+                    self._items.append(item)
+                    self._drop()
+                    self._condition.notify_all()
+        except (Exception, SystemExit) as e:
+            self._failure = e
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def _drop(self):
+        """
+        Drop the items every consumer passed. Without consumers, every item
+        is dropped once a consumer finished or more than max_buffered items
+        are waiting for the first one. Called with the condition held.
+        """
+        end = self._start + len(self._items)
+        if self._cursors:
+            low = min(cursor.position for cursor in self._cursors)
+        elif self._start or len(self._items) > self.max_buffered:
+            low = end
+        else:
+            return
+        while self._start < low:
+            self._items.popleft()
+            self._start += 1
+
+    def consume(self):
+        """
+        Start consuming the scan from its first file.
+        :return: Iterator of the files of the scan, or None when files were
+        dropped already
+        """
+        with self._condition:
+            if self._start:
+                return None
+            cursor = _Cursor()
+            self._cursors.append(cursor)
+        return self._consume(cursor)
+
+    def _consume(self, cursor):
+        try:
+            while True:
+                with self._condition:
+                    while cursor.position >= self._start + len(self._items) and \
+                            not self._done:
+                        self._condition.wait()
+                    items = list(itertools.islice(
+                        self._items, cursor.position - self._start, None
+                    ))
+                    if not items:
+                        if self._failure is not None:
+                            raise self._failure
+                        return
+                    cursor.position += len(items)
+                    self._drop()
+                    self._condition.notify_all()
+                yield from items
+        finally:
+            with self._condition:
+                self._cursors.remove(cursor)
+                self._drop()
+                self._condition.notify_all()
+
+    def wait(self):
+        """
+        Wait for the scan to finish. The files the consumers haven't
+        reached yet are held meanwhile.
+        :return: None
+        """
+        with self._condition:
+            self._waiting += 1
+            self._condition.notify_all()
+            try:
+                while not self._done:
+                    self._condition.wait()
+            finally:
+                self._waiting -= 1
+            if self._failure is not None:
+                raise self._failure
+
+
+class ProjectContext(object):
+    """State shared by every command and pipe of a single PiCli invocation
+
+    Holds the parsed pi_global_vars, group_vars, file_vars and pipe_vars
+    along with the result of the project file scan. Each of these is read
+    at most once per invocation, no matter how many commands and pipe
+    configurations are built from the context, and pipe configurations
+    themselves are built once and shared. What the actions share while
+    they run, such as the HTTP transport, is kept in its Session.
+    """
+
+    def __init__(self, config, debug, cache=False, result_cache=False,
+                 cache_max_size=DEFAULT_MAX_SIZE, changed_since=None, jobs=1):
+        """
+        :param config: pi_global_vars configuration file
+        :param debug: boolean
+        :param cache: Reuse resolved configuration from the on-disk cache
+        and store it there when it had to be resolved
+        :param result_cache: Reuse analyzer output for unchanged files
+        :param cache_max_size: Maximum size of the configuration cache in bytes
+        :param changed_since: Git reference. Only files changed since then
+        are sent to the actions.
+        :param jobs: Number of actions of a step to run at the same time
+        """
+        self.debug = debug
+        self.jobs = jobs
+        self._lock = threading.RLock()
+        self.config_cache = None
+        self._cached = {}
+        if cache:
+            self.config_cache = ConfigCache(
+                BaseConfig._find_base_dir(config), cache_max_size
+            )
+            self._cached = self.config_cache.load() or {}
+            if debug:
+                status = 'Using' if self._cached else 'No usable'
+                LOG.info(f'{status} cached configuration in '
+                         f'{self.config_cache.cache.directory}')
+        self.base_config = BaseConfig(config, debug, self._cached.get('config'))
+        self.result_cache = None
+        if result_cache:
+            self.result_cache = ResultCache(self.base_config.base_dir, cache_max_size)
+        self._group_vars = None
+        self._file_vars = None
+        self._file_matches = None
+        self._file_table = None
+        if 'files' in self._cached:
+            self._file_table = FileTable.from_dict(self._cached['files'])
+        self._matcher = None
+        self._stream = None
+        self._pipe_vars = dict(self._cached.get('pipe_vars', {}))
+        self._pipe_configs = {}
+        self._resolved = set()
+        self.changed_files = None
+        if changed_since is not None:
+            self.changed_files = self._read_changed_files(changed_since)
+        self._changed_ids = None
+        self.session = Session(self)
+
+    @property
+    def group_vars(self):
+        """
+        Read all files in {base_dir}/piedpiper.d/{vars_dir}/group_vars.d/
+        and returns a list of variable configurations.
+        :return: list
+        """
+        if self._group_vars is None:
+            self._group_vars = self._read_group_vars()
+        return self._group_vars
+
+    @property
+    def file_vars(self):
+        """
+        Index of the file definitions in
+        {base_dir}/piedpiper.d/{vars_dir}/files_vars.d/
+        :return: FileVars object
+        """
+        if self._file_vars is None:
+            self._file_vars = FileVars(
+                self.base_config.vars_dir, self.base_config.base_dir
+            )
+        return self._file_vars
+
+    @property
+    def file_matches(self):
+        """
+        Files matched by every entry of every group_vars file, keyed by
+        (pipe, group file, entry index).
+        :return: dict
+        """
+        if self._file_matches is None:
+            self._wait_for_scan()
+        return self._file_matches
+
+    @property
+    def file_table(self):
+        """
+        FileTable holding every file matched by a group_vars entry, with
+        the file_vars overrides applied.
+        :return: FileTable object
+        """
+        if self._file_table is None:
+            self._wait_for_scan()
+        return self._file_table
+
+    @property
+    def changed_ids(self):
+        """
+        IDs in the FileTable of the files changed since --changed-since.
+        :return: set, or None when every file is used
+        """
+        if self.changed_files is None:
+            return None
+        if self._changed_ids is None:
+            self._changed_ids = set()
+            for path in self.changed_files:
+                id = self.file_table.lookup(path)
+                if id is not None:
+                    self._changed_ids.add(id)
+        return self._changed_ids
+
+    def _read_changed_files(self, ref):
+        """
+        Find the files changed since a git reference. A change to
+        piedpiper.d/ can change how every file is handled, so in that
+        case every file is used.
+        :param ref: Git reference
+        :return: set of paths relative to the base directory, or None when
+        every file is used
+        """
+        changed_files = {
+            path
+            for path in git.changed_files(self.base_config.base_dir, ref)
+            if not path.startswith(f'{CACHE_DIR}/')
+        }
+        if any(path.startswith('piedpiper.d/') for path in changed_files):
+            LOG.warn(f'piedpiper.d/ changed since {ref}. Running on all files.')
+            return None
+        LOG.info(f'Running on {len(changed_files)} files changed since {ref}.')
+        return changed_files
+
+    def _read_group_vars(self):
+        group_vars_dir = f'{self.base_config.vars_dir}/group_vars.d'
+
+        group_configs = []
+        if os.path.isdir(group_vars_dir):
+            for root, dirs, files in os.walk(
+                    f'{self.base_config.vars_dir}/group_vars.d/'
+            ):
+                if not len(files):
+                    message = f'No group_vars found in {self.base_config.vars_dir}'
+                    util.sysexit_with_message(message)
+                for file in sorted(files):
+                    with open(os.path.join(root, file)) as f:
+                        group_config = f.read()
+                        group_configs.append(
+                            {'file': file, 'config': util.safe_load(group_config)}
+                        )
+            return group_configs
+        else:
+            message = f'Failed to read group_vars in {self.base_config.vars_dir}.'
+            util.sysexit_with_message(message)
+
+    def _wait_for_scan(self):
+        """
+        Wait for the scan of the project to finish. Unless iter_files
+        started it already, the scan is started on a background thread as
+        well, so stages running at the same time can consume it through
+        iter_files while this one waits.
+        :return: None
+        """
+        with self._lock:
+            if self._stream is None:
+                self._stream = ScanStream(self._scan_files())
+            stream = self._stream
+        stream.wait()
+
+    def iter_files(self):
+        """
+        Files matched by a group_vars entry, each with the entries it
+        matched. Unless the project was scanned already, the scan is
+        started on a background thread and files are yielded as soon as
+        it finds them, so they can be used while it is still running. Any
+        number of threads can iterate the same scan from its start, until
+        it dropped the first files its consumers passed. Later callers get
+        the files once the scan finished.
+        :return: Iterator of (FileRecord, list of (pipe, group file, entry
+        index))
+        """
+        with self._lock:
+            if self._stream is None and self._file_matches is None:
+                self._stream = ScanStream(self._scan_files())
+            files = self._stream.consume() if self._stream is not None else None
+        if files is not None:
+            yield from files
+            return
+        self._wait_for_scan()
+        yield from self._matched_files(self._file_table, self._file_matches)
+
+    @staticmethod
+    def _matched_files(file_table, file_matches):
+        """
+        :return: Iterator of (FileRecord, list of tags) of a finished scan,
+        in the order the files were found
+        """
+        tags = {}
+        for tag, ids in file_matches.items():
+            for id in ids:
+                tags.setdefault(id, []).append(tag)
+        for id in sorted(tags):
+            yield FileRecord(file_table, id), tags[id]
+
+    def _scan_files(self):
+        """
+        Compile the file globs of every entry in every group_vars file into
+        a single FileMatcher and scan the project tree once. The FileTable
+        and the files matched by each entry are stored once the scan
+        finished.
+        :return: Iterator of (FileRecord, list of (pipe, group file, entry
+        index)), yielding each file as soon as it is found
+        """
+        start = time.perf_counter()
+        matcher = FileMatcher(
+            self.base_config.base_dir,
+            exclude_dirs=[CACHE_DIR],
+            exclude=self.base_config.exclude,
+            gitignore=self.base_config.gitignore,
+        )
+        self._matcher = matcher
+        for group in self.group_vars:
+            for step, config in group['config'].items():
+                for index, entry in enumerate(config):
+                    try:
+                        matcher.add(entry['name'], (step, group['file'], index))
+                    except (KeyError, TypeError) as e:
+                        message = f'Invalid group_vars file found. \n{e}'
+                        util.sysexit_with_message(message)
+        file_vars = self.file_vars
+        file_table = FileTable(self.base_config.base_dir)
+        file_matches = {
+            tag: array('I') for tags in matcher.patterns.values() for tag in tags
+        }
+        if matcher.streamable:
+            for id, tags in matcher.iter_scan(file_table):
+                file_vars.apply(file_table, [id])
+                for tag in tags:
+                    file_matches[tag].append(id)
+                yield FileRecord(file_table, id), tags
+        else:
+            # Files answered by glob may turn up again with further tags,
+            # so they are only yielded once the scan finished.
+            for id, tags in matcher.iter_scan(file_table):
+                for tag in tags:
+                    file_matches[tag].append(id)
+            file_vars.apply(file_table)
+            yield from self._matched_files(file_table, file_matches)
+        self._file_table = file_table
+        self._file_matches = file_matches
+        if self.debug:
+            elapsed = time.perf_counter() - start
+            message = f'Scanned {self.base_config.base_dir} for ' \
+                      f'{len(matcher.patterns)} file globs in {elapsed:.3f}s'
+            LOG.info(message)
+            self._report_pruned(matcher, elapsed)
+
+    def _report_pruned(self, matcher, elapsed):
+        """
+        Report how much ignore-aware pruning saved during the file scan.
+        The pruned directories are walked again to measure it, so this is
+        only done with --debug.
+        """
+        files, skipped = matcher.pruned_size()
+        message = f'Pruned {len(matcher.pruned)} ignored directories ' \
+                  f'containing {files} files and skipped {matcher.ignored} ' \
+                  f'ignored files'
+        if matcher.pruned and elapsed:
+            message += f', walking them would have taken {skipped:.3f}s ' \
+                       f'more ({(elapsed + skipped) / elapsed:.1f}x)'
+        LOG.info(message)
+
+    def pipe_vars(self, name):
+        """
+        Read {vars_dir}/pipe_vars.d/pi_{name}.yml once.
+        :param name: Name of the pipe
+        :return: Configuration dictionary for the pipe
+        """
+        if name not in self._pipe_vars:
+            try:
+                with open(
+                    f'{self.base_config.vars_dir}/pipe_vars.d/pi_{name}.yml'
+                ) as config:
+                    self._pipe_vars[name] = util.safe_load(config)
+            except IOError as e:
+                message = f"Failed to parse pi_{name}.yml. \n\n{e}"
+                util.sysexit_with_message(message)
+        return self._pipe_vars[name]
+
+    def pipe_config(self, name):
+        """
+        Build the PipeConfig object for a pipe, or return the one already
+        built during this invocation. Stages running at the same time
+        share the lock under which pipe configurations, and the state
+        they are built from, are resolved.
+        :param name: Name of the pipe, such as style
+        :return: BasePipeConfig subclass object
+        """
+        with self._lock:
+            if name not in self._pipe_configs:
+                self._pipe_configs[name] = self.pipe_config_class(name)(self)
+        return self._pipe_configs[name]
+
+    @staticmethod
+    def pipe_config_class(name):
+        """
+        :param name: Name of a pipe
+        :return: BasePipeConfig subclass of the pipe
+        """
+        return getattr(
+            importlib.import_module(f'picli.configs.{name}_pipe'),
+            f'{util.camelize(name)}PipeConfig'
+        )
+
+    def pipelined(self, name):
+        """
+        Whether the files of a pipe are sent in batches while the project
+        is still being scanned, set by pipeline in pi_global_vars.yml. Only
+        pipes with analyzers are pipelined, and only when their run
+        configurations aren't restored from the configuration cache.
+        :param name: Name of the pipe
+        :return: bool
+        """
+        return self.pipe_config_class(name).analyzer_option is not None and \
+            self.base_config.pipeline.get('enabled', False) and \
+            self.cached_run_configs(name) is None
+
+    def cached_run_configs(self, name):
+        """
+        Resolved run configurations of a pipe restored from the
+        configuration cache.
+        :param name: Name of the pipe
+        :return: list of dicts, or None when the pipe has to be resolved
+        """
+        run_configs = self._cached.get('run_configs', {}).get(name)
+        if run_configs is None:
+            self._resolved.add(name)
+        return run_configs
+
+    def save_cache(self):
+        """
+        Store the configuration resolved during this invocation in the
+        configuration cache. Nothing is written when everything came
+        from the cache already.
+        :return: None
+        """
+        if self.config_cache is None or not self._resolved:
+            return
+        if self._stream is not None:
+            try:
+                self._stream.wait()
+            except (Exception, SystemExit):
+                return
+        if self._matcher is not None:
+            if not self._matcher.complete:
+                return
+            directories = self._matcher.directories + self._matcher.ignore_files
+        else:
+            directories = self._cached.get('directories', {})
+        run_configs = {}
+        if self._matcher is None:
+            # File IDs of cached run configurations refer to the cached
+            # FileTable, which a new scan replaces.
+            run_configs.update(self._cached.get('run_configs', {}))
+        for name in self._resolved:
+            if name in self._pipe_configs:
+                run_configs[name] = [
+                    run_config.to_dict()
+                    for run_config in self._pipe_configs[name].resolved_run_config
+                ]
+        entry = {
+            'files': self.file_table.to_dict(),
+            'config': self.base_config.config,
+            'pipe_vars': self._pipe_vars,
+            'run_configs': run_configs,
+        }
+        self.config_cache.save(entry, directories)
@@ -0,0 +1,55 @@
+import subprocess
+
+from picli import logger
+from picli import util
+
+LOG = logger.get_logger(__name__)
+
+
+def _git(base_dir, *args):
+    """
+    Run a git command in the project base directory.
+    :param base_dir: Project base directory
+    :param args: Arguments to git
+    :return: List of NUL separated entries of the command's output
+    """
+    try:
+        result = subprocess.run(
+            ['git', '-C', base_dir] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+    except FileNotFoundError:
+        util.sysexit_with_message('git is required to find changed files.')
+    except subprocess.CalledProcessError as e:
+        message = f'Failed to run git {" ".join(args)}. \n\n' \
+                  f'{e.stderr.decode(errors="replace").strip()}'
+        util.sysexit_with_message(message)
+    return [
+        entry for entry in result.stdout.decode(errors='surrogateescape').split('\0')
+        if entry
+    ]
+
+
+def changed_files(base_dir, ref):
+    """
+    List the files changed since a git reference, read from the local
+    repository only.
+    Files are compared against the merge base of the reference and HEAD,
+    so a branch is compared against the point where it left the
+    reference. Uncommitted changes and untracked files which aren't
+    ignored count as changed.
+    :param base_dir: Project base directory inside the git repository
+    :param ref: Git reference, such as origin/master or a commit
+    :return: set of paths relative to the base directory
+    """
+    merge_base = _git(base_dir, 'merge-base', ref, 'HEAD')[0].strip()
+    changed = set(_git(
+        base_dir, 'diff', '--name-only', '--no-renames', '--relative', '-z',
+        merge_base, '--'
+    ))
+    changed.update(_git(
+        base_dir, 'ls-files', '--others', '--exclude-standard', '-z'
+    ))
+    return changed
@@ -1,11 +1,16 @@
+import contextlib
 import logging
 import sys
+import threading
 
 import colorama
 
 SUCCESS = 100
 OUT = 101
 
+_buffers = threading.local()
+_flush_lock = threading.Lock()
+
 
 class LogFilter(object):
     """
@@ -40,6 +45,60 @@ class CustomLogger(logging.getLoggerClass()):
         if self.isEnabledFor(OUT):
             self._log(OUT, msg, args, **kwargs)
 
+    def handle(self, record):
+        records = getattr(_buffers, 'records', None)
+        if records is not None:
+            records.append((self, record))
+        else:
+            super(CustomLogger, self).handle(record)
+
+
+def active_buffer():
+    """
+    :return: The buffer of the innermost buffered block of the current
+    thread, or None
+    """
+    return getattr(_buffers, 'records', None)
+
+
+@contextlib.contextmanager
+def buffered(parent=None):
+    """
+    Hold back the records logged by the current thread and emit them
+    together when the block exits, so output of work running in parallel
+    isn't interleaved.
+    :param parent: Buffer of an enclosing buffered block, which may belong
+    to another thread, to hand the records to instead of emitting them.
+    Defaults to the buffer of the current thread.
+    """
+    previous = active_buffer()
+    if parent is None:
+        parent = previous
+    _buffers.records = records = []
+    try:
+        yield
+    finally:
+        _buffers.records = previous
+        with _flush_lock:
+            if parent is not None:
+                parent.extend(records)
+            else:
+                _emit(records)
+
+
+def emit(records):
+    """
+    Emit records held back in a list given to buffered as its parent.
+    :param records: List of records
+    """
+    with _flush_lock:
+        _emit(records)
+
+
+def _emit(records):
+    for logger, record in records:
+        logger.handle(record)
+
 
 class TrailingNewlineFormatter(logging.Formatter):
     """
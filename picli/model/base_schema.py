@@ -1,15 +1,58 @@
 from marshmallow import fields
 from marshmallow import Schema
 from marshmallow import RAISE
+from marshmallow.validate import OneOf
+from marshmallow.validate import Range
 from marshmallow import ValidationError
 from marshmallow import validates
 
 
+class TransportSchema(Schema):
+    pool_connections = fields.Int(validate=Range(min=1))
+    pool_maxsize = fields.Int(validate=Range(min=1))
+    connect_timeout = fields.Float(validate=Range(min=0, min_inclusive=False))
+    read_timeout = fields.Float(validate=Range(min=0, min_inclusive=False))
+    stream_uploads = fields.Bool()
+    digest_header = fields.Bool()
+    warm_up = fields.Bool()
+    warm_up_timeout = fields.Float(validate=Range(min=0, min_inclusive=False))
+
+
+class CompressionSchema(Schema):
+    method = fields.Str(validate=OneOf(['deflate', 'bzip2', 'lzma']))
+    level = fields.Int(validate=Range(min=0, max=9))
+    stored_extensions = fields.List(fields.Str())
+    sniff = fields.Bool()
+    workers = fields.Int(validate=Range(min=1))
+
+
+class ShardingSchema(Schema):
+    max_files = fields.Int(validate=Range(min=1))
+    max_bytes = fields.Int(validate=Range(min=1))
+    concurrency = fields.Int(validate=Range(min=1))
+
+
+class PipelineSchema(Schema):
+    enabled = fields.Bool()
+    max_files = fields.Int(validate=Range(min=1))
+    max_bytes = fields.Int(validate=Range(min=1))
+    concurrency = fields.Int(validate=Range(min=1))
+
+
 class PiGlobalVarsSchema(Schema):
     project_name = fields.Str(required=True)
     ci_provider = fields.Str(required=True)
     vars_dir = fields.Str(required=True)
     version = fields.Str(required=True)
+    exclude = fields.List(fields.Str())
+    gitignore = fields.Bool()
+    lint_stages = fields.Dict(
+        keys=fields.Str(), values=fields.List(fields.Str())
+    )
+    transport = fields.Nested(TransportSchema)
+    sharding = fields.Nested(ShardingSchema)
+    compression = fields.Nested(CompressionSchema)
+    pipeline = fields.Nested(PipelineSchema)
 
     @validates
     def validate_ci_provider(self, value):
@@ -1,6 +1,8 @@
 from marshmallow import fields
 from marshmallow import Schema
 from marshmallow import RAISE
+from marshmallow.validate import OneOf
+from marshmallow.validate import Range
 from marshmallow import ValidationError
 
 
@@ -8,6 +10,8 @@ class PiSastPipeVarsSchema(Schema):
     run_pipe = fields.Bool(required=True)
     url = fields.Str(required=True)
     version = fields.Str(required=True)
+    executor = fields.Str(validate=OneOf(['remote', 'local']))
+    processes = fields.Int(validate=Range(min=1))
 
 
 class SastPipeConfigSchema(Schema):
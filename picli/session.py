@@ -0,0 +1,149 @@
+import threading
+
+from picli.actions.archive import PayloadStore
+from picli.actions.base import function_url
+from picli.actions.compression import CompressionPolicy
+from picli.cache import FileDigests
+from picli import logger
+from picli import transport
+
+LOG = logger.get_logger(__name__)
+
+
+class Session(object):
+    """Runtime state shared by the actions of a single PiCli invocation
+
+    Holds what the actions need while they run, as opposed to the
+    configuration they run with: the HTTP transport to the functions, the
+    policy compressing the zipfiles, the digests of the files sent and,
+    during lint, the store of compressed members shared between steps.
+    Each of these is built on first use.
+    """
+
+    def __init__(self, context):
+        """
+        :param context: ProjectContext of the invocation
+        """
+        self.context = context
+        self.digests = FileDigests()
+        self.payloads = None
+        self._cancelled = set()
+        self._transport = None
+        self._compression = None
+        self._lock = threading.Lock()
+
+    @property
+    def transport(self):
+        """
+        HTTP transport shared by every action, configured by transport in
+        pi_global_vars.yml. Enough connections are kept alive for --jobs
+        actions to run at the same time.
+        :return: Transport object
+        """
+        with self._lock:
+            if self._transport is None:
+                options = dict(self.context.base_config.transport)
+                options.setdefault(
+                    'pool_maxsize',
+                    max(transport.DEFAULT_POOL_MAXSIZE, self.context.jobs)
+                )
+                self._transport = transport.Transport(
+                    debug=self.context.debug, **options
+                )
+        return self._transport
+
+    @property
+    def compression(self):
+        """
+        Policy choosing how the members of the zipfiles sent to the
+        functions are compressed, configured by compression in
+        pi_global_vars.yml.
+        :return: CompressionPolicy object
+        """
+        with self._lock:
+            if self._compression is None:
+                self._compression = CompressionPolicy(
+                    **self.context.base_config.compression
+                )
+        return self._compression
+
+    def cancel(self, stage):
+        """
+        Ask a stage which started before the stages it depends on finished
+        to stop, as one of them failed.
+        :param stage: Name of the stage
+        :return: None
+        """
+        self._cancelled.add(stage)
+
+    def cancelled(self, stage):
+        """
+        :param stage: Name of the stage
+        :return: Whether the stage was asked to stop
+        """
+        return stage in self._cancelled
+
+    def share_payloads(self):
+        """
+        Compress each file sent by more than one action of this invocation
+        only once, such as files sent to both the style and sast functions
+        during lint.
+        :return: None
+        """
+        self.payloads = PayloadStore()
+
+    def warm_up(self, steps):
+        """
+        Probe the function of every action the steps may run in the
+        background, when warm_up is enabled under transport in
+        pi_global_vars.yml. Only group_vars, file_vars and pipe_vars are
+        read to find them, so the cold starts of the functions overlap
+        with scanning the project and building the zipfiles.
+        :param steps: Names of the pipes about to run
+        :return: None
+        """
+        if not self.transport.warm_up:
+            return
+        urls = []
+        for step in steps:
+            # Invalid pipe_vars are reported once the pipe is built.
+            pipe_vars = (self.context.pipe_vars(step) or {}).get(
+                f'pi_{step}_pipe_vars'
+            ) or {}
+            if not pipe_vars.get('run_pipe') or not pipe_vars.get('url') or \
+                    pipe_vars.get('executor') == 'local':
+                continue
+            for name in self._function_names(step):
+                url = function_url(
+                    pipe_vars['url'], str(pipe_vars.get('version', 'latest')), name
+                )
+                if url not in urls:
+                    urls.append(url)
+        self.transport.probe(urls)
+
+    def _function_names(self, step):
+        """
+        :param step: Name of a pipe
+        :return: Names of the actions with a function the pipe may run
+        """
+        if step == 'validate':
+            return ['validator']
+        option = self.context.pipe_config_class(step).analyzer_option
+        names = []
+        for group in self.context.group_vars:
+            config = group['config'] if isinstance(group['config'], dict) else {}
+            for entry in config.get(f'pi_{step}') or []:
+                if isinstance(entry, dict):
+                    names.append(entry.get(option))
+        for overrides in self.context.file_vars.index.values():
+            names.append(overrides.get(option))
+        return sorted({name for name in names if name and name != 'noop'})
+
+    def report_warm_up(self):
+        """
+        Report how long each probed function took to start and how much
+        of that overlapped with local work, if any were probed.
+        :return: None
+        """
+        if self._transport is not None:
+            self._transport.report_warm_up()
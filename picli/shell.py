@@ -1,5 +1,6 @@
 import click
 
+from picli.cache import DEFAULT_MAX_SIZE
 from picli import command
 
 
@@ -16,14 +17,56 @@ from picli import command
     default=False,
     help='Enable debug logging'
 )
+@click.option(
+    '--cache/--no-cache',
+    default=False,
+    envvar='PICLI_CACHE',
+    help='Reuse resolved configuration from the .picli_cache directory'
+)
+@click.option(
+    '--result-cache/--no-result-cache',
+    default=False,
+    envvar='PICLI_RESULT_CACHE',
+    help='Reuse analyzer output for unchanged files from the .picli_cache directory'
+)
+@click.option(
+    '--cache-max-size',
+    type=int,
+    default=DEFAULT_MAX_SIZE,
+    envvar='PICLI_CACHE_MAX_SIZE',
+    show_default=True,
+    help='Maximum size in bytes of each cache in .picli_cache'
+)
+@click.option(
+    '--changed-since',
+    metavar='REF',
+    envvar='PICLI_CHANGED_SINCE',
+    help='Only send files changed since this git reference'
+)
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(min=1),
+    default=1,
+    envvar='PICLI_JOBS',
+    show_default=True,
+    help='Number of actions of a step to run at the same time'
+)
 @click.pass_context
-def main(context, config, debug):
+def main(context, config, debug, cache, result_cache, cache_max_size, changed_since,
+         jobs):
     context.obj = {}
     context.obj['args'] = {}
     context.obj['args']['config'] = config
     context.obj['args']['debug'] = debug
+    context.obj['args']['cache'] = cache
+    context.obj['args']['result_cache'] = result_cache
+    context.obj['args']['cache_max_size'] = cache_max_size
+    context.obj['args']['changed_since'] = changed_since
+    context.obj['args']['jobs'] = jobs
 
 
+main.add_command(command.cache.cache)
 main.add_command(command.lint.lint)
 main.add_command(command.style.style)
 main.add_command(command.sast.sast)
@@ -0,0 +1,260 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.connectionpool import HTTPSConnectionPool
+
+from picli import logger
+
+LOG = logger.get_logger(__name__)
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 600
+DEFAULT_WARM_UP_TIMEOUT = 120
+
+# Timings of the request in flight on each thread, filled in by the
+# connection classes below.
+_timings = threading.local()
+
+
+def _add(name, seconds):
+    """
+    Add to a timing of the request in flight on the current thread.
+    """
+    timings = getattr(_timings, 'current', None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0) + seconds
+
+
+class TimedConnectionMixin(object):
+    """Record the time spent connecting, sending the request and waiting
+    for the first byte of the response"""
+
+    def connect(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super(TimedConnectionMixin, self).connect(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _add('connect', elapsed)
+            if getattr(self, '_sending', False):
+                # Connected lazily while sending, which isn't upload time.
+                _add('upload', -elapsed)
+
+    def _timed_send(self, send, *args, **kwargs):
+        start = time.perf_counter()
+        self._sending = True
+        try:
+            return send(*args, **kwargs)
+        finally:
+            self._sending = False
+            _add('upload', time.perf_counter() - start)
+
+    def request(self, *args, **kwargs):
+        return self._timed_send(
+            super(TimedConnectionMixin, self).request, *args, **kwargs
+        )
+
+    def request_chunked(self, *args, **kwargs):
+        return self._timed_send(
+            super(TimedConnectionMixin, self).request_chunked, *args, **kwargs
+        )
+
+    def getresponse(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super(TimedConnectionMixin, self).getresponse(*args, **kwargs)
+        finally:
+            _add('first_byte', time.perf_counter() - start)
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools record request timings"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+class Probe(object):
+    """Warm-up request sent to a function ahead of its first real request"""
+
+    def __init__(self, url):
+        self.url = url
+        self.start = time.perf_counter()
+        self.end = None
+        self.error = None
+
+    def report(self, first_post):
+        """
+        :param first_post: perf_counter time of the first POST to the
+        function, or None
+        :return: tuple of str describing the probe and seconds of the cold
+        start which overlapped with local work
+        """
+        if self.end is None:
+            return f'{self.url}: no response after ' \
+                   f'{time.perf_counter() - self.start:.2f}s', 0
+        if self.error is not None:
+            return f'{self.url}: failed after {self.end - self.start:.2f}s. ' \
+                   f'{self.error}', 0
+        message = f'{self.url}: ready after {self.end - self.start:.2f}s'
+        if first_post is None:
+            return f'{message}, not used', 0
+        overlap = max(0, min(self.end, first_post) - self.start)
+        return f'{message}, {overlap:.2f}s of it before the first request', overlap
+
+
+class Transport(object):
+    """HTTP transport shared by every action of a PiCli invocation
+
+    Requests go through a single requests.Session, so connections to the
+    gateway are pooled and kept alive between actions instead of being
+    opened for every request. Every request has explicit connect and read
+    timeouts. With debug enabled, the time spent connecting, uploading the
+    request and waiting for the first byte of the response is logged.
+
+    With warm_up enabled, functions can be probed in the background before
+    they are used, so that their cold starts overlap with the work PiCli
+    does locally before sending them anything.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, stream_uploads=False,
+                 digest_header=False, warm_up=False,
+                 warm_up_timeout=DEFAULT_WARM_UP_TIMEOUT, debug=False):
+        """
+        :param pool_connections: Number of hosts to keep connection pools for
+        :param pool_maxsize: Number of connections kept alive per host
+        :param connect_timeout: Seconds to wait for a connection
+        :param read_timeout: Seconds to wait for the server to send data
+        :param stream_uploads: Whether actions write their zipfiles straight
+        into the request body with chunked transfer encoding instead of to
+        a temporary file first
+        :param digest_header: Whether actions send the content digest of
+        their zipfiles in a header, which costs reading every file once
+        more before the upload starts unless the result cache read it
+        :param warm_up: Whether to probe functions before they are used
+        :param warm_up_timeout: Seconds to wait for a function to answer a probe
+        :param debug: Log the timing of every request
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.stream_uploads = stream_uploads
+        self.digest_header = digest_header
+        self.warm_up = warm_up
+        self.warm_up_timeout = warm_up_timeout
+        self.debug = debug
+        self.probes = []
+        self._first_posts = {}
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, url, **kwargs):
+        """
+        POST a request through the shared session.
+        :param url: URL to send the request to
+        :param kwargs: Arguments to requests.Session.post
+        :return: requests.Response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        _timings.current = timings = {}
+        start = time.perf_counter()
+        with self._lock:
+            self._first_posts.setdefault(url, start)
+        try:
+            response = self.session.post(url, **kwargs)
+        finally:
+            _timings.current = None
+            if self.debug:
+                self._log_timings(url, timings, time.perf_counter() - start)
+        return response
+
+    def probe(self, urls):
+        """
+        Send a GET request to every function in the background. Any answer
+        means the function was started. Failed probes are only reported.
+        :param urls: URLs of the functions
+        :return: None
+        """
+        for url in urls:
+            probe = Probe(url)
+            self.probes.append(probe)
+            threading.Thread(target=self._probe, args=(probe,), daemon=True).start()
+
+    def _probe(self, probe):
+        try:
+            self.session.get(
+                probe.url, timeout=(self.timeout[0], self.warm_up_timeout)
+            ).close()
+        except requests.exceptions.RequestException as e:
+            probe.error = e
+        probe.end = time.perf_counter()
+        if self.debug:
+            status = 'answered' if probe.error is None else f'failed. {probe.error}'
+            LOG.info(f'Warm-up probe of {probe.url} {status} after '
+                     f'{probe.end - probe.start:.2f}s')
+
+    def report_warm_up(self):
+        """
+        Report every probe and the cold start time it saved, if functions
+        were probed.
+        :return: None
+        """
+        if not self.probes:
+            return
+        LOG.info('Function warm-up')
+        saved = 0
+        for probe in self.probes:
+            with self._lock:
+                first_post = self._first_posts.get(probe.url)
+            line, overlap = probe.report(first_post)
+            LOG.out(line)
+            saved += overlap
+        LOG.out(f'Up to {saved:.2f}s of cold starts overlapped with local work')
+
+    @staticmethod
+    def _log_timings(url, timings, total):
+        if 'connect' in timings:
+            connect = f'connect {timings["connect"]:.3f}s'
+        else:
+            connect = 'reused connection'
+        message = f'POST {url}: {connect}, ' \
+                  f'upload {timings.get("upload", 0):.3f}s, ' \
+                  f'first byte {timings.get("first_byte", 0):.3f}s, ' \
+                  f'total {total:.3f}s'
+        LOG.info(message)
+
+    def close(self):
+        self.session.close()
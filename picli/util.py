@@ -1,4 +1,5 @@
 import anyconfig
+import datetime
 from typing import Dict
 import re
 import sys
@@ -9,11 +10,90 @@ from picli.logger import get_logger
 LOG = get_logger(__name__)
 
 
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+CSafeDumper = getattr(yaml, 'CSafeDumper', None)
+
+DUMP_OPTIONS = {
+    'default_flow_style': False,
+    'explicit_start': True,
+    # Never fold long scalars so that both emitters break lines identically.
+    'width': 2 ** 31 - 1,
+}
+
+
 class SafeDumper(yaml.SafeDumper):
     def increase_indent(self, flow=False, indentless=False):
         return super(SafeDumper, self).increase_indent(flow, False)
 
 
+def _emits_one_line_per_node(data):
+    """
+    Check whether every node of data is emitted on a line of its own, so
+    the output of the libyaml emitter can be re-indented line by line.
+    Multi-line strings, long keys, bytes, shared references and
+    unknown types are left to the pure-Python SafeDumper.
+    :param data: Object to dump
+    :return: bool
+    """
+    if not isinstance(data, (dict, list)):
+        return False
+    seen = set()
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            if any(char in node for char in '\n\r\x85\u2028\u2029'):
+                return False
+        elif isinstance(node, (dict, list, tuple)):
+            if id(node) in seen:
+                return False
+            seen.add(id(node))
+            if isinstance(node, dict):
+                for key in node:
+                    if not isinstance(key, (str, int, float, bool)) or \
+                            not 0 < len(str(key).encode()) <= 100:
+                        return False
+                stack.extend(node.keys())
+                stack.extend(node.values())
+            else:
+                stack.extend(node)
+        elif node is not None and \
+                not isinstance(node, (int, float, datetime.date)):
+            return False
+    return True
+
+
+def _indent_sequences(text):
+    """
+    Indent block sequences nested in mappings the way SafeDumper does.
+    libyaml always emits them at the same column as their mapping key.
+    :param text: YAML document where every node is on its own line
+    :return: str
+    """
+    output = []
+    sequences = []
+    key_column = None
+    for line in text.split('\n'):
+        content = line.lstrip(' ')
+        indent = len(line) - len(content)
+        item = content == '-' or content.startswith('- ')
+        while sequences and (
+            indent < sequences[-1] or (indent == sequences[-1] and not item)
+        ):
+            sequences.pop()
+        if item and indent == key_column:
+            sequences.append(indent)
+        output.append(' ' * (indent + 2 * len(sequences)) + content)
+
+        key_column = None
+        if content.endswith(':'):
+            key_column = indent
+            while content.startswith('- '):
+                content = content[2:]
+                key_column += 2
+    return '\n'.join(output)
+
+
 def merge_dicts(a: Dict, b: Dict) -> Dict:
     """
     Merges the values of B into A and returns a mutated dict A.
@@ -52,7 +132,7 @@ def camelize(string):
 
 def safe_load(string):
     try:
-        return yaml.safe_load(string) or {}
+        return yaml.load(string, Loader=SafeLoader) or {}
     except yaml.scanner.ScannerError as e:
         print(e)
 
@@ -67,9 +147,18 @@ def safe_load_file(filename):
 
 
 def safe_dump(data):
-    return yaml.dump(data, Dumper=SafeDumper,
-                     default_flow_style=False,
-                     explicit_start=True)
+    """
+    Dump data to YAML using the libyaml emitter when PyYAML was built
+    with it, falling back to the pure-Python SafeDumper otherwise. Both
+    produce the same output.
+    :param data: Object to dump
+    :return: str
+    """
+    if CSafeDumper is not None and _emits_one_line_per_node(data):
+        return _indent_sequences(
+            yaml.dump(data, Dumper=CSafeDumper, **DUMP_OPTIONS)
+        )
+    return yaml.dump(data, Dumper=SafeDumper, **DUMP_OPTIONS)
 
 
 def sysexit_with_message(msg, code=1):
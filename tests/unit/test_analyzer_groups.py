@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+from picli.context import ProjectContext
+
+
+def write(base_dir, path, contents):
+    path = os.path.join(base_dir, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+@pytest.fixture
+def project(tmpdir):
+    base_dir = str(tmpdir)
+    write(base_dir, 'piedpiper.d/pi_global_vars.yml', """---
+pi_global_vars:
+  project_name: "python_project"
+  ci_provider: "gitlab-ci"
+  vars_dir: "default_vars.d"
+  version: "0.0.0"
+""")
+    vars_dir = 'piedpiper.d/default_vars.d'
+    write(base_dir, f'{vars_dir}/pipe_vars.d/pi_style.yml', """---
+pi_style_pipe_vars:
+  run_pipe: true
+  url: http://127.0.0.1:8080/function
+  version: latest
+""")
+    write(base_dir, f'{vars_dir}/group_vars.d/all.yml', """---
+pi_style:
+  - name: "**"
+    styler: noop
+""")
+    write(base_dir, f'{vars_dir}/group_vars.d/python_lint.yml', """---
+pi_style:
+  - name: "src/**/*.py"
+    styler: flake8
+    options:
+      max-line-length: 100
+  - name: "tests/**/*.py"
+    styler: flake8
+    options:
+      max-line-length: 120
+""")
+    write(base_dir, f'{vars_dir}/group_vars.d/strict.yml', """---
+pi_style:
+  - name: "src/core/*.py"
+    styler: flake8
+    options:
+      max-line-length: 100
+""")
+    write(base_dir, f'{vars_dir}/file_vars.d/generated.yml', """---
+file: "src/generated.py"
+styler: noop
+""")
+    for path in ['README.md', 'src/app.py', 'src/generated.py', 'src/core/model.py',
+                 'tests/test_app.py']:
+        write(base_dir, path, 'x = 1\n')
+    return base_dir
+
+
+def style(base_dir):
+    context = ProjectContext(f'{base_dir}/piedpiper.d/pi_global_vars.yml', False)
+    return context.pipe_config('style')
+
+
+def groups(run_configs):
+    """
+    :return: dict of (analyzer, group names) to the files of the project,
+    leaving out piedpiper.d/
+    """
+    return {
+        (run_config.analyzer, run_config.name): sorted(
+            file.path for file in run_config.files
+            if not file.path.startswith('piedpiper.d/')
+        )
+        for run_config in run_configs
+    }
+
+
+def test_files_are_grouped_by_analyzer_and_options(project):
+    run_configs = style(project).analyzer_run_config
+    assert groups(run_configs) == {
+        # The file_vars override moves src/generated.py to noop, whose
+        # only entry is the one of all.yml.
+        ('noop', 'all.yml, python_lint.yml'): ['README.md', 'src/generated.py'],
+        # Entries of two group_vars files with the same options share a
+        # request, which lists src/core/model.py once.
+        ('flake8', 'python_lint.yml, strict.yml'): ['src/app.py', 'src/core/model.py'],
+        ('flake8', 'python_lint.yml'): ['tests/test_app.py'],
+    }
+    options = {
+        run_config.name: [entry.get('options') for entry in run_config.config]
+        for run_config in run_configs
+    }
+    assert options == {
+        'all.yml, python_lint.yml': [None],
+        'python_lint.yml, strict.yml': [{'max-line-length': 100}] * 2,
+        'python_lint.yml': [{'max-line-length': 120}],
+    }
+
+
+def test_files_are_sent_once_per_analyzer(project):
+    for run_config in style(project).analyzer_run_config:
+        ids = run_config.files.ids.tolist()
+        assert len(ids) == len(set(ids))
+
+
+def test_batches_are_grouped_like_run_configs(project):
+    batches = list(style(project).iter_batches())
+    assert groups(run_config for _, run_config in batches) == groups(
+        style(project).analyzer_run_config
+    )
@@ -0,0 +1,93 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from picli.actions import archive
+from picli.actions.compression import CompressionPolicy
+
+
+@pytest.fixture
+def files(tmpdir):
+    contents = {
+        'src/module.py': b''.join(
+            f'value_{line} = {line * 7919 % 104729}\n'.encode() for line in range(20000)
+        ),
+        'src/empty.py': b'',
+        'assets/logo.png': b'\x89PNG\r\n\x1a\n' + os.urandom(4096),
+        'data/blob.bin': os.urandom(70000),
+        'docs/café.txt': 'déjà vu\n'.encode() * 100,
+        'bin/run.sh': b'#!/bin/sh\necho run\n',
+    }
+    members = []
+    for name, data in sorted(contents.items()):
+        path = str(tmpdir.join(name.replace('/', '_')))
+        with open(path, 'wb') as f:
+            f.write(data)
+        members.append((path, name))
+    os.chmod(str(tmpdir.join('bin_run.sh')), 0o755)
+    return members, contents
+
+
+def write_zip(members, policy, store=None):
+    buffer = io.BytesIO()
+    with archive.ZipWriter(buffer) as zip_file:
+        for _ in archive.write_files(zip_file, members, policy, chunk_size=4096,
+                                     store=store):
+            pass
+        archive.write_entry(zip_file, policy, 'run_vars.yml', '---\nfile_config: []\n')
+    return buffer.getvalue()
+
+
+def assert_round_trip(data, contents):
+    with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+        assert zip_file.testzip() is None
+        names = zip_file.namelist()
+        assert names == sorted(contents) + ['run_vars.yml']
+        for name, expected in contents.items():
+            assert zip_file.read(name) == expected
+        info = zip_file.getinfo('bin/run.sh')
+        assert info.external_attr >> 16 == archive.EXECUTABLE_MODE
+        assert info.date_time == archive.DATE_TIME
+
+
+@pytest.mark.parametrize('method', ['deflate', 'bzip2', 'lzma'])
+def test_parallel_archive_is_identical_to_serial(files, method):
+    members, contents = files
+    serial = write_zip(members, CompressionPolicy(method))
+    assert_round_trip(serial, contents)
+    for workers in (2, 3, 8):
+        assert write_zip(members, CompressionPolicy(method, workers=workers)) == serial
+
+
+def test_stream_zip_is_identical_to_written_archive(files):
+    members, contents = files
+    policy = CompressionPolicy()
+    streamed = b''.join(archive.stream_zip(
+        members, {'run_vars.yml': '---\nfile_config: []\n'}, policy, chunk_size=4096
+    ))
+    assert streamed == write_zip(members, policy)
+
+
+def test_shared_payloads_are_copied_unchanged(files):
+    members, contents = files
+    policy = CompressionPolicy()
+    store = archive.PayloadStore()
+    first = write_zip(members, policy, store)
+    second = write_zip(members[1:], policy, store)
+    assert first == write_zip(members, policy)
+    assert second == write_zip(members[1:], policy)
+    assert store.compressed == len(members)
+    assert store.reused == len(members) - 1
+    assert_round_trip(first, contents)
+
+
+def test_full_payload_store_compresses_again(files):
+    members, contents = files
+    policy = CompressionPolicy()
+    store = archive.PayloadStore(max_size=0)
+    assert write_zip(members, policy, store) == write_zip(members, policy, store)
+    assert store.compressed == 2 * len(members)
+    assert store.reused == 0
+    assert store.size == 0
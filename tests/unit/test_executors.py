@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from picli.actions import executors
+
+
+class File(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.abs_path = f'/project/{path}'
+
+
+class Response(object):
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Action(object):
+    name = 'analyzer'
+
+    def __init__(self, files, cross_file=False):
+        self.cross_file = cross_file
+        self.run_config = type('RunConfig', (), {'files': files})()
+        self.uploads = []
+        self._lock = threading.Lock()
+
+    def upload(self, files=None):
+        files = list(self.run_config.files) if files is None else files
+        with self._lock:
+            self.uploads.append([file.path for file in files])
+        return Response('\n'.join(f'{file.path}:1:1: finding' for file in files))
+
+
+@pytest.fixture
+def files():
+    return [File(path) for path in ['src/b.c', 'include/a.h', 'src/a.c', 'src/c.c']]
+
+
+def test_shards_are_cut_in_path_order(files):
+    shards = executors.shard_files(files, max_files=3)
+    assert [[file.path for file in shard] for shard in shards] == [
+        ['include/a.h', 'src/a.c', 'src/b.c'], ['src/c.c'],
+    ]
+
+
+def test_shard_output_is_joined_in_path_order(files):
+    action = Action(files)
+    output = executors.RemoteExecutor({'max_files': 1}).send(action)
+    assert len(action.uploads) == 4
+    assert output.splitlines() == [
+        'include/a.h:1:1: finding', 'src/a.c:1:1: finding',
+        'src/b.c:1:1: finding', 'src/c.c:1:1: finding',
+    ]
+
+
+def test_cross_file_analyzers_are_sent_in_a_single_request(files):
+    action = Action(files, cross_file=True)
+    executors.RemoteExecutor({'max_files': 1}).send(action, files)
+    assert action.uploads == [[file.path for file in files]]
@@ -0,0 +1,118 @@
+import glob
+import os
+import warnings
+
+import pytest
+
+from picli.configs.file_matcher import FileMatcher
+from picli.configs.file_table import FileRecord
+from picli.configs.file_table import FileTable
+
+
+def make_tree(base_dir, paths):
+    for path in paths:
+        path = os.path.join(base_dir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('x\n')
+
+
+def scan(base_dir, pattern, gitignore=False):
+    matcher = FileMatcher(base_dir, gitignore=gitignore)
+    matcher.add(pattern, 'tag')
+    table = FileTable(base_dir)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        matches = matcher.scan(table)
+    return sorted(FileRecord(table, id).path for id in matches['tag'])
+
+
+def glob_files(base_dir, pattern):
+    return sorted(
+        os.path.relpath(path, base_dir)
+        for path in glob.glob(f'{base_dir}/{pattern}', recursive=True)
+        if os.path.isfile(path)
+    )
+
+
+@pytest.fixture
+def tree(tmpdir):
+    base_dir = str(tmpdir)
+    make_tree(base_dir, [
+        'top.py',
+        '.top.py',
+        'src/a.py',
+        'src/b.py',
+        'src/ab.py',
+        'src/]x.py',
+        'src/[x.py',
+        'src/x.txt',
+        'src/.hidden.py',
+        'src/.hid/c.py',
+        'src/sub/d.py',
+        'src/sub/deep/e.py',
+        '.dot/f.py',
+        'other/g.py',
+    ])
+    os.symlink(os.path.join(base_dir, 'other'), os.path.join(base_dir, 'src', 'link'))
+    return base_dir
+
+
+@pytest.mark.parametrize('pattern', [
+    '**/*.py',
+    '**',
+    '*.py',
+    '.*.py',
+    'src/*',
+    'src/?.py',
+    'src/[!a]*.py',
+    'src/[]]*.py',
+    'src/[[]*.py',
+    'src/[a[]*.py',
+    'src/.*',
+    'src/.hid/*.py',
+    'src/**',
+    'src/**/*.py',
+    'src/**/d.py',
+    'src/sub/**',
+    'src/link/*.py',
+    '**/deep/*.py',
+    'missing/**',
+])
+def test_matches_like_glob(tree, pattern):
+    assert scan(tree, pattern) == glob_files(tree, pattern)
+
+
+def test_symlink_loops_are_not_followed(tree):
+    os.symlink(os.path.join(tree, 'src'), os.path.join(tree, 'src', 'sub', 'back'))
+    assert scan(tree, 'src/**/*.py') == [
+        'src/[x.py', 'src/]x.py', 'src/a.py', 'src/ab.py', 'src/b.py',
+        'src/link/g.py', 'src/sub/d.py', 'src/sub/deep/e.py',
+    ]
+
+
+def test_gitignore_negation_and_anchoring(tmpdir):
+    base_dir = str(tmpdir)
+    make_tree(base_dir, [
+        'src.py',
+        'a.log',
+        'keep.log',
+        'sub/b.log',
+        'sub/keep.log',
+        'build/x.py',
+        'sub/build/y.py',
+        'docs/i.html',
+        'docs/api/j.html',
+        'tmp/z.py',
+        'sub/tmp/w.py',
+    ])
+    with open(os.path.join(base_dir, '.gitignore'), 'w') as f:
+        # A file can't be re-included once its directory is ignored.
+        f.write('*.log\n!keep.log\n/build\n!build/x.py\ndocs/*.html\ntmp/\n')
+    with open(os.path.join(base_dir, 'sub', '.gitignore'), 'w') as f:
+        f.write('!b.log\n')
+    assert scan(base_dir, '**', gitignore=True) == [
+        'docs/api/j.html', 'keep.log', 'src.py', 'sub/b.log', 'sub/build/y.py',
+        'sub/keep.log',
+    ]
+    assert scan(base_dir, '**', gitignore=False) == glob_files(base_dir, '**')
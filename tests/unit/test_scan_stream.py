@@ -0,0 +1,139 @@
+import os
+import threading
+
+import pytest
+
+from picli.context import ProjectContext
+from picli.context import ScanStream
+
+
+def consume_on_thread(files, results):
+    def run():
+        try:
+            results.append(list(files))
+        except Exception as e:
+            results.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+class Scan(object):
+    """
+    Scan that starts once released, so consumers can start before it
+    found more files than are held for them.
+    """
+
+    def __init__(self, count, failure=None):
+        self.count = count
+        self.failure = failure
+        self.released = threading.Event()
+
+    def __iter__(self):
+        self.released.wait()
+        yield from range(self.count)
+        if self.failure is not None:
+            raise self.failure
+
+
+def test_two_consumers_get_every_file_in_order():
+    scan = Scan(100)
+    stream = ScanStream(iter(scan), max_buffered=3)
+    first, second = [], []
+    threads = [
+        consume_on_thread(stream.consume(), first),
+        consume_on_thread(stream.consume(), second),
+    ]
+    scan.released.set()
+    for thread in threads:
+        thread.join(10)
+    assert first == second == [list(range(100))]
+
+
+def test_late_consumer_gets_none_once_files_were_dropped():
+    scan = Scan(10)
+    stream = ScanStream(iter(scan), max_buffered=3)
+    files = stream.consume()
+    scan.released.set()
+    assert list(files) == list(range(10))
+    stream.wait()
+    assert stream.consume() is None
+
+
+def test_first_consumer_gets_the_files_found_before_it_started():
+    stream = ScanStream(iter(range(3)), max_buffered=3)
+    stream.wait()
+    assert list(stream.consume()) == [0, 1, 2]
+
+
+def test_wait_does_not_wait_for_a_slow_consumer():
+    scan = Scan(100)
+    stream = ScanStream(iter(scan), max_buffered=3)
+    files = stream.consume()
+    scan.released.set()
+    assert next(files) == 0
+    waiter = threading.Thread(target=stream.wait)
+    waiter.start()
+    waiter.join(10)
+    assert not waiter.is_alive()
+    assert list(files) == list(range(1, 100))
+
+
+def test_scan_failure_is_raised_in_consumers_and_wait():
+    scan = Scan(5, ValueError('scan failed'))
+    stream = ScanStream(iter(scan), max_buffered=2)
+    first, second = [], []
+    threads = [
+        consume_on_thread(stream.consume(), first),
+        consume_on_thread(stream.consume(), second),
+    ]
+    scan.released.set()
+    for thread in threads:
+        thread.join(10)
+    for results in first, second:
+        assert isinstance(results[0], ValueError)
+    with pytest.raises(ValueError):
+        stream.wait()
+
+
+@pytest.fixture
+def project(tmpdir):
+    base_dir = str(tmpdir)
+    files = {
+        'piedpiper.d/pi_global_vars.yml': """---
+pi_global_vars:
+  project_name: "python_project"
+  ci_provider: "gitlab-ci"
+  vars_dir: "default_vars.d"
+  version: "0.0.0"
+""",
+        'piedpiper.d/default_vars.d/file_vars.d/m0.yml': """---
+file: "src/m0.py"
+styler: noop
+""",
+        'piedpiper.d/default_vars.d/group_vars.d/all.yml': """---
+pi_style:
+  - name: "src/**/*.py"
+    styler: noop
+""",
+    }
+    files.update({f'src/m{i}.py': 'x = 1\n' for i in range(20)})
+    for path, contents in files.items():
+        path = os.path.join(base_dir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(contents)
+    return ProjectContext(f'{base_dir}/piedpiper.d/pi_global_vars.yml', False)
+
+
+def paths(files):
+    return sorted((file.path, tuple(tags)) for file, tags in files)
+
+
+def test_late_iter_files_falls_back_to_the_finished_scan(project):
+    first = paths(project.iter_files())
+    assert len(first) == 20
+    assert paths(project.iter_files()) == first
+    ids, = project.file_matches.values()
+    assert sorted(ids) == sorted(project.file_table.lookup(path) for path, _ in first)
@@ -0,0 +1,149 @@
+import threading
+
+import pytest
+
+from picli.command import base
+
+
+class Session(object):
+
+    def __init__(self):
+        self.cancelled = []
+
+    def report_warm_up(self):
+        pass
+
+    def cancel(self, stage):
+        self.cancelled.append(stage)
+
+
+class ProjectContext(object):
+
+    def __init__(self):
+        self.session = Session()
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """
+    Run execute_stages with stages that record when they ran, failing
+    the ones given. Returns the stages run and the exit message, if any.
+    A stage given in waits only finishes once the stage it waits for ran.
+    """
+    def sysexit_with_message(message, code=1):
+        raise SystemExit(message)
+
+    def run(stages, fail=(), early=(), waits=None, context=None):
+        ran = []
+        lock = threading.Lock()
+        events = {stage: threading.Event() for stage in stages}
+
+        def execute_subcommand(project_context, stage):
+            with lock:
+                ran.append(stage)
+            events[stage].set()
+            if waits and stage in waits:
+                assert events[waits[stage]].wait(10)
+            if stage in fail:
+                raise SystemExit(1)
+
+        monkeypatch.setattr(base, 'execute_subcommand', execute_subcommand)
+        monkeypatch.setattr(base.util, 'sysexit_with_message', sysexit_with_message)
+        try:
+            base.execute_stages(context or ProjectContext(), stages, early)
+        except SystemExit as e:
+            return ran, e.code
+        return ran, None
+
+    return run
+
+
+def test_default_stages():
+    assert base.get_stages() == {
+        'validate': [], 'style': ['validate'], 'sast': ['validate'],
+    }
+
+
+def test_overrides_replace_dependencies():
+    stages = base.get_stages({'sast': ['style']})
+    assert stages['sast'] == ['style']
+    assert stages['style'] == ['validate']
+
+
+@pytest.mark.parametrize('overrides', [
+    {'deploy': []},
+    {'style': ['deploy']},
+])
+def test_unknown_stages_are_rejected(overrides):
+    with pytest.raises(SystemExit) as e:
+        base.get_stages(overrides)
+    assert e.value.code == 1
+
+
+@pytest.mark.parametrize('overrides', [
+    {'validate': ['validate']},
+    {'validate': ['style']},
+    {'validate': ['sast'], 'sast': ['style']},
+])
+def test_cycles_are_rejected(overrides):
+    with pytest.raises(SystemExit) as e:
+        base.get_stages(overrides)
+    assert e.value.code == 1
+
+
+def test_stages_run_after_their_dependencies(run):
+    ran, message = run(base.get_stages({'sast': ['style']}))
+    assert ran == ['validate', 'style', 'sast']
+    assert message is None
+
+
+def test_dependents_of_a_failed_stage_are_cancelled(run):
+    ran, message = run(base.get_stages({'sast': ['style']}), fail=['style'])
+    assert ran == ['validate', 'style']
+    assert message == 'Failed stages: style. Cancelled stages: sast.'
+
+
+def test_failed_stage_cancels_every_dependent(run):
+    ran, message = run(base.get_stages(), fail=['validate'])
+    assert ran == ['validate']
+    assert message == 'Failed stages: validate. Cancelled stages: style, sast.'
+
+
+def test_independent_stages_carry_on_after_a_failure(run):
+    ran, message = run(base.get_stages(), fail=['style'])
+    assert sorted(ran) == ['sast', 'style', 'validate']
+    assert message == 'Failed stages: style.'
+
+
+def test_early_stages_start_alongside_their_dependencies(run):
+    ran, message = run(base.get_stages(), early=['style'], waits={'validate': 'style'})
+    assert ran[:2] == ['validate', 'style']
+    assert message is None
+
+
+def test_early_stages_are_cancelled_when_a_dependency_fails(run):
+    context = ProjectContext()
+    ran, message = run(
+        base.get_stages(), fail=['validate'], early=['style'],
+        waits={'validate': 'style'}, context=context,
+    )
+    assert sorted(ran) == ['style', 'validate']
+    assert 'style' in context.session.cancelled
+    assert message == 'Failed stages: validate. Cancelled stages: sast, style.'
+
+
+def test_critical_path_follows_the_last_dependency():
+    stages = {'validate': [], 'style': ['validate'], 'sast': ['validate']}
+    timings = {'validate': (0, 1), 'style': (1, 5), 'sast': (1, 3)}
+    assert base._critical_path(stages, timings) == ['validate', 'style']
+
+
+def test_failed_stage_exits_with_an_error(monkeypatch):
+    def execute_subcommand(project_context, stage):
+        if stage == 'sast':
+            raise SystemExit(1)
+
+    monkeypatch.setattr(base, 'execute_subcommand', execute_subcommand)
+    with pytest.raises(SystemExit) as e:
+        base.execute_stages(ProjectContext(), base.get_stages())
+    assert e.value.code == 1
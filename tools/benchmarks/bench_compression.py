@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""Benchmark the compression policy of analyzer archives
+
+Zips every file of each functional test project, plus a set of already
+compressed assets (PNG and JPEG like random data, a zip and a gzip) of
+the given size, the way actions do: once deflating every member at the
+default level as PiCli used to, and once with a few CompressionPolicy
+configurations. Reports the archive size, compression ratio and time of
+each. The projects are small, so each archive is written several times
+and the best time is reported.
+
+Usage: python tools/benchmarks/bench_compression.py [asset megabytes]
+"""
+import gzip
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from picli.actions import archive  # noqa: E402
+from picli.actions.compression import CompressionPolicy  # noqa: E402
+
+PROJECTS = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'tests', 'functional'
+)
+REPEAT = 5
+POLICIES = (
+    ('policy deflate', {}),
+    ('policy deflate -9', {'level': 9}),
+    ('policy lzma', {'method': 'lzma'}),
+)
+
+
+def project_files(directory):
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d != '.git')
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            files.append((path, os.path.relpath(path, directory)))
+    return files
+
+
+def build_assets(directory, megabytes):
+    size = int(megabytes * 1024 * 1024 / 4)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr('data.bin', os.urandom(size))
+    contents = {
+        'assets/logo.png': b'\x89PNG\r\n\x1a\n' + os.urandom(size),
+        'assets/photo.jpg': b'\xff\xd8\xff\xe0' + os.urandom(size),
+        'assets/vendor.zip': buffer.getvalue(),
+        'assets/data.bin.gz': gzip.compress(os.urandom(size)),
+    }
+    files = []
+    for name, data in contents.items():
+        path = os.path.join(directory, os.path.basename(name))
+        with open(path, 'wb') as f:
+            f.write(data)
+        files.append((path, name))
+    return files
+
+
+def zip_default(files, destination):
+    with zipfile.ZipFile(destination, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for path, name in files:
+            zip_file.write(path, name)
+        zip_file.writestr('run_vars.yml', '---\n')
+
+
+def zip_policy(policy):
+    def write(files, destination):
+        with open(destination, 'wb') as f, archive.ZipWriter(f) as zip_file:
+            for _ in archive.write_files(zip_file, files, policy):
+                pass
+            archive.write_entry(zip_file, policy, 'run_vars.yml', '---\n')
+    return write
+
+
+def measure(write, files, scratch):
+    destination = os.path.join(scratch, 'bench.zip')
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        write(files, destination)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    raw = sum(os.path.getsize(path) for path, _ in files)
+    return raw, os.path.getsize(destination), best
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+    writers = [('deflate everything', zip_default)] + [
+        (label, zip_policy(CompressionPolicy(**options)))
+        for label, options in POLICIES
+    ]
+    with tempfile.TemporaryDirectory() as scratch:
+        sets = [
+            (name, project_files(os.path.join(PROJECTS, name)))
+            for name in sorted(os.listdir(PROJECTS))
+            if os.path.isdir(os.path.join(PROJECTS, name))
+        ]
+        assets = build_assets(scratch, megabytes)
+        sets.append((f'cpp_and_python_project + {megabytes:g}MiB assets',
+                     sets[0][1] + assets))
+        for name, files in sets:
+            print(f'{name}: {len(files)} files')
+            for label, write in writers:
+                raw, size, elapsed = measure(write, files, scratch)
+                print(f'  {label:20} {size:>10} bytes  {raw / size:5.2f}x  '
+                      f'{elapsed * 1000:8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
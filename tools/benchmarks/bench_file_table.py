@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Benchmark memory held by resolved run configuration files
+
+Builds the files of a few run configurations the way PiCli resolves them
+for a project of the given size, once as lists of {'file': abs_path}
+dictionaries holding their own path strings, and once as a FileTable with
+FileSets of IDs, and compares the memory held by each with tracemalloc.
+
+Usage: python tools/benchmarks/bench_file_table.py [files]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from picli.configs.file_table import FileSet  # noqa: E402
+from picli.configs.file_table import FileTable  # noqa: E402
+
+BASE_DIR = '/home/user/projects/example'
+# Share of the tree matched by each run configuration: all.yml of two
+# pipes and a few language groups claiming part of the tree.
+RUN_CONFIGS = (1, 1, 2, 3, 4)
+
+
+def paths(files):
+    for index in range(files):
+        yield f'src/package_{index % 997}/module_{index // 997}/file_{index}.py'
+
+
+def build_dicts(files):
+    run_configs = []
+    for step in RUN_CONFIGS:
+        run_configs.append([
+            {'file': os.path.join(BASE_DIR, path)}
+            for path in list(paths(files))[::step]
+        ])
+    return run_configs
+
+
+def build_file_table(files):
+    table = FileTable(BASE_DIR)
+    for path in paths(files):
+        table.add(path)
+    ids = range(files)
+    return table, [FileSet(table, ids[::step]) for step in RUN_CONFIGS]
+
+
+def measure(build, files):
+    gc.collect()
+    tracemalloc.start()
+    result = build(files)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    dicts = measure(build_dicts, files)
+    file_table = measure(build_file_table, files)
+    print(f'{"layout":>12} {"MiB":>10} {"bytes/file":>12}')
+    for name, size in (('dicts', dicts), ('FileTable', file_table)):
+        print(f'{name:>12} {size / 2 ** 20:>10.1f} {size / files:>12.1f}')
+    print(f'\nReduction: {dicts / file_table:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
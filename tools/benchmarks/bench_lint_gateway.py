@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Benchmark picli lint end to end against the gateway simulator
+
+Copies a functional test project to a temporary directory, points the
+url of its pipe_vars.d files at a gateway simulator started on a free
+port, and runs picli lint on it several times. Reports the wall time of
+each run and the requests the simulator served. Options not listed
+below are passed to the simulator, see
+python tools/gateway_simulator.py --help.
+
+Usage: python tools/benchmarks/bench_lint_gateway.py [--project NAME]
+       [--repeat N] [--picli-args ARGS] [simulator options]
+"""
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+import yaml  # noqa: E402
+
+import gateway_simulator  # noqa: E402
+
+PROJECTS = os.path.join(ROOT, 'tests', 'functional')
+
+
+def point_at(project, url):
+    pipe_vars = os.path.join(project, 'piedpiper.d', 'default_vars.d', 'pipe_vars.d')
+    for name in sorted(os.listdir(pipe_vars)):
+        path = os.path.join(pipe_vars, name)
+        with open(path) as f:
+            contents = yaml.safe_load(f)
+        for vars in contents.values():
+            if isinstance(vars, dict) and 'url' in vars:
+                vars['url'] = url
+        with open(path, 'w') as f:
+            yaml.safe_dump(contents, f, default_flow_style=False)
+
+
+def run_lint(project, picli_args):
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(ROOT))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-m', 'picli'] + picli_args + ['lint'],
+        cwd=project, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+    )
+    return result.returncode, time.perf_counter() - start, result.stdout.decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--project', default='cpp_and_python_project')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--picli-args', default='--no-result-cache')
+    args, simulator_args = parser.parse_known_args()
+    options = gateway_simulator.parse_args(['--port', '0'] + simulator_args)
+    server = gateway_simulator.GatewaySimulator(options).start()
+    try:
+        with tempfile.TemporaryDirectory() as scratch:
+            project = os.path.join(scratch, args.project)
+            shutil.copytree(os.path.join(PROJECTS, args.project), project)
+            point_at(project, server.url)
+            print(f'{args.project} against {server.url}')
+            for run in range(1, args.repeat + 1):
+                code, elapsed, output = run_lint(project, shlex.split(args.picli_args))
+                print(f'  run {run}: {elapsed:6.2f}s exit {code}')
+                if code and run == 1:
+                    print(output)
+        print(json.dumps(server.stats.to_dict(), indent=2))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
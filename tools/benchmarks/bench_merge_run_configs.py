@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Benchmark all.yml exclusion in BasePipeConfig._merge_run_configs
+
+Builds synthetic run configurations shaped like a repository with a "**"
+pattern in all.yml and a few language groups claiming part of the tree, then
+times the merge for growing numbers of paths. The cost per path must stay
+flat for the merge to scale linearly.
+
+Usage: python tools/benchmarks/bench_merge_run_configs.py [max_paths]
+"""
+import gc
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from picli.configs.base_pipe import BasePipeConfig  # noqa: E402
+from picli.configs.file_table import FileSet  # noqa: E402
+from picli.configs.file_table import FileTable  # noqa: E402
+
+GROUPS = ('python_lint.yml', 'cpp_lint.yml', 'docs.yml')
+
+
+def build_run_configs(paths):
+    table = FileTable('/project')
+    for index in range(paths):
+        table.add(f'src/module_{index}/file_{index}.src')
+    ids = range(paths)
+    run_configs = [SimpleNamespace(name='all.yml', files=FileSet(table, ids))]
+    for offset, group in enumerate(GROUPS):
+        run_configs.append(SimpleNamespace(
+            name=group,
+            files=FileSet(table, ids[offset::len(GROUPS) + 1])
+        ))
+    return run_configs
+
+
+def time_merge(size):
+    run_configs = build_run_configs(size)
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        BasePipeConfig._merge_run_configs(run_configs)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def main(max_paths):
+    sizes = []
+    size = 1000
+    while size < max_paths:
+        sizes.append(size)
+        size *= 10
+    sizes.append(max_paths)
+
+    print(f'{"paths":>10} {"seconds":>10} {"ns/path":>10}')
+    per_path = []
+    for size in sizes:
+        elapsed = min(time_merge(size) for _ in range(3))
+        per_path.append(elapsed / size * 1e9)
+        print(f'{size:>10} {elapsed:>10.4f} {per_path[-1]:>10.1f}')
+
+    growth = per_path[-1] / min(per_path)
+    print(f'\nPer-path cost growth from smallest to largest run: {growth:.2f}x')
+    if growth > 4:
+        print('Merge does not scale linearly.')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000))
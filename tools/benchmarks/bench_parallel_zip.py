@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Benchmark compressing archive members on several threads
+
+Generates a project of roughly the requested size and zips it the way
+actions do with an increasing number of compression workers, checking
+that every archive is byte for byte the same as the one written by a
+single worker and reads back intact. Reports the wall time of each.
+
+Usage: python tools/benchmarks/bench_parallel_zip.py [megabytes] [max workers]
+"""
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from picli.actions import archive  # noqa: E402
+from picli.actions.compression import CompressionPolicy  # noqa: E402
+
+FILE_SIZE = 1024 * 1024
+
+
+def build_project(directory, megabytes):
+    files = []
+    for index in range(int(megabytes * 1024 * 1024 / FILE_SIZE)):
+        path = os.path.join(directory, f'module_{index}.py')
+        with open(path, 'w') as f:
+            line = 0
+            while f.tell() < FILE_SIZE:
+                f.write(f'value_{line} = {os.urandom(8).hex()!r}  # line {line}\n')
+                line += 1
+        files.append((path, f'src/module_{index}.py'))
+    return files
+
+
+def write_zip(files, destination, workers):
+    policy = CompressionPolicy(workers=workers)
+    with open(destination, 'wb') as f, archive.ZipWriter(f) as zip_file:
+        for _ in archive.write_files(zip_file, files, policy):
+            pass
+    with zipfile.ZipFile(destination) as zip_file:
+        if zip_file.testzip() is not None:
+            raise RuntimeError(f'Corrupt archive written by {workers} workers')
+    with open(destination, 'rb') as f:
+        return f.read()
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 64
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as scratch:
+        files = build_project(scratch, megabytes)
+        destination = os.path.join(scratch, 'bench.zip')
+        print(f'{len(files)} files, {megabytes:g}MiB, {os.cpu_count()} CPUs')
+        serial = None
+        workers = 1
+        while workers <= max_workers:
+            start = time.perf_counter()
+            data = write_zip(files, destination, workers)
+            elapsed = time.perf_counter() - start
+            if serial is None:
+                serial = (data, elapsed)
+            identical = 'identical' if data == serial[0] else 'DIFFERENT'
+            print(f'  {workers:3} workers  {elapsed:7.3f}s  '
+                  f'{serial[1] / elapsed:5.2f}x  {identical}')
+            workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""Benchmark streamed zip uploads against zipping to a temporary file
+
+Generates a project of roughly the requested size and uploads it to a local
+HTTP server which discards the request body, once by writing the zipfile to
+a temporary directory and posting it, and once by streaming it into the
+request body with picli.actions.archive. Reports wall time, bytes written
+to disk and peak Python memory of each.
+
+Usage: python tools/benchmarks/bench_stream_upload.py [megabytes]
+"""
+import http.server
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from picli.actions import archive  # noqa: E402
+from picli.transport import Transport  # noqa: E402
+
+FILE_SIZE = 256 * 1024
+
+
+class DiscardHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                self.rfile.read(size + 2)
+                if size == 0:
+                    break
+        else:
+            remaining = int(self.headers['Content-Length'])
+            while remaining:
+                remaining -= len(self.rfile.read(min(remaining, 1024 * 1024)))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def build_project(directory, megabytes):
+    files = []
+    # Half random, half repetitive data so deflate has some work to do.
+    for index in range(int(megabytes * 1024 * 1024 / FILE_SIZE)):
+        path = os.path.join(directory, f'file_{index}.src')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(FILE_SIZE // 2) + b'line of source\n' * (FILE_SIZE // 30))
+        files.append((path, f'src/file_{index}.src'))
+    return files
+
+
+def upload_temporary_file(transport, url, files, scratch):
+    with tempfile.TemporaryDirectory(dir=scratch) as temp_dir:
+        path = os.path.join(temp_dir, 'bench.zip')
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for source, name in files:
+                zip_file.write(source, name)
+            zip_file.writestr('run_vars.yml', '---\n')
+        written = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            transport.post(url, files=[('files', f)]).raise_for_status()
+    return written
+
+
+def upload_stream(transport, url, files, scratch):
+    body = archive.MultipartStream(
+        'files', 'bench.zip', archive.stream_zip(files, {'run_vars.yml': '---\n'})
+    )
+    transport.post(
+        url, data=body, headers={'Content-Type': body.content_type}
+    ).raise_for_status()
+    return 0
+
+
+def measure(upload, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    written = upload(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, written, peak
+
+
+def main(megabytes):
+    server = Server(('127.0.0.1', 0), DiscardHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/function'
+    transport = Transport()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = build_project(directory, megabytes)
+        print(f'{len(files)} files, {megabytes:.0f}MiB')
+        print(f'{"mode":>14} {"seconds":>8} {"disk MiB":>9} {"peak MiB":>9}')
+        for name, upload in (('temporary file', upload_temporary_file),
+                             ('stream', upload_stream)):
+            elapsed, written, peak = measure(upload, transport, url, files, directory)
+            print(f'{name:>14} {elapsed:>8.2f} {written / 2 ** 20:>9.1f} '
+                  f'{peak / 2 ** 20:>9.1f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Benchmark the YAML backend used by picli.util
+
+Generates a run_vars.yml shaped document of roughly the requested size and
+compares parsing and emitting it with the pure-Python PyYAML code paths
+against util.safe_load and util.safe_dump, which use libyaml when PyYAML was
+built with it.
+
+Usage: python tools/benchmarks/bench_yaml.py [megabytes]
+"""
+import os
+import sys
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from picli import util  # noqa: E402
+
+
+def build_run_vars(megabytes):
+    run_vars = {
+        'pi_global_vars': {
+            'project_name': 'benchmark',
+            'ci_provider': 'gitlab-ci',
+            'vars_dir': 'default_vars.d',
+            'version': '0.0.0',
+        },
+        'pi_style_pipe_vars': {
+            'run_pipe': True,
+            'url': 'http://172.17.0.1:8080/function',
+            'version': 'latest',
+        },
+        'group_configs': [
+            {'name': '**', 'styler': 'noop'},
+            {'name': '**/*.py', 'styler': 'flake8', 'options': {'max-line-length': 90}},
+        ],
+        'file_config': [],
+    }
+    index = 0
+    while index * 80 < megabytes * 1024 * 1024:
+        run_vars['file_config'].append({
+            'file': f'/builds/group/project/src/package_{index % 97}/module_{index}.py',
+            'styler': 'flake8' if index % 3 else 'noop',
+        })
+        index += 1
+    return run_vars
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(megabytes):
+    if util.CSafeDumper is None:
+        print('PyYAML was built without libyaml, both paths are pure Python.')
+
+    run_vars = build_run_vars(megabytes)
+    python_text, python_dump = timed(
+        lambda data: yaml.dump(data, Dumper=util.SafeDumper, **util.DUMP_OPTIONS),
+        run_vars
+    )
+    text, dump = timed(util.safe_dump, run_vars)
+    print(f'run_vars.yml size: {len(text) / 1024 / 1024:.1f}MiB, '
+          f'{len(run_vars["file_config"])} file definitions')
+    if text != python_text:
+        print('Emitted documents differ.')
+        return 1
+
+    python_data, python_load = timed(
+        lambda string: yaml.load(string, Loader=yaml.SafeLoader), text
+    )
+    data, load = timed(util.safe_load, text)
+    if data != python_data:
+        print('Parsed documents differ.')
+        return 1
+
+    print(f'{"":>6} {"python":>10} {"picli":>10} {"speedup":>8}')
+    print(f'{"load":>6} {python_load:>9.2f}s {load:>9.2f}s {python_load / load:>7.1f}x')
+    print(f'{"dump":>6} {python_dump:>9.2f}s {dump:>9.2f}s {python_dump / dump:>7.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(float(sys.argv[1]) if len(sys.argv) > 1 else 10))
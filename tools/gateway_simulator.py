@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+"""Local stand-in for the OpenFaaS gateway of the PiedPiper functions
+
+Serves piedpiper-<name>-function and piedpiper-<name>-function-<version>
+routes under any prefix, such as the /function/ prefix of the gateway.
+Every request must carry a multipart zipfile with a run_vars.yml, as the
+real functions expect. The validator function answers with validation
+results in the JSON format of the validator, and the other functions
+check the files in the zipfile for a few simple problems and answer in
+the text format of the analyzer they stand in for.
+
+Latency, bandwidth, cold starts, replica counts and failures can be
+injected, so the network path of picli can be measured offline. Point the
+url of the pipe_vars.d files of a project at the simulator:
+
+    python tools/gateway_simulator.py --port 8080 --latency 0.05 --cold-start 2
+    url: http://127.0.0.1:8080/function
+
+GET /healthz answers once the simulator is up, and GET /system/stats
+returns the number of requests, bytes received, cold starts and errors
+of each function as JSON. A GET request to a function, such as the
+warm-up probes of picli, starts it like any other request and is
+answered with OK.
+
+Usage: python tools/gateway_simulator.py [options], see --help
+"""
+import argparse
+import http.server
+import io
+import json
+import random
+import re
+import socketserver
+import sys
+import threading
+import time
+import zipfile
+
+import yaml
+
+ROUTE = re.compile(r'/piedpiper-(?P<name>[a-z0-9]+)-function(?:-(?P<version>[\w-]+))?/?$')
+MAX_LINE_LENGTH = 79
+
+
+class SimulatorError(Exception):
+    pass
+
+
+def flake8_report(name, lines):
+    problems = []
+    for number, line in enumerate(lines, 1):
+        if len(line) > MAX_LINE_LENGTH:
+            problems.append(
+                f'{name}:{number}:{MAX_LINE_LENGTH + 1}: E501 line too long '
+                f'({len(line)} > {MAX_LINE_LENGTH} characters)'
+            )
+        if line != line.rstrip():
+            problems.append(
+                f'{name}:{number}:{len(line.rstrip()) + 1}: W291 trailing whitespace'
+            )
+    return problems
+
+
+def cpplint_report(name, lines):
+    problems = []
+    for number, line in enumerate(lines, 1):
+        if len(line) > 80:
+            problems.append(
+                f'{name}:{number}:  Lines should be <= 80 characters long  '
+                f'[whitespace/line_length] [2]'
+            )
+        if line != line.rstrip():
+            problems.append(
+                f'{name}:{number}:  Line ends in whitespace.  Consider deleting '
+                f'these extra spaces.  [whitespace/end_of_line] [4]'
+            )
+    return problems
+
+
+def cppcheck_report(name, lines):
+    return [
+        f'{name}:{number}:0: style: Consider using a smart pointer. [cstyleCast]'
+        for number, line in enumerate(lines, 1) if 'malloc(' in line
+    ]
+
+
+REPORTS = {
+    'flake8': flake8_report,
+    'cpplint': cpplint_report,
+    'cppcheck': cppcheck_report,
+}
+
+
+def analyze(name, zip_file):
+    """
+    :param name: Name of the function
+    :param zip_file: ZipFile of the request
+    :return: tuple of content type and body of the response
+    """
+    report = REPORTS.get(name, flake8_report)
+    output = []
+    for member in zip_file.infolist():
+        if member.filename == 'run_vars.yml' or member.is_dir():
+            continue
+        text = zip_file.read(member).decode(errors='replace')
+        output.extend(report(member.filename, text.splitlines()))
+    return 'text/plain', '\n'.join(output) + ('\n' if output else '')
+
+
+def validate(run_vars, fail):
+    """
+    :param run_vars: Parsed run_vars.yml of the request
+    :param fail: Report a validation error
+    :return: tuple of content type and body of the response
+    """
+    stages = run_vars.get('ci', {}).get('ci_provider_config', {}).get('stages', [])
+    results = {
+        'ci': [
+            {'include': {'errors': False}},
+            {'stages': {
+                'errors': f"Stages must include lint. You passed {stages}"
+                if fail else False
+            }},
+        ]
+    }
+    return 'application/json', json.dumps(results)
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.functions = {}
+
+    def add(self, name, **counters):
+        with self.lock:
+            function = self.functions.setdefault(name, {
+                'requests': 0, 'bytes': 0, 'cold_starts': 0, 'errors': 0,
+                'max_concurrency': 0,
+            })
+            for counter, value in counters.items():
+                if counter == 'max_concurrency':
+                    function[counter] = max(function[counter], value)
+                else:
+                    function[counter] += value
+
+    def to_dict(self):
+        with self.lock:
+            return json.loads(json.dumps(self.functions))
+
+
+class Function(object):
+    """Replicas and warm state of a single function"""
+
+    def __init__(self, replicas):
+        self.replicas = threading.BoundedSemaphore(replicas) if replicas else None
+        self.lock = threading.Lock()
+        self.last_used = None
+        self.running = 0
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'PiedPiperGatewaySimulator'
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super(Handler, self).log_message(format, *args)
+
+    def _throttle(self, size, started):
+        bandwidth = self.server.options.bandwidth
+        if bandwidth:
+            delay = size / bandwidth - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def _read(self, size):
+        data = bytearray()
+        started = time.monotonic()
+        while len(data) < size:
+            chunk = self.rfile.read(min(64 * 1024, size - len(data)))
+            if not chunk:
+                raise SimulatorError('Request body ended early')
+            data += chunk
+            self._throttle(len(data), started)
+        return bytes(data)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    while self.rfile.readline().strip():
+                        pass
+                    return bytes(body)
+                body += self._read(size)
+                self.rfile.readline()
+        return self._read(int(self.headers.get('Content-Length', 0)))
+
+    def _send(self, status, content_type, body):
+        body = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        started = time.monotonic()
+        for offset in range(0, len(body), 64 * 1024):
+            self.wfile.write(body[offset:offset + 64 * 1024])
+            self._throttle(offset + 64 * 1024, started)
+
+    def do_GET(self):
+        if ROUTE.search(self.path.split('?')[0]):
+            self._call(None)
+        elif self.path.rstrip('/').endswith('/healthz'):
+            self._send(200, 'text/plain', 'OK')
+        elif self.path.rstrip('/').endswith('/system/stats'):
+            self._send(200, 'application/json', json.dumps(self.server.stats.to_dict()))
+        else:
+            self._send(404, 'text/plain', 'Not found')
+
+    def do_POST(self):
+        if ROUTE.search(self.path.split('?')[0]) is None:
+            self._send(404, 'text/plain', f'No function at {self.path}')
+            return
+        try:
+            body = self._read_body()
+        except (SimulatorError, ValueError) as e:
+            self.close_connection = True
+            self._send(400, 'text/plain', str(e))
+            return
+        self._call(body)
+
+    def _call(self, body):
+        name = ROUTE.search(self.path.split('?')[0]).group('name')
+        function = self.server.function(name)
+        if function.replicas is not None:
+            function.replicas.acquire()
+        try:
+            status, content_type, response = self._invoke(name, function, body)
+        finally:
+            if function.replicas is not None:
+                function.replicas.release()
+        self._send(status, content_type, response)
+
+    def _invoke(self, name, function, body):
+        options = self.server.options
+        with function.lock:
+            cold = function.last_used is None or (
+                options.idle_timeout and
+                time.monotonic() - function.last_used > options.idle_timeout
+            )
+            function.running += 1
+            running = function.running
+        self.server.stats.add(
+            name, requests=1, bytes=len(body or b''), cold_starts=int(cold),
+            max_concurrency=running
+        )
+        try:
+            delay = options.latency + self.server.random.uniform(0, options.jitter)
+            if cold:
+                delay += options.cold_start
+            time.sleep(delay)
+            if self.server.random.random() < options.error_rate:
+                self.server.stats.add(name, errors=1)
+                return 502, 'text/plain', f'Injected failure of {name}'
+            if body is None:
+                return 200, 'text/plain', 'OK'
+            try:
+                zip_file = self._zip_file(body)
+                run_vars = yaml.safe_load(zip_file.read('run_vars.yml'))
+            except (SimulatorError, KeyError, zipfile.BadZipFile, yaml.YAMLError) as e:
+                self.server.stats.add(name, errors=1)
+                return 400, 'text/plain', f'Invalid request: {e}'
+            if name == 'validator':
+                fail = self.server.random.random() < options.validation_failure_rate
+                return (200,) + validate(run_vars or {}, fail)
+            return (200,) + analyze(name, zip_file)
+        finally:
+            with function.lock:
+                function.running -= 1
+                function.last_used = time.monotonic()
+
+    def _zip_file(self, body):
+        content_type = self.headers.get('Content-Type', '')
+        boundary = re.search(r'boundary="?([^";]+)"?', content_type)
+        if boundary is None:
+            raise SimulatorError('Expected a multipart/form-data request')
+        for part in body.split(b'--' + boundary.group(1).encode()):
+            head, _, data = part.partition(b'\r\n\r\n')
+            if b'name="files"' in head:
+                return zipfile.ZipFile(io.BytesIO(data[:-2]))
+        raise SimulatorError('No files field in the request')
+
+
+class GatewaySimulator(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Gateway simulator serving every function on one port"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, options):
+        """
+        :param options: argparse.Namespace of the options of the simulator,
+        see parse_args
+        """
+        super(GatewaySimulator, self).__init__((options.host, options.port), Handler)
+        self.options = options
+        self.random = random.Random(options.seed)
+        self.stats = Stats()
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/function'
+
+    def function(self, name):
+        with self._lock:
+            if name not in self._functions:
+                self._functions[name] = Function(self.options.replicas)
+            return self._functions[name]
+
+    def start(self):
+        """
+        Serve requests on a background thread.
+        :return: self
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Local stand-in for the OpenFaaS gateway of the PiedPiper functions'
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='Port to listen on, 0 picks a free port')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds every invocation takes')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Up to this many seconds are added to the latency at random')
+    parser.add_argument('--bandwidth', type=float, default=0.0,
+                        help='Bytes per second each request and response is '
+                             'limited to, 0 for unlimited')
+    parser.add_argument('--cold-start', type=float, default=0.0,
+                        help='Seconds added to the first invocation of a function')
+    parser.add_argument('--idle-timeout', type=float, default=0.0,
+                        help='Seconds after which an idle function starts cold '
+                             'again, 0 to keep functions warm')
+    parser.add_argument('--replicas', type=int, default=0,
+                        help='Invocations of a function running at the same time, '
+                             'others queue. 0 for unlimited')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of invocations failing with a 502')
+    parser.add_argument('--validation-failure-rate', type=float, default=0.0,
+                        help='Fraction of validations reporting an error')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the injected jitter and failures')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    return parser.parse_args(args)
+
+
+def main():
+    options = parse_args()
+    server = GatewaySimulator(options)
+    print(f'Serving functions at {server.url}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        json.dump(server.stats.to_dict(), sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()